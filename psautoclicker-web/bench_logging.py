@@ -0,0 +1,38 @@
+import argparse
+import json
+import time
+from gui.engine import MacroJob
+from gui.logbatch import LogBatcher
+from gui.fakedevice import FakeRPDevice
+from gui.session import SupervisedSession
+
+def run(trace, steps, loops):
+    device = FakeRPDevice(f"fake:bench-{'trace' if trace else 'quiet'}", record_inputs=False)
+    session = SupervisedSession(device.host, log_callback=lambda msg: None, device_factory=lambda host: device)
+    session.connect()
+    # Same path as the web server's on_log: batched per room, JSON-encoded as Socket.IO would
+    batcher = LogBatcher(lambda room, batch: json.dumps(dict(batch, job_id=room)))
+    macro = {"steps": [[button, 0] for button in ("CROSS", "CIRCLE", ["LEFT_STICK", "UP", 1.0])] * (steps // 3)}
+    job = MacroJob("bench", macro, [], session, loop_count=loops, log_max_lines=2000, trace_inputs=trace,
+                   on_log=lambda job, msg: batcher.add(job.job_id, job.record["log_seq"], msg, status=job.record["status"]))
+    started = time.perf_counter()
+    job.start()
+    job._thread.join()
+    elapsed = time.perf_counter() - started
+    batcher.close()
+    session.close()
+    inputs = sum(job.counters.values())
+    return inputs, elapsed, job.record["log_seq"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Macro input throughput against the fake device, per-input logging on vs off.")
+    parser.add_argument("--steps", type=int, default=3000, help="Steps per loop")
+    parser.add_argument("--loops", type=int, default=20)
+    args = parser.parse_args()
+    for trace in (True, False):
+        inputs, elapsed, lines = run(trace, args.steps, args.loops)
+        print(f"per-input logging {'on ' if trace else 'off'}: {inputs} inputs in {elapsed:.2f}s = "
+              f"{inputs / elapsed:,.0f} inputs/s, {lines} log lines")
+
+if __name__ == "__main__":
+    main()
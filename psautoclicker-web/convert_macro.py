@@ -0,0 +1,23 @@
+import argparse
+import sys
+from gui.macrobin import BINARY_SUFFIX, binary_to_json, json_to_binary
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert macros between .macro.json and the compact binary .macro.bin format (lossless both ways).")
+    parser.add_argument("files", nargs="+", help=f".macro.json files to encode or {BINARY_SUFFIX} files to decode")
+    parser.add_argument("-o", "--output", help="Output path (only with a single input file)")
+    args = parser.parse_args()
+    if args.output and len(args.files) > 1:
+        parser.error("--output needs exactly one input file")
+    for path in args.files:
+        convert = binary_to_json if path.endswith(BINARY_SUFFIX) else json_to_binary
+        try:
+            print(f"{path} -> {convert(path, args.output)}")
+        except (OSError, ValueError) as e:
+            print(f"{path}: {e}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,31 @@
+import argparse
+import signal
+import sys
+from gui.daemon import PSAutoDaemon, default_socket_path
+from gui.logconfig import configure_logging
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless PSAutoClicker daemon controlled over a Unix domain socket.")
+    parser.add_argument("--socket", default=default_socket_path(), help="Path of the Unix socket to listen on")
+    parser.add_argument("--connect", action="append", default=[], metavar="HOST",
+                        help="Connect to HOST at startup (repeatable; the last one becomes the default)")
+    parser.add_argument("--log-level", help="Default log level (DEBUG, INFO, WARNING, ...); env PSAUTO_LOG_LEVEL")
+    args = parser.parse_args()
+    configure_logging(level=args.log_level)
+    daemon = PSAutoDaemon(args.socket)
+    for host in args.connect:
+        try:
+            daemon.connect(host)
+        except Exception as e:
+            print(f"Could not connect to {host}: {e}")
+    signal.signal(signal.SIGTERM, lambda *_: daemon.close())
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import io
+import json
+import os
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from .catalog import MACRO_SUFFIX, macro_name_from_filename
+from .compiler import compile_macro
+from .schema import MacroValidationError
+
+# format -> (mimetype, file extension, tarfile write mode or None for zip)
+ARCHIVE_FORMATS = {
+    "zip": ("application/zip", ".zip", None),
+    "tar": ("application/x-tar", ".tar", "w|"),
+    "tar.gz": ("application/gzip", ".tar.gz", "w|gz"),
+}
+# Archive members bigger than this are reported instead of read (a long recording is a few MB)
+MAX_MEMBER_BYTES = 64 * 1024 * 1024
+# Members are checked and saved this many at a time, so an import holds one batch in memory
+IMPORT_BATCH = 128
+# Threads checking a batch; they overlap parsing and compiling with reading the archive
+IMPORT_WORKERS = 4
+
+class _Sink:
+    """Write-only file object collecting what an archive writer produces until it is drained."""
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def iter_archive(macros, fmt="zip"):
+    """An archive of macros (<name>.macro.json members), yielded chunk by chunk as it is written.
+
+    macros may be a lazy iterable; nothing but the macro being added is held in memory and no
+    temporary file is used (zip members get data descriptors since the output is not seekable).
+    """
+    mode = ARCHIVE_FORMATS[fmt][2]
+    sink = _Sink()
+    if mode is None:
+        archive = zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED)
+    else:
+        archive = tarfile.open(fileobj=sink, mode=mode)
+    with archive:
+        for macro in macros:
+            data = json.dumps(macro, indent=2).encode("utf-8")
+            member = f"{os.path.basename(macro['name'])}{MACRO_SUFFIX}"
+            if mode is None:
+                archive.writestr(member, data)
+            else:
+                info = tarfile.TarInfo(member)
+                info.size = len(data)
+                info.mtime = int(time.time())
+                archive.addfile(info, io.BytesIO(data))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    yield sink.drain()
+
+def read_archive(fileobj):
+    """(member, data, error) for every .json member of a zip or tar(.gz) archive, in archive order.
+
+    data is None when error says why the member was not read. Raises ValueError if fileobj is not
+    a readable archive.
+    """
+    try:
+        if zipfile.is_zipfile(fileobj):
+            fileobj.seek(0)
+            with zipfile.ZipFile(fileobj) as archive:
+                for info in archive.infolist():
+                    if info.is_dir() or not info.filename.endswith(".json"):
+                        continue
+                    if info.file_size > MAX_MEMBER_BYTES:
+                        yield info.filename, None, "file too large"
+                        continue
+                    yield info.filename, archive.read(info), None
+            return
+        fileobj.seek(0)
+        with tarfile.open(fileobj=fileobj, mode="r:*") as archive:
+            for info in archive:
+                if not info.isfile() or not info.name.endswith(".json"):
+                    continue
+                if info.size > MAX_MEMBER_BYTES:
+                    yield info.name, None, "file too large"
+                    continue
+                yield info.name, archive.extractfile(info).read(), None
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError) as e:
+        raise ValueError("Not a zip or tar archive") from e
+
+def check_member(member, data):
+    """Parse, name and compile one archive member: (macro, compiled, errors)."""
+    try:
+        macro = json.loads(data)
+    except ValueError as e:
+        return None, None, [f"invalid JSON: {e}"]
+    if not isinstance(macro, dict):
+        return None, None, ["a macro file must contain a JSON object"]
+    # Named like a single-file import: its "name", else the file name
+    macro["name"] = macro.get("name") or macro_name_from_filename(os.path.basename(member))
+    try:
+        return macro, compile_macro(macro), []
+    except MacroValidationError as e:
+        return macro, None, e.errors
+
+def import_archive(store, fileobj, workers=IMPORT_WORKERS):
+    """Validate, compile and save every macro of an archive into store (MacroCatalog or MacroDB).
+
+    Returns one {"file", "name", "status", "errors"} report per .json member, in archive order;
+    status is "imported" or "failed". Members are read, checked (in a small thread pool) and saved
+    IMPORT_BATCH at a time through store.import_many, which refuses macros whose end-of-loop macro
+    is missing or in a cycle; those refused for a reference are tried once more at the end, in case
+    their target came in a later batch. Raises ValueError if fileobj is not an archive.
+    """
+    report = []
+    retry = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        batch = []
+        for member, data, error in read_archive(fileobj):
+            report.append({"file": member, "name": None, "status": "failed", "errors": [error] if error else []})
+            if data is not None:
+                batch.append((len(report) - 1, member, data))
+            if len(batch) >= IMPORT_BATCH:
+                _import_batch(store, pool, batch, report, retry)
+                batch = []
+        _import_batch(store, pool, batch, report, retry)
+    if retry:
+        refused = store.import_many([(macro, compiled) for _, macro, compiled in retry.values()])
+        for name, (index, _, _) in retry.items():
+            report[index]["errors"] = refused.get(name, [])
+            report[index]["status"] = "failed" if name in refused else "imported"
+    return report
+
+def _import_batch(store, pool, batch, report, retry):
+    results = pool.map(lambda item: check_member(item[1], item[2]), batch)
+    accepted = {}
+    for (index, _, _), (macro, compiled, errors) in zip(batch, results):
+        item = report[index]
+        item["name"] = macro["name"] if macro else None
+        item["errors"] = errors
+        if compiled is not None:
+            if macro["name"] in accepted:
+                # A later file with the same name wins, as saving them in turn would
+                report[accepted[macro["name"]][0]]["errors"] = ["replaced by a later file with the same name"]
+            accepted[macro["name"]] = (index, macro, compiled)
+    if not accepted:
+        return
+    refused = store.import_many([(macro, compiled) for _, macro, compiled in accepted.values()])
+    for name, (index, macro, compiled) in accepted.items():
+        if name in refused:
+            report[index]["errors"] = refused[name]
+            retry[name] = (index, macro, compiled)
+        else:
+            report[index]["status"] = "imported"
+            # Saved now; an older refused copy must not overwrite it in the retry
+            if name in retry:
+                report[retry.pop(name)[0]]["errors"] = ["replaced by a later file with the same name"]
@@ -0,0 +1,477 @@
+import hashlib
+import json
+import os
+import struct
+import threading
+from .engine import estimate_duration_ms
+from .macrobin import BINARY_SUFFIX, BinaryMacro
+from .compiler import ArtifactCache, compile_macro
+from .schema import MacroValidationError
+from .depgraph import DependencyGraph, check_batch
+from .history import HISTORY_DIRNAME, MacroHistory, content_digest, group_duplicates
+
+MACRO_SUFFIX = ".macro.json"
+MACRO_SEARCH_LIMIT = 200
+# Compiled macros live in this subdirectory of the macros dir (see compiler.ArtifactCache)
+COMPILED_DIRNAME = ".compiled"
+
+def macro_name_from_filename(filename):
+    for suffix in (MACRO_SUFFIX, BINARY_SUFFIX, ".json"):
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return filename
+
+def is_macro_file(filename):
+    return filename.endswith(".json") or filename.endswith(BINARY_SUFFIX)
+
+def step_comments(steps):
+    """Comments of steps and of the steps nested in REPEAT blocks, in order."""
+    comments = []
+    for step_tuple in steps or []:
+        if not isinstance(step_tuple, list) or not step_tuple:
+            continue
+        step = step_tuple[0]
+        if isinstance(step, list) and len(step) >= 3 and step[0] == "REPEAT":
+            comments.extend(step_comments(step[2]))
+        if len(step_tuple) >= 3 and isinstance(step_tuple[2], str) and step_tuple[2]:
+            comments.append(step_tuple[2])
+    return comments
+
+def macro_tags(macro):
+    tags = macro.get("tags") or []
+    return sorted({str(t).strip().lower() for t in tags if str(t).strip()})
+
+class _Entry:
+    __slots__ = ("path", "mtime_ns", "size", "macro", "name", "digest", "duration_ms", "binary", "errors", "compiled",
+                 "content")
+
+    def __init__(self, path, mtime_ns, size, macro, name, digest, binary=None, errors=None):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        # For a .macro.bin file macro["steps"] is a lazy BinarySteps; json() gives plain data
+        self.macro = macro
+        self.name = name
+        # sha1 of the file bytes; responses built from the parsed macro use it as their strong ETag
+        self.digest = digest
+        self.binary = binary
+        # Validation problems (the macro cannot be run), and the compiled form once it was opened for a run
+        self.errors = errors or []
+        self.compiled = None
+        # history.content_digest() of the macro, computed on first use
+        self.content = None
+        if binary is not None:
+            self.duration_ms = binary.duration_ms
+        else:
+            self.duration_ms = estimate_duration_ms((macro or {}).get("steps"))
+
+    def json(self):
+        return self.binary.to_json() if self.binary is not None else self.macro
+
+class MacroCatalog:
+    """Parsed macros of a directory, cached by path and revalidated by (mtime, size).
+
+    A refresh only stat()s the directory entries; a file is read and parsed again only when its
+    mtime or size changed. Macros are looked up by their "name" field (the file name without
+    .macro.json / .json when missing), so both the Macros/*.macro.json files shipped with the app
+    and older *.json saves resolve. Invalid JSON files are cached as such and skipped.
+    Binary .macro.bin files (see macrobin) are memory-mapped rather than parsed; load() hands their
+    steps to the engine undecoded, everything else sees plain JSON data. A .macro.bin wins over a
+    .macro.json of the same name, and saving such a macro writes the binary file.
+
+    Every JSON macro is validated and compiled once per content (artifacts in artifacts_dir, keyed
+    by the file's sha1), on save or when the file is first seen; load() runs the compiled form and
+    refuses macros that failed validation. Binary files are trusted as compiled.
+
+    end_of_loop_macro_name references form a DependencyGraph: save() refuses missing targets and
+    cycles, and load() hands out linked programs that are cached until the macro or anything in its
+    end-of-loop chain changes.
+
+    Every save is also recorded in a MacroHistory (history_dir, by default Macros/.history), which
+    keeps each version once by content for versions()/version()/rollback().
+    """
+    def __init__(self, macros_dir, log_callback=print, artifacts_dir=None, history_dir=None):
+        self.macros_dir = macros_dir
+        self.log_callback = log_callback
+        self.artifacts = ArtifactCache(artifacts_dir or os.path.join(macros_dir, COMPILED_DIRNAME), log_callback)
+        self.history = MacroHistory(history_dir or os.path.join(macros_dir, HISTORY_DIRNAME), log_callback)
+        self.parses = 0
+        self._entries = {}
+        self._by_name = {}
+        self._lock = threading.Lock()
+        self.graph = DependencyGraph()
+        # Set while a DirectoryWatcher feeds apply_event(); list() then trusts the cache instead of rescanning
+        self.watching = False
+
+    # --- Cache maintenance ---
+    def refresh(self):
+        """Full rescan; also drops compiled artifacts of content that no longer exists."""
+        with self._lock:
+            self._refresh_locked()
+            self.artifacts.prune({entry.digest for entry in self._entries.values() if entry.digest})
+
+    def _refresh_locked(self):
+        seen = set()
+        try:
+            scan = list(os.scandir(self.macros_dir))
+        except FileNotFoundError:
+            scan = []
+        for dirent in sorted(scan, key=lambda d: d.name):
+            if not is_macro_file(dirent.name) or not dirent.is_file():
+                continue
+            seen.add(dirent.path)
+            st = dirent.stat()
+            entry = self._entries.get(dirent.path)
+            if entry is None or entry.mtime_ns != st.st_mtime_ns or entry.size != st.st_size:
+                self._entries[dirent.path] = self._load(dirent.path, st)
+        for path in list(self._entries):
+            if path not in seen:
+                del self._entries[path]
+        self._index_names()
+
+    def _index_names(self):
+        old = self._by_name
+        self._by_name = {}
+        for path in sorted(self._entries, key=lambda p: (not p.endswith(BINARY_SUFFIX), not p.endswith(MACRO_SUFFIX), p)):
+            entry = self._entries[path]
+            if entry.macro is not None:
+                # .macro.bin, then .macro.json, win over a stale .json with the same name
+                self._by_name.setdefault(entry.name, entry)
+        changed = {name for name in old.keys() | self._by_name.keys() if old.get(name) is not self._by_name.get(name)}
+        self.graph.reset({name: entry.macro.get("end_of_loop_macro_name") for name, entry in self._by_name.items()},
+                         changed)
+
+    def _invalid_names(self):
+        return {name for name, entry in self._by_name.items() if entry.errors}
+
+    def apply_event(self, kind, path):
+        """Update the cache for one changed file (a watcher event); returns the affected macro name or None."""
+        if not is_macro_file(os.path.basename(path)):
+            return None
+        with self._lock:
+            old = self._entries.get(path)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                st = None
+            if st is None:
+                self._entries.pop(path, None)
+            elif old is None or old.mtime_ns != st.st_mtime_ns or old.size != st.st_size:
+                self._entries[path] = self._load(path, st)
+            self._index_names()
+            entry = self._entries.get(path) or old
+            return entry.name if entry else None
+
+    def _load(self, path, st):
+        self.parses += 1
+        macro = None
+        digest = None
+        binary = None
+        errors = None
+        try:
+            if path.endswith(BINARY_SUFFIX):
+                binary = BinaryMacro.open(path)
+                digest = hashlib.sha1(binary.buf).hexdigest()
+                macro = binary.macro
+            else:
+                with open(path, "rb") as f:
+                    raw = f.read()
+                digest = hashlib.sha1(raw).hexdigest()
+                data = json.loads(raw)
+                if isinstance(data, dict):
+                    macro = data
+                    errors = self._compile(path, digest, macro)
+        except (OSError, ValueError, struct.error) as e:
+            self.log_callback(f"Skipping unreadable macro file {os.path.basename(path)}: {e}")
+            binary = None
+        name = (macro or {}).get("name") or macro_name_from_filename(os.path.basename(path))
+        return _Entry(path, st.st_mtime_ns, st.st_size, macro, name, digest, binary, errors)
+
+    def _compile(self, path, digest, macro):
+        # An existing artifact means this exact content was validated before
+        if self.artifacts.has(digest):
+            return []
+        try:
+            self.artifacts.put(digest, macro)
+        except MacroValidationError as e:
+            self.log_callback(f"Macro file {os.path.basename(path)} is invalid: {e}")
+            return e.errors
+        return []
+
+    def _valid(self, entry):
+        try:
+            st = os.stat(entry.path)
+        except FileNotFoundError:
+            return False
+        return entry.mtime_ns == st.st_mtime_ns and entry.size == st.st_size
+
+    # --- Lookups ---
+    def list(self):
+        with self._lock:
+            if not self.watching:
+                self._refresh_locked()
+            return [self._by_name[name].json() for name in sorted(self._by_name)]
+
+    def listing(self, summary=False):
+        """(etag, macros) with etag a strong validator of the whole list.
+
+        With summary each macro is reduced to name, description, step count and the estimated
+        duration of one loop (steps plus end-of-loop steps) in ms.
+        """
+        with self._lock:
+            if not self.watching:
+                self._refresh_locked()
+            entries = [self._by_name[name] for name in sorted(self._by_name)]
+            tag = hashlib.sha1(("summary" if summary else "full").encode())
+            for entry in entries:
+                tag.update(f"\0{entry.name}\0{entry.digest}".encode())
+            if not summary:
+                return tag.hexdigest(), [entry.json() for entry in entries]
+            invalid = self._invalid_names()
+            return tag.hexdigest(), [self._summary(entry, invalid) for entry in entries]
+
+    def _summary(self, entry, invalid):
+        macro = entry.macro
+        duration_ms = entry.duration_ms
+        if macro.get("end_of_loop_macro_name"):
+            end_entry = self._by_name.get(macro["end_of_loop_macro_name"])
+            duration_ms += end_entry.duration_ms if end_entry else 0
+        elif macro.get("end_of_loop_macro"):
+            duration_ms += estimate_duration_ms(macro["end_of_loop_macro"])
+        return {
+            "name": entry.name,
+            "description": macro.get("description", ""),
+            "steps": len(macro.get("steps") or []),
+            "estimated_duration_ms": duration_ms,
+            # A macro whose end-of-loop chain is broken cannot run either
+            "errors": entry.errors or self.graph.problems(entry.name, invalid=invalid),
+        }
+
+    def search(self, text=None, tag=None, limit=MACRO_SEARCH_LIMIT):
+        """Summaries of macros whose name, description or step comments contain text and that carry tag.
+
+        A linear scan of the cached macros; MacroDB answers the same query from its indexes.
+        """
+        needle = text.lower() if text else None
+        tag = tag.strip().lower() if tag else None
+        with self._lock:
+            if not self.watching:
+                self._refresh_locked()
+            results = []
+            invalid = self._invalid_names()
+            for name in sorted(self._by_name):
+                macro = self._by_name[name].macro
+                if tag and tag not in macro_tags(macro):
+                    continue
+                if needle:
+                    haystack = "\n".join([name, macro.get("description") or ""] + step_comments(macro.get("steps"))
+                                         + step_comments(macro.get("end_of_loop_macro")))
+                    if needle not in haystack.lower():
+                        continue
+                results.append(self._summary(self._by_name[name], invalid))
+                if len(results) >= limit:
+                    break
+            return results
+
+    def tags(self):
+        with self._lock:
+            counts = {}
+            for entry in self._by_name.values():
+                for tag in macro_tags(entry.macro):
+                    counts[tag] = counts.get(tag, 0) + 1
+            return dict(sorted(counts.items()))
+
+    def _get_entry(self, name):
+        entry = self._by_name.get(name)
+        if entry is None or not self._valid(entry):
+            self._refresh_locked()
+            entry = self._by_name.get(name)
+        return entry
+
+    def get(self, name):
+        """The parsed macro called name, or None. Only this macro's file is stat()ed when it is cached."""
+        with self._lock:
+            entry = self._get_entry(name)
+            return entry.json() if entry else None
+
+    def detail(self, name):
+        """(etag, macro) for one macro, or (None, None) if it does not exist."""
+        with self._lock:
+            entry = self._get_entry(name)
+            return (entry.digest, entry.json()) if entry else (None, None)
+
+    def duplicates(self):
+        """Groups of macros with identical content under different names, from the cached macros."""
+        with self._lock:
+            if not self.watching:
+                self._refresh_locked()
+            for entry in self._by_name.values():
+                if entry.content is None:
+                    entry.content = content_digest(entry.json())
+            return group_duplicates({name: entry.content for name, entry in self._by_name.items()})
+
+    # --- History ---
+    def versions(self, name):
+        return self.history.versions(name)
+
+    def version(self, name, number):
+        return self.history.version(name, number)
+
+    def rollback(self, name, number):
+        """Save version number of a macro as its newest version; returns it, or None if there is no such version.
+
+        Raises MacroValidationError when that version can no longer be saved (e.g. its end-of-loop
+        macro is gone).
+        """
+        macro = self.history.version(name, number)
+        if macro is not None:
+            self.save(macro)
+        return macro
+
+    def path_for(self, name):
+        """Existing file of the macro, or where a new macro of that name is saved."""
+        with self._lock:
+            entry = self._by_name.get(name)
+            if entry is not None and os.path.exists(entry.path):
+                return entry.path
+        return os.path.join(self.macros_dir, f"{os.path.basename(name)}{MACRO_SUFFIX}")
+
+    def load(self, name):
+        """(macro, end_of_loop_steps) for running a macro, linked once and cached.
+
+        Raises FileNotFoundError if it does not exist and MacroValidationError if it, or a macro in
+        its end-of-loop chain, is invalid or missing. Steps of binary macros stay lazy sequences
+        here, so the engine streams them from the file.
+        """
+        with self._lock:
+            entry = self._get_entry(name)
+            if entry is None:
+                raise FileNotFoundError(name)
+            program, version = self.graph.program(name)
+            if program is not None and not self.watching and not all(map(self._valid, program[2])):
+                # Something in the chain was edited and nothing told us: rescan, which drops the program
+                self._refresh_locked()
+                entry = self._by_name.get(name)
+                if entry is None:
+                    raise FileNotFoundError(name)
+                program, version = self.graph.program(name)
+            if program is None:
+                program = self._link(entry)
+                self.graph.store_program(name, program, version)
+            return program[0], program[1]
+
+    def _link(self, entry):
+        # (macro, end_of_loop_steps, entries it was built from)
+        macro = self._runnable(entry)
+        problems = self.graph.problems(entry.name, invalid=self._invalid_names())
+        if problems:
+            raise MacroValidationError(problems)
+        end_steps = []
+        entries = [entry]
+        if macro.get("end_of_loop_macro_name"):
+            end_entry = self._by_name[macro["end_of_loop_macro_name"]]
+            end_steps = self._runnable(end_entry).get("steps", [])
+            entries.append(end_entry)
+        elif macro.get("end_of_loop_macro"):
+            end_steps = macro["end_of_loop_macro"]
+        return macro, end_steps, entries
+
+    def _runnable(self, entry):
+        if entry.errors:
+            raise MacroValidationError(entry.errors)
+        if entry.binary is not None:
+            return entry.macro
+        if entry.compiled is None:
+            if not self.artifacts.has(entry.digest):
+                # Deleted behind our back (or could not be stored): compile again
+                self.artifacts.put(entry.digest, entry.macro)
+            try:
+                entry.compiled = self.artifacts.open(entry.digest)
+            except (OSError, ValueError, struct.error) as e:
+                self.log_callback(f"Running {entry.name} from JSON, compiled form unusable: {e}")
+                return entry.macro
+        return entry.compiled.macro
+
+    # --- Writes ---
+    def save(self, macro):
+        """Validate, compile and write a macro. Raises MacroValidationError (nothing is written then).
+
+        Besides the macro itself, its end_of_loop_macro_name must name an existing, valid macro and
+        must not lead back to it.
+        """
+        compiled = compile_macro(macro)
+        with self._lock:
+            if not self.watching:
+                self._refresh_locked()
+            problems = self.graph.problems(macro["name"], target=macro.get("end_of_loop_macro_name"),
+                                           invalid=self._invalid_names())
+        if problems:
+            raise MacroValidationError(problems)
+        with self._lock:
+            previous = self._by_name.get(macro["name"])
+        path = self._write(macro, compiled, previous)
+        with self._lock:
+            self._entries.pop(path, None)
+            self._refresh_locked()
+        return path
+
+    def import_many(self, macros):
+        """Save already compiled macros, [(macro, compile_macro(macro))], as one batch.
+
+        Returns {name: errors} of the macros refused for their end-of-loop references (they may
+        refer to each other within the batch). The directory is rescanned once, after all files
+        are written.
+        """
+        batch = {macro["name"]: macro.get("end_of_loop_macro_name") for macro, _ in macros}
+        with self._lock:
+            if not self.watching:
+                self._refresh_locked()
+            refused = check_batch(self.graph.targets(), batch, self._invalid_names() - batch.keys())
+            previous = {name: self._by_name.get(name) for name in batch}
+        paths = [self._write(macro, compiled, previous[macro["name"]])
+                 for macro, compiled in macros if macro["name"] not in refused]
+        with self._lock:
+            for path in paths:
+                self._entries.pop(path, None)
+            self._refresh_locked()
+        return refused
+
+    def _write(self, macro, compiled, previous):
+        if previous is not None and not self.history.versions(macro["name"]):
+            # First save since history was kept: the version being replaced becomes version 1
+            self._record(previous.json())
+        path = self.path_for(macro["name"])
+        os.makedirs(self.macros_dir, exist_ok=True)
+        if path.endswith(BINARY_SUFFIX):
+            data = compiled
+        else:
+            data = json.dumps(macro, indent=2).encode("utf-8")
+            self.artifacts.store(hashlib.sha1(data).hexdigest(), compiled)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._record(macro)
+        return path
+
+    def _record(self, macro):
+        try:
+            self.history.record(macro)
+        except OSError as e:
+            # The save itself went through; only this version is missing from the history
+            self.log_callback(f"Could not record a version of {macro['name']}: {e}")
+
+    def delete(self, name):
+        with self._lock:
+            entry = self._by_name.get(name)
+            if entry is None:
+                self._refresh_locked()
+                entry = self._by_name.get(name)
+            if entry is None:
+                return False
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+            self._refresh_locked()
+            return True
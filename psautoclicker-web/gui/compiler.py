@@ -0,0 +1,65 @@
+import os
+from .macrobin import BINARY_SUFFIX, BinaryMacro, encode_macro
+from .schema import MacroValidationError, validate_macro
+
+def compile_macro(macro):
+    """Validate a macro and return its compiled form (the .macro.bin encoding). Raises MacroValidationError."""
+    errors = validate_macro(macro)
+    if errors:
+        raise MacroValidationError(errors)
+    return encode_macro(macro)
+
+class ArtifactCache:
+    """Compiled macros stored as <directory>/<sha1 of the macro file>.macro.bin.
+
+    An artifact only exists for content that passed validation, so finding one means the macro can be
+    run as is: no parsing of its steps, no validation. Content that is edited gets a new artifact;
+    prune() removes the ones no file refers to any more.
+    """
+    def __init__(self, directory, log_callback=print):
+        self.directory = directory
+        self.log_callback = log_callback
+        self.compiles = 0
+
+    def path_for(self, digest):
+        return os.path.join(self.directory, f"{digest}{BINARY_SUFFIX}")
+
+    def has(self, digest):
+        return os.path.exists(self.path_for(digest))
+
+    def open(self, digest):
+        return BinaryMacro.open(self.path_for(digest))
+
+    def put(self, digest, macro):
+        """Compile macro and store it under digest. Raises MacroValidationError if it is invalid."""
+        self.store(digest, compile_macro(macro))
+
+    def store(self, digest, data):
+        """Store an already compiled macro (compile_macro output) under digest."""
+        self.compiles += 1
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path_for(digest)
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            # Still valid, just not cached; it is compiled again next time
+            self.log_callback(f"Could not store compiled macro {os.path.basename(path)}: {e}")
+
+    def prune(self, digests):
+        """Delete artifacts whose digest is not in digests; returns how many were removed."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return 0
+        removed = 0
+        for name in names:
+            if name.endswith(BINARY_SUFFIX) and name[:-len(BINARY_SUFFIX)] not in digests:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
@@ -0,0 +1,290 @@
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from .session import SupervisedSession
+from .engine import MacroJob, STICK_DIRECTIONS, send_stick
+from .macrodb import open_macro_store
+from .jobs import JobStore
+from .runlog import RunLogWriter
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MACROS_DIR = os.path.join(PROJECT_ROOT, "Macros")
+RUN_LOGS_DIR = os.path.join(PROJECT_ROOT, "RunLogs")
+
+# --- Wire protocol ---
+# Every frame is a 5-byte header (type: u8, payload length: u32, network order) followed by the payload.
+# JSON requests carry {"op": ..., ...}; BUTTON/STICK frames are a compact fast path to the default
+# session that skips JSON entirely. OR a frame type with FLAG_NO_REPLY to get no reply at all.
+HEADER = struct.Struct("!BI")
+STICK_PAYLOAD = struct.Struct("!BBf")  # stick (0 = left, 1 = right), direction index, magnitude
+FRAME_REQUEST = 0x01
+FRAME_RESPONSE = 0x02
+FRAME_ERROR = 0x03
+FRAME_BUTTON = 0x10
+FRAME_STICK = 0x11
+FRAME_ACK = 0x12
+FLAG_NO_REPLY = 0x80
+MAX_PAYLOAD = 1 << 20
+STICKS = ("LEFT_STICK", "RIGHT_STICK")
+
+def default_socket_path():
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or "/tmp"
+    return os.path.join(runtime_dir, "psautoclicker.sock")
+
+def _recv_exact(conn, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = conn.recv(size - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+def read_frame(conn):
+    header = _recv_exact(conn, HEADER.size)
+    if header is None:
+        return None, None
+    frame_type, length = HEADER.unpack(header)
+    if length > MAX_PAYLOAD:
+        raise ValueError(f"Frame too large: {length} bytes")
+    payload = _recv_exact(conn, length) if length else b""
+    if payload is None:
+        return None, None
+    return frame_type, payload
+
+def write_frame(conn, frame_type, payload=b""):
+    conn.sendall(HEADER.pack(frame_type, len(payload)) + payload)
+
+class PSAutoDaemon:
+    """Headless host for sessions and macro jobs, controlled over a Unix domain socket."""
+    def __init__(self, socket_path=None, macros_dir=MACROS_DIR, log_callback=print, run_logs_dir=RUN_LOGS_DIR):
+        self.socket_path = socket_path or default_socket_path()
+        self.macros_dir = macros_dir
+        self.catalog = open_macro_store(macros_dir, log_callback=log_callback)
+        self.log_callback = log_callback
+        # sessions and default_host are shared by every client thread; both are guarded by _lock
+        self.sessions = {}
+        self.default_host = None
+        self._lock = threading.Lock()
+        # Running jobs by id (for stop); every job's record, bounded, lives in the store
+        self.jobs = {}
+        self.job_store = JobStore(log_callback=log_callback)
+        self.run_logs = RunLogWriter(run_logs_dir, log_callback=log_callback)
+        self._server = None
+        self._stop = threading.Event()
+
+    # --- Sessions ---
+    def connect(self, host):
+        with self._lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = SupervisedSession(host, log_callback=self.log_callback)
+                self.sessions[host] = session
+        if not session.is_connected():
+            started = time.perf_counter()
+            try:
+                session.connect()
+            except Exception:
+                with self._lock:
+                    if self.sessions.get(host) is session:
+                        del self.sessions[host]
+                raise
+            self.log_callback(f"Connected to {host} in {(time.perf_counter() - started) * 1000:.0f} ms")
+        with self._lock:
+            self.default_host = host
+        return session
+
+    def disconnect(self, host=None):
+        with self._lock:
+            host = host or self.default_host
+            session = self.sessions.pop(host, None)
+            if self.default_host == host:
+                self.default_host = next(iter(self.sessions), None)
+        if session:
+            session.close()
+
+    def _session(self, host=None):
+        with self._lock:
+            session = self.sessions.get(host or self.default_host)
+        if session is None:
+            raise RuntimeError("Not connected to any device")
+        return session
+
+    # --- Requests ---
+    def handle_request(self, req):
+        op = req.get("op")
+        if op == "ping":
+            return {"status": "ok"}
+        if op == "connect":
+            self.connect(req["host"])
+            return {"status": "connected", "host": req["host"]}
+        if op == "disconnect":
+            self.disconnect(req.get("host"))
+            return {"status": "disconnected"}
+        if op == "status":
+            with self._lock:
+                default_host, sessions = self.default_host, dict(self.sessions)
+            return {
+                "default_host": default_host,
+                "sessions": {host: s.status for host, s in sessions.items()},
+                "jobs": {job_id: record["status"] for job_id, record in self.job_store.items()},
+            }
+        if op == "button":
+            self._session(req.get("host")).controller.button(req["button"])
+            return {"status": "ok"}
+        if op == "stick":
+            send_stick(self._session(req.get("host")), req["stick"], req["direction"], req.get("magnitude", 1.0))
+            return {"status": "ok"}
+        if op == "run_macro":
+            return self.run_macro(req["name"], req.get("loop_count", 1), req.get("host"))
+        if op == "stop_macro":
+            job = self.jobs.get(req.get("job_id"))
+            if not job or not job.is_running():
+                raise RuntimeError("No running macro with that job_id")
+            job.stop()
+            return {"status": "stopping"}
+        if op == "job":
+            record = self.job_store.snapshot(req.get("job_id"), since=req.get("since", 0))
+            if record is None:
+                raise RuntimeError("Job not found")
+            return record
+        if op == "logs":
+            return self.run_logs.query(req["job_id"], since=req.get("since"), until=req.get("until"),
+                                       loop=req.get("loop"), text=req.get("q"), limit=req.get("limit", 500))
+        if op == "shutdown":
+            self._stop.set()
+            return {"status": "shutting down"}
+        raise ValueError(f"Unknown op: {op}")
+
+    def run_macro(self, name, loop_count=1, host=None):
+        requested_at = time.perf_counter()
+        session = self._session(host)
+        macro, end_steps = self.catalog.load(name)
+        job = MacroJob(name, macro, end_steps, session, loop_count=loop_count, requested_at=requested_at,
+                       on_finish=self._job_finished, log_max_lines=self.job_store.log_max_lines)
+        job.run_log = self.run_logs.open(job.job_id)
+        self.jobs[job.job_id] = job
+        self.job_store.add(job.job_id, job.record)
+        job.start()
+        return {"job_id": job.job_id, "status": "started"}
+
+    def _job_finished(self, job):
+        self.jobs.pop(job.job_id, None)
+        self.job_store.finish(job.job_id)
+
+    def _handle_frame(self, frame_type, payload):
+        kind = frame_type & ~FLAG_NO_REPLY
+        if kind == FRAME_BUTTON:
+            self._session().controller.button(payload.decode("ascii"))
+            return FRAME_ACK, b""
+        if kind == FRAME_STICK:
+            stick, direction, magnitude = STICK_PAYLOAD.unpack(payload)
+            send_stick(self._session(), STICKS[stick], STICK_DIRECTIONS[direction], magnitude)
+            return FRAME_ACK, b""
+        if kind == FRAME_REQUEST:
+            response = self.handle_request(json.loads(payload))
+            return FRAME_RESPONSE, json.dumps(response, separators=(",", ":")).encode()
+        raise ValueError(f"Unknown frame type: {frame_type:#x}")
+
+    # --- Server ---
+    def serve_forever(self):
+        if not hasattr(socket, "AF_UNIX"):
+            raise RuntimeError("Unix domain sockets are not supported on this platform")
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Owner-only from the moment it exists, not just after a chmod
+        old_umask = os.umask(0o077)
+        try:
+            self._server.bind(self.socket_path)
+        finally:
+            os.umask(old_umask)
+        os.chmod(self.socket_path, 0o600)
+        self._server.listen(16)
+        self._server.settimeout(0.5)
+        self.log_callback(f"PSAutoClicker daemon listening on {self.socket_path}")
+        try:
+            while not self._stop.is_set():
+                try:
+                    conn, _ = self._server.accept()
+                except socket.timeout:
+                    continue
+                threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+        finally:
+            self.close()
+
+    def _serve_client(self, conn):
+        with conn:
+            while not self._stop.is_set():
+                try:
+                    frame_type, payload = read_frame(conn)
+                except (OSError, ValueError):
+                    return
+                if frame_type is None:
+                    return
+                try:
+                    reply_type, reply = self._handle_frame(frame_type, payload)
+                except Exception as e:
+                    reply_type, reply = FRAME_ERROR, str(e).encode()
+                if frame_type & FLAG_NO_REPLY:
+                    # Fire-and-forget callers never read a reply, so errors can only be logged
+                    if reply_type == FRAME_ERROR:
+                        self.log_callback(f"Daemon input error: {reply.decode(errors='replace')}")
+                    continue
+                try:
+                    write_frame(conn, reply_type, reply)
+                except OSError:
+                    return
+
+    def close(self):
+        self._stop.set()
+        for job in list(self.jobs.values()):
+            job.stop()
+        with self._lock:
+            hosts = list(self.sessions)
+        for host in hosts:
+            self.disconnect(host)
+        if self._server:
+            self._server.close()
+            self._server = None
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+class DaemonError(RuntimeError):
+    pass
+
+class DaemonClient:
+    """Minimal client for scripts: keeps one connection open and reuses it for every call."""
+    def __init__(self, socket_path=None):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path or default_socket_path())
+
+    def _call(self, frame_type, payload=b""):
+        write_frame(self.sock, frame_type, payload)
+        if frame_type & FLAG_NO_REPLY:
+            return None
+        reply_type, reply = read_frame(self.sock)
+        if reply_type is None:
+            raise DaemonError("Daemon closed the connection")
+        if reply_type == FRAME_ERROR:
+            raise DaemonError(reply.decode(errors="replace"))
+        if reply_type == FRAME_RESPONSE:
+            return json.loads(reply)
+        return None
+
+    def request(self, op, **kwargs):
+        kwargs["op"] = op
+        return self._call(FRAME_REQUEST, json.dumps(kwargs, separators=(",", ":")).encode())
+
+    def button(self, name, wait=True):
+        self._call(FRAME_BUTTON | (0 if wait else FLAG_NO_REPLY), name.encode("ascii"))
+
+    def stick(self, stick, direction, magnitude=1.0, wait=True):
+        payload = STICK_PAYLOAD.pack(STICKS.index(stick), STICK_DIRECTIONS.index(direction), magnitude)
+        self._call(FRAME_STICK | (0 if wait else FLAG_NO_REPLY), payload)
+
+    def close(self):
+        self.sock.close()
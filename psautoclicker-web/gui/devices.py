@@ -0,0 +1,132 @@
+import copy
+import json
+import os
+import threading
+
+# Edits within this window after the first unsaved one are written together
+DEVICE_WRITE_DELAY_S = 0.2
+
+class DeviceRegistry:
+    """Saved devices held in memory and persisted to a JSON file ({key: {"host", "label", "warm"}}).
+
+    Reads never touch the file. Every edit marks the registry dirty; one background write, started
+    DEVICE_WRITE_DELAY_S after the first unsaved edit, persists the latest state through a temp file
+    and os.replace, so the file is never seen half-written. The file is read at startup and again
+    only through reload() when something else changed it.
+    """
+    def __init__(self, path, write_delay=DEVICE_WRITE_DELAY_S, log_callback=print):
+        self.path = path
+        self.write_delay = write_delay
+        self.log_callback = log_callback
+        self.writes = 0
+        self._lock = threading.Lock()
+        self._timer = None
+        self._dirty = False
+        # (mtime_ns, size) of our own last write, so reload() can tell it from outside edits
+        self._written_sig = None
+        devices = self._read()
+        self._devices = devices if devices is not None else {}
+        if devices is None or not os.path.exists(path):
+            self._schedule_locked()
+
+    # --- Reads ---
+    def snapshot(self):
+        with self._lock:
+            return copy.deepcopy(self._devices)
+
+    def get(self, key):
+        with self._lock:
+            device = self._devices.get(key)
+            return dict(device) if device is not None else None
+
+    # --- Edits ---
+    def put(self, key, device):
+        with self._lock:
+            self._devices[key] = dict(device)
+            self._schedule_locked()
+
+    def update(self, key, **fields):
+        """Merge fields into an existing device; returns the updated device or None if there is none."""
+        with self._lock:
+            device = self._devices.get(key)
+            if device is None:
+                return None
+            device.update(fields)
+            self._schedule_locked()
+            return dict(device)
+
+    def delete(self, key):
+        with self._lock:
+            if self._devices.pop(key, None) is None:
+                return False
+            self._schedule_locked()
+            return True
+
+    # --- Persistence ---
+    def _read(self):
+        # The file's devices, {} if it does not exist, None if it is unusable (it is then rewritten)
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            self.log_callback(f"Error reading {os.path.basename(self.path)}: {e}, resetting.")
+            return None
+        if not isinstance(data, dict):
+            self.log_callback(f"{os.path.basename(self.path)} is not a dict, resetting.")
+            return None
+        return data
+
+    def _schedule_locked(self):
+        self._dirty = True
+        if self._timer is None:
+            self._timer = threading.Timer(self.write_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Write pending edits now (also called by the timer and at shutdown)."""
+        with self._lock:
+            self._timer = None
+            if not self._dirty:
+                return
+            data = json.dumps(self._devices, indent=2)
+            self._dirty = False
+            tmp_path = self.path + ".tmp"
+            try:
+                with open(tmp_path, "w") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+                st = os.stat(self.path)
+                self._written_sig = (st.st_mtime_ns, st.st_size)
+                self.writes += 1
+            except OSError as e:
+                self.log_callback(f"Could not save {os.path.basename(self.path)}: {e}")
+                self._schedule_locked()
+
+    def reload(self):
+        """Pick up a change made to the file by someone else; returns True if the registry changed.
+
+        Our own writes are recognised and ignored, and so is the file while edits made here are still
+        waiting to be written (they overwrite it). A deleted or unreadable file is written again from memory.
+        """
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                self._schedule_locked()
+                return False
+            if (st.st_mtime_ns, st.st_size) == self._written_sig or self._dirty:
+                return False
+            devices = self._read()
+            if devices is None:
+                self._schedule_locked()
+                return False
+            self._written_sig = (st.st_mtime_ns, st.st_size)
+            if devices == self._devices:
+                return False
+            self._devices = devices
+            return True
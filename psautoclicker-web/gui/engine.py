@@ -0,0 +1,369 @@
+import logging
+import threading
+from collections import deque
+from itertools import islice
+import time
+import uuid
+from .session import SessionLost
+from .stats import RunStats
+
+logger = logging.getLogger(__name__)
+
+STICK_DIRECTIONS = ("UP", "DOWN", "LEFT", "RIGHT", "NEUTRAL")
+
+def stick_point(direction, magnitude):
+    # pyremoteplay expects: X Axis: Left -1.0, Right 1.0; Y Axis: Up -1.0, Down 1.0
+    if direction == "UP":
+        return (0.0, -magnitude)
+    elif direction == "DOWN":
+        return (0.0, magnitude)
+    elif direction == "LEFT":
+        return (-magnitude, 0.0)
+    elif direction == "RIGHT":
+        return (magnitude, 0.0)
+    elif direction == "NEUTRAL":
+        return (0.0, 0.0)
+    raise ValueError(f"Unknown direction: {direction}")
+
+def is_stick_action(action):
+    return isinstance(action, (list, tuple)) and len(action) == 3 and action[0] in ("LEFT_STICK", "RIGHT_STICK")
+
+def estimate_duration_ms(steps):
+    """Time one pass over steps takes: the sum of their delays, REPEAT blocks counted n times.
+
+    Autoclickers run in the background and do not add to it.
+    """
+    total = 0
+    for step_tuple in steps or []:
+        try:
+            step, delay_ms = step_tuple[0], step_tuple[1]
+            if isinstance(step, list) and len(step) >= 3 and step[0] == "REPEAT":
+                total += int(step[1]) * estimate_duration_ms(step[2])
+            total += int(delay_ms)
+        except (IndexError, TypeError, ValueError):
+            continue  # malformed step; the engine reports it when run
+    return total
+
+def send_stick(session, stick, direction, magnitude):
+    session.controller.stick(stick.replace("_STICK", "").lower(), point=stick_point(direction, magnitude))
+    session.controller.update_sticks()
+
+# --- Macro Step Execution ---
+def _send_input(session, send, log_callback, label):
+    # Bad input values are logged and skipped; anything else means the session is gone
+    try:
+        send()
+        return True
+    except (ValueError, KeyError) as e:
+        log_callback(f"Error sending {label}: {e}")
+        return False
+    except Exception as e:
+        session.mark_lost(e)
+        raise SessionLost(str(e))
+
+def new_input_counters():
+    return {"button": 0, "stick": 0, "autoclicker": 0}
+
+def execute_macro_steps(steps, log_callback, session, stop_event=None, start_index=0, on_step_done=None,
+                        counters=None, trace=False, on_step_start=None, on_error=None, resume_path=None, on_progress=None):
+    # Per-input lines are only formatted when trace is on; counters (see new_input_counters) are always kept.
+    # on_step_start(index, step, late_ms) gets how far behind its schedule (previous start + delay) each step began;
+    # on_error() is called for every input that could not be sent.
+    # on_progress(path) is called after every completed step, nested ones included: path is [index] for a
+    # top-level step and [index, iteration, nested index, ...] for one inside a REPEAT block. Passing the
+    # last such path as resume_path continues right after that step (and overrides start_index).
+    if counters is None:
+        counters = new_input_counters()
+    resume_inner = None
+    if resume_path:
+        start_index = resume_path[0] + 1 if len(resume_path) == 1 else resume_path[0]
+        resume_inner = resume_path[1:] or None
+    scheduled = None
+    for index in range(start_index, len(steps)):
+        step_tuple = steps[index]
+        if stop_event and stop_event.is_set():
+            log_callback("Macro stopped by user.")
+            raise RuntimeError("Macro stopped by user")
+        if len(step_tuple) == 3:
+            step, delay_ms, comment = step_tuple
+        else:
+            step, delay_ms = step_tuple
+            comment = None
+        if not session:
+            log_callback("Device disconnected. Stopping macro.")
+            raise RuntimeError("Device disconnected")
+        if not session.is_connected():
+            raise SessionLost("Session not connected")
+        started = time.monotonic()
+        if on_step_start:
+            on_step_start(index, step, 0.0 if scheduled is None else (started - scheduled) * 1000)
+        if isinstance(step, list) and len(step) >= 3 and step[0] == "REPEAT":
+            repeat_count = step[1]
+            nested_steps = step[2]
+            first_iteration, nested_resume = 0, None
+            if resume_inner and index == start_index:
+                first_iteration, nested_resume = resume_inner[0], resume_inner[1:] or None
+                log_callback(f"Repeat block: {repeat_count} times (resuming at iteration {first_iteration + 1})")
+            else:
+                log_callback(f"Repeat block: {repeat_count} times")
+            for i in range(first_iteration, repeat_count):
+                if stop_event and stop_event.is_set():
+                    log_callback("Macro stopped by user.")
+                    raise RuntimeError("Macro stopped by user")
+                if trace:
+                    log_callback(f"Repeat iteration {i+1} of {repeat_count}")
+                nested_progress = None
+                if on_progress:
+                    def nested_progress(path, index=index, i=i):
+                        on_progress([index, i] + path)
+                execute_macro_steps(nested_steps, log_callback, session, stop_event=stop_event,
+                                    counters=counters, trace=trace, on_error=on_error,
+                                    resume_path=nested_resume, on_progress=nested_progress)
+                nested_resume = None
+            if comment:
+                log_callback(f"Repeat comment: {comment}")
+            scheduled = time.monotonic() + delay_ms / 1000.0
+            if delay_ms > 0:
+                time.sleep(delay_ms / 1000.0)
+            if on_step_done:
+                on_step_done(index)
+            if on_progress:
+                on_progress([index])
+            continue
+        # A bare stick step is itself a 3-item list; only other lists are simultaneous actions
+        if isinstance(step, list) and not is_stick_action(step):
+            actions = step
+        else:
+            actions = [step]
+        autoclickers_started = []
+        for action in actions:
+            if isinstance(action, dict) and action.get('type') == 'autoclicker':
+                def ac_thread(button, interval, duration, stop_event):
+                    start_time = time.time()
+                    while (duration is None or (time.time() - start_time) < duration) and session.is_connected() and (not stop_event or not stop_event.is_set()):
+                        try:
+                            session.controller.button(button)
+                        except Exception as e:
+                            log_callback(f"Autoclicker error: {e}")
+                            if on_error:
+                                on_error()
+                            session.mark_lost(e)
+                            break
+                        time.sleep(interval / 1000.0)
+                t = threading.Thread(target=ac_thread, args=(action['button'], action['interval'], action.get('duration', None), stop_event), daemon=True)
+                t.start()
+                counters["autoclicker"] += 1
+                autoclickers_started.append(action['button'])
+            elif isinstance(action, (list, tuple)) and len(action) == 3:
+                stick, direction, magnitude = action
+                if direction not in STICK_DIRECTIONS:
+                    log_callback(f"Unknown stick direction: {direction}")
+                    if on_error:
+                        on_error()
+                    continue
+                if _send_input(session, lambda: send_stick(session, stick, direction, magnitude), log_callback, "stick"):
+                    counters["stick"] += 1
+                    if trace:
+                        log_callback(f"Macro step: Stick {action}")
+                elif on_error:
+                    on_error()
+            else:
+                if _send_input(session, lambda: session.controller.button(action), log_callback, "button"):
+                    counters["button"] += 1
+                    if trace:
+                        log_callback(f"Macro step: Button {action}")
+                elif on_error:
+                    on_error()
+        if autoclickers_started:
+            log_callback(f"Started autoclicker(s) in macro: {', '.join(map(str, autoclickers_started))}")
+        if comment:
+            log_callback(f"Step comment: {comment}")
+        scheduled = started + delay_ms / 1000.0
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000.0)
+        if on_step_done:
+            on_step_done(index)
+        if on_progress:
+            on_progress([index])
+
+def describe_resume(path):
+    """Where a run resuming after path (see execute_macro_steps) continues, for log lines."""
+    if len(path) == 1:
+        return f"step {path[0] + 2}"
+    return f"step {path[0] + 1}, repeat iteration {path[1] + 1} after nested step {path[2] + 1}"
+
+def log_since(record, since):
+    """Return (first_seq, lines) for the log lines of a job record newer than sequence number since."""
+    log = record["log"]
+    first_seq = record["log_seq"] - len(log) + 1
+    start = max(0, since + 1 - first_seq)
+    return first_seq + start, list(islice(log, start, None))
+
+class MacroJob:
+    """One run of a macro on one session, in its own thread.
+
+    self.record is the JSON-serialisable job state served by the status endpoints. on_log is
+    called as on_log(job, msg) after every log line; on_finish(job) once the thread exits.
+    With log_max_lines the log is a ring buffer that keeps only the newest lines. Per-input log lines
+    are written only with trace_inputs (default: when this module's logger is enabled for DEBUG);
+    otherwise each loop ends with a one-line input count summary. With run_log (a runlog.RunLog) the
+    run's log lines, steps (with scheduled vs actual start) and loop boundaries are also written to disk.
+    """
+    def __init__(self, macro_name, macro, end_steps, session, loop_count=1, job_id=None,
+                 on_log=None, on_finish=None, requested_at=None, log_max_lines=None, trace_inputs=None, run_log=None):
+        self.job_id = job_id or str(uuid.uuid4())
+        self.macro_name = macro_name
+        self.macro = macro
+        self.end_steps = end_steps
+        self.session = session
+        self.loop_count = loop_count
+        self.on_log = on_log
+        self.on_finish = on_finish
+        self.run_log = run_log
+        self.requested_at = requested_at or time.perf_counter()
+        self.trace_inputs = logger.isEnabledFor(logging.DEBUG) if trace_inputs is None else trace_inputs
+        self.counters = new_input_counters()
+        self.stats = RunStats()
+        self._stats_published = 0.0
+        self.stop_event = threading.Event()
+        self._thread = None
+        self.record = {
+            "status": "running",
+            "log": deque(maxlen=log_max_lines),
+            # Sequence number of the newest log line (1-based, never reused), for incremental streaming
+            "log_seq": 0,
+            "host": session.host,
+            # Last fully completed step of the current loop/phase; a resume restarts right after it.
+            # path locates it inside REPEAT blocks too (see execute_macro_steps)
+            "progress": {"loop": 0, "phase": "main", "step": -1, "path": [-1]},
+            "downtime_s": 0.0,
+            "resumes": 0,
+            "start_latency_ms": None,
+            # Inputs sent so far, by kind
+            "inputs": self.counters,
+            # RunStats snapshot, refreshed at most once a second and at every loop end
+            "stats": self.stats.snapshot(self.counters),
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def log(self, msg):
+        self.record["log"].append(msg)
+        self.record["log_seq"] += 1
+        if self.run_log:
+            self.run_log.event("log", seq=self.record["log_seq"], loop=self.record["progress"]["loop"], msg=msg)
+        if self.on_log:
+            self.on_log(self, msg)
+
+    def _run_phase(self, steps, phase):
+        job = self.record
+        job["progress"]["phase"] = phase
+        job["progress"]["step"] = -1
+        job["progress"]["path"] = [-1]
+        def on_progress(path):
+            job["progress"]["path"] = path
+            # step stays the last completed top-level step; a nested path is still inside path[0]
+            job["progress"]["step"] = path[0] if len(path) == 1 else path[0] - 1
+        def on_step_start(index, step, late_ms):
+            self.stats.step(late_ms)
+            if self.run_log:
+                self.run_log.event("step", loop=job["progress"]["loop"], phase=phase, step=index, action=step,
+                                   scheduled_ts=time.time() - late_ms / 1000.0, late_ms=round(late_ms, 3))
+            now = time.monotonic()
+            if now - self._stats_published >= 1.0:
+                self._publish_stats(now)
+        while True:
+            try:
+                execute_macro_steps(steps, self.log, self.session, stop_event=self.stop_event,
+                                    resume_path=job["progress"]["path"], on_progress=on_progress,
+                                    counters=self.counters, trace=self.trace_inputs, on_step_start=on_step_start,
+                                    on_error=self.stats.error)
+                return
+            except SessionLost:
+                self.stats.error()
+                job["status"] = "reconnecting"
+                self.log("Connection lost. Waiting for the session to reconnect...")
+                started = time.monotonic()
+                ready = self.session.wait_until_ready(stop_event=self.stop_event)
+                job["downtime_s"] += time.monotonic() - started
+                if not ready:
+                    if self.stop_event.is_set():
+                        raise RuntimeError("Macro stopped by user")
+                    self.log("Device disconnected. Stopping macro.")
+                    raise RuntimeError("Device disconnected")
+                job["resumes"] += 1
+                job["status"] = "running"
+                if self.run_log:
+                    self.run_log.event("reconnect", loop=job["progress"]["loop"], downtime_s=round(time.monotonic() - started, 3))
+                self.log(f"Reconnected after {time.monotonic() - started:.1f}s. "
+                         f"Resuming {phase} steps at {describe_resume(job['progress']['path'])}.")
+
+    def _publish_stats(self, now=None):
+        self._stats_published = now or time.monotonic()
+        self.record["stats"] = self.stats.snapshot(self.counters)
+
+    def _log_loop_summary(self, loop_num, before, elapsed):
+        self.stats.loop_done()
+        self._publish_stats()
+        sent = {kind: self.counters[kind] - before[kind] for kind in self.counters}
+        if self.run_log:
+            self.run_log.event("loop_end", loop=loop_num, elapsed_s=round(elapsed, 6), inputs=sent)
+        self.log(f"Loop {loop_num} done in {elapsed:.2f}s: {sent['button']} buttons, "
+                 f"{sent['stick']} sticks, {sent['autoclicker']} autoclickers")
+
+    def _run(self):
+        job = self.record
+        try:
+            job["start_latency_ms"] = round((time.perf_counter() - self.requested_at) * 1000, 3)
+            if self.run_log:
+                self.run_log.event("run_start", job_id=self.job_id, macro=self.macro_name,
+                                   host=self.session.host, loop_count=self.loop_count)
+            self.log(f"Starting macro: {self.macro_name}")
+            loop_num = 0
+            while (self.loop_count == -1 or loop_num < self.loop_count) and not self.stop_event.is_set():
+                job["progress"]["loop"] = loop_num + 1
+                if self.run_log:
+                    self.run_log.event("loop_start", loop=loop_num + 1)
+                self.log(f"Macro loop {loop_num+1}")
+                loop_started = time.perf_counter()
+                before = dict(self.counters)
+                try:
+                    self._run_phase(self.macro.get("steps", []), "main")
+                except RuntimeError:
+                    job["status"] = "error"
+                    return
+                if self.end_steps and not self.stop_event.is_set():
+                    self.log("Running end-of-loop macro")
+                    try:
+                        self._run_phase(self.end_steps, "end_of_loop")
+                    except RuntimeError:
+                        job["status"] = "error"
+                        return
+                self._log_loop_summary(loop_num + 1, before, time.perf_counter() - loop_started)
+                loop_num += 1
+            if self.stop_event.is_set():
+                job["status"] = "stopped"
+                self.log("Macro stopped by user.")
+            else:
+                job["status"] = "finished"
+                self.log("Macro finished.")
+        except Exception as e:
+            job["status"] = "error"
+            self.log(f"Macro error: {e}")
+        finally:
+            self._publish_stats()
+            if self.run_log:
+                self.run_log.event("run_end", status=job["status"], stats=job["stats"],
+                                   resumes=job["resumes"], downtime_s=round(job["downtime_s"], 3))
+                self.run_log.close()
+            if self.on_finish:
+                self.on_finish(self)
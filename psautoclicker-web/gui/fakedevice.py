@@ -0,0 +1,226 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+# Select with PSAUTO_DEVICE=fake (every host is fake) or per host with a "fake:" prefix, e.g. "fake:ps5-1".
+# Behaviour is tuned with:
+#   PSAUTO_FAKE_LATENCY_MS         base delay added to every input (default 0)
+#   PSAUTO_FAKE_JITTER_MS          random +/- jitter on top of the latency (default 0)
+#   PSAUTO_FAKE_DROP_RATE          probability (0..1) that an input drops the session (default 0)
+#   PSAUTO_FAKE_DISCONNECT_AFTER_S drop every session after this many seconds (default: never)
+#   PSAUTO_FAKE_CONNECT_MS         time create_session()/connect() take (default 0)
+#   PSAUTO_FAKE_SEED               RNG seed for reproducible jitter/drops
+FAKE_HOST_PREFIX = "fake:"
+
+# The fake device in use for each host (see fake_device), so tests and the web API can inspect them
+FAKE_DEVICES = {}
+_FAKE_DEVICES_LOCK = threading.Lock()
+
+class FakeSessionDropped(ConnectionError):
+    pass
+
+def fake_device(host, env=None):
+    """The FakeRPDevice for host: created from the environment config on first use, then reused.
+
+    Like a real console, every session to the same host talks to the same device, so inputs and
+    injected disconnects seen through FAKE_DEVICES are those of the sessions in use.
+    """
+    with _FAKE_DEVICES_LOCK:
+        device = FAKE_DEVICES.get(host)
+        if device is None:
+            device = FAKE_DEVICES[host] = FakeRPDevice.from_env(host, env)
+        return device
+
+def fake_mode_enabled(env=None):
+    env = os.environ if env is None else env
+    return env.get("PSAUTO_DEVICE", "").lower() == "fake"
+
+def is_fake_host(host):
+    return fake_mode_enabled() or str(host).startswith(FAKE_HOST_PREFIX)
+
+def config_from_env(env=None):
+    env = os.environ if env is None else env
+    after = env.get("PSAUTO_FAKE_DISCONNECT_AFTER_S")
+    seed = env.get("PSAUTO_FAKE_SEED")
+    return {
+        "latency_ms": float(env.get("PSAUTO_FAKE_LATENCY_MS", 0)),
+        "jitter_ms": float(env.get("PSAUTO_FAKE_JITTER_MS", 0)),
+        "drop_rate": float(env.get("PSAUTO_FAKE_DROP_RATE", 0)),
+        "disconnect_after_s": float(after) if after else None,
+        "connect_ms": float(env.get("PSAUTO_FAKE_CONNECT_MS", 0)),
+        "seed": int(seed) if seed else None,
+    }
+
+class FakeController:
+    """Mimics pyremoteplay's Controller: button()/async_button(), stick(), update_sticks()."""
+    def __init__(self, device):
+        self.device = device
+        self._sticks = {"left": (0.0, 0.0), "right": (0.0, 0.0)}
+
+    def button(self, name, action="tap", delay=0.1):
+        self.device._deliver("button", (str(name).upper(), action))
+
+    async def async_button(self, name, action="tap", delay=0.1):
+        await asyncio.get_running_loop().run_in_executor(None, self.button, name, action, delay)
+
+    def stick(self, stick_name, axis=None, value=None, point=None):
+        stick_name = stick_name.lower()
+        if stick_name not in self._sticks:
+            raise ValueError(f"Invalid stick: {stick_name}")
+        if point is not None:
+            x, y = point
+        else:
+            x, y = self._sticks[stick_name]
+            if axis == "x":
+                x = value
+            elif axis == "y":
+                y = value
+            else:
+                raise ValueError(f"Invalid axis: {axis}")
+        if not (-1.0 <= x <= 1.0 and -1.0 <= y <= 1.0):
+            raise ValueError("Stick values must be between -1.0 and 1.0")
+        self._sticks[stick_name] = (float(x), float(y))
+
+    def update_sticks(self):
+        self.device._deliver("sticks", dict(self._sticks))
+
+    @property
+    def stick_state(self):
+        return dict(self._sticks)
+
+class FakeRPDevice:
+    """Drop-in stand-in for pyremoteplay.RPDevice that needs no console.
+
+    Every delivered input is recorded as (monotonic_ts, kind, value) in self.inputs. Latency,
+    jitter and disconnects are injected according to the config (see config_from_env).
+    """
+    def __init__(self, host, latency_ms=0.0, jitter_ms=0.0, drop_rate=0.0, disconnect_after_s=None,
+                 connect_ms=0.0, seed=None, users=("FakeUser",), is_on=True, record_inputs=True):
+        self.host = host
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.drop_rate = drop_rate
+        self.disconnect_after_s = disconnect_after_s
+        self.connect_ms = connect_ms
+        self.record_inputs = record_inputs
+        self.inputs = []
+        self.sessions_created = 0
+        self.drops = 0
+        self._users = list(users)
+        self._on = is_on
+        self._session_user = None
+        self._session_started = None
+        self._connected = False
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.controller = FakeController(self)
+
+    @classmethod
+    def from_env(cls, host, env=None):
+        return cls(host, **config_from_env(env))
+
+    # --- Status / users ---
+    def get_status(self):
+        return {"status-code": 200 if self._on else 620, "host-name": self.host, "host-type": "PS5"}
+
+    async def async_get_status(self):
+        return self.get_status()
+
+    @property
+    def status(self):
+        return self.get_status()
+
+    @property
+    def is_on(self):
+        return self._on
+
+    def get_users(self):
+        return list(self._users)
+
+    def wakeup(self, user=None):
+        self._on = True
+
+    async def async_wait_for_wakeup(self, timeout=60):
+        return self._on
+
+    # --- Session ---
+    def create_session(self, user, **kwargs):
+        if user not in self._users:
+            raise ValueError(f"Unknown user: {user}")
+        self._sleep_ms(self.connect_ms)
+        with self._lock:
+            self._session_user = user
+            self._session_started = time.monotonic()
+            self._connected = True
+            self.sessions_created += 1
+        return True
+
+    async def connect(self):
+        return self._session_user is not None and self.connected
+
+    async def async_wait_for_session(self, timeout=5):
+        return self.connected
+
+    @property
+    def connected(self):
+        with self._lock:
+            self._check_scheduled_drop()
+            return self._connected
+
+    @property
+    def session(self):
+        return self if self.connected else None
+
+    def disconnect(self):
+        with self._lock:
+            self._connected = False
+            self._session_user = None
+
+    def inject_disconnect(self):
+        """Drop the current session as if the network went away."""
+        with self._lock:
+            if self._connected:
+                self._connected = False
+                self.drops += 1
+
+    # --- Internals ---
+    def _check_scheduled_drop(self):
+        if (self._connected and self.disconnect_after_s is not None
+                and time.monotonic() - self._session_started >= self.disconnect_after_s):
+            self._connected = False
+            self.drops += 1
+
+    def _sleep_ms(self, ms):
+        if ms > 0:
+            time.sleep(ms / 1000.0)
+
+    def _deliver(self, kind, value):
+        with self._lock:
+            self._check_scheduled_drop()
+            if not self._connected:
+                raise FakeSessionDropped(f"Fake session to {self.host} is not connected")
+            if self.drop_rate and self._rng.random() < self.drop_rate:
+                self._connected = False
+                self.drops += 1
+                raise FakeSessionDropped(f"Injected disconnect on {self.host}")
+            delay = self.latency_ms
+            if self.jitter_ms:
+                delay = max(0.0, delay + self._rng.uniform(-self.jitter_ms, self.jitter_ms))
+        self._sleep_ms(delay)
+        if self.record_inputs:
+            self.inputs.append((time.monotonic(), kind, value))
+
+    def summary(self):
+        return {
+            "host": self.host,
+            "connected": self.connected,
+            "inputs": len(self.inputs),
+            "sessions_created": self.sessions_created,
+            "drops": self.drops,
+            "latency_ms": self.latency_ms,
+            "jitter_ms": self.jitter_ms,
+            "drop_rate": self.drop_rate,
+            "disconnect_after_s": self.disconnect_after_s,
+        }
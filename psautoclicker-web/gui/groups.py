@@ -0,0 +1,50 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Upper bound on concurrent operations per group request; connects are mostly waiting on the network
+GROUP_MAX_PARALLEL = 8
+
+def read_groups(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except Exception:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def write_groups(path, groups):
+    with open(path, "w") as f:
+        json.dump(groups, f, indent=2)
+
+def fan_out(hosts, operation, max_parallel=GROUP_MAX_PARALLEL):
+    """Run operation(host) for every host concurrently and aggregate the outcome.
+
+    A failing host never aborts the others; its exception text is reported in its result.
+    """
+    def run_one(host):
+        started = time.perf_counter()
+        try:
+            result = {"ok": True, "result": operation(host)}
+        except Exception as e:
+            result = {"ok": False, "error": str(e)}
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return host, result
+
+    started = time.perf_counter()
+    hosts = list(dict.fromkeys(hosts))
+    results = {}
+    if hosts:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(hosts)))) as pool:
+            for host, result in pool.map(run_one, hosts):
+                results[host] = result
+    succeeded = sum(1 for r in results.values() if r["ok"])
+    return {
+        "results": results,
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
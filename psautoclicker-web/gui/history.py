@@ -0,0 +1,123 @@
+import difflib
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Macro versions live in this subdirectory of the macros dir (see MacroHistory)
+HISTORY_DIRNAME = ".history"
+
+def macro_content(macro):
+    """Canonical bytes of a macro without its name: what versions and duplicates are keyed by."""
+    body = {key: value for key, value in macro.items() if key != "name"}
+    return json.dumps(body, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+def content_digest(macro):
+    return hashlib.sha1(macro_content(macro)).hexdigest()
+
+def diff_macros(old, new, old_label, new_label):
+    """Unified diff of two macros as they look in a .macro.json file."""
+    return "".join(difflib.unified_diff(
+        json.dumps(old, indent=2).splitlines(keepends=True) if old is not None else [],
+        json.dumps(new, indent=2).splitlines(keepends=True) if new is not None else [],
+        old_label, new_label))
+
+def version_info(version, digest, saved, steps):
+    return {"version": version, "digest": digest, "saved": saved, "steps": steps}
+
+class MacroHistory:
+    """Every saved version of every macro, for MacroCatalog.
+
+    Contents are stored once as objects/<sha1[:2]>/<sha1[2:]>.json, keyed by content_digest(), so
+    a macro saved again unchanged, rolled back, or identical to another macro under a different
+    name takes no extra space. index/<name>.jsonl lists a macro's versions oldest first, one
+    {"digest", "saved", "steps"} line each; appending a version never rewrites anything.
+    """
+    def __init__(self, directory, log_callback=print):
+        self.directory = directory
+        self.log_callback = log_callback
+        self._lock = threading.Lock()
+
+    def _object_path(self, digest):
+        return os.path.join(self.directory, "objects", digest[:2], f"{digest[2:]}.json")
+
+    def _index_path(self, name):
+        return os.path.join(self.directory, "index", f"{os.path.basename(name)}.jsonl")
+
+    def record(self, macro):
+        """Add macro as the newest version of its name (unless it already is); returns its digest."""
+        data = macro_content(macro)
+        digest = hashlib.sha1(data).hexdigest()
+        with self._lock:
+            versions = self._read_index(macro["name"])
+            if versions and versions[-1]["digest"] == digest:
+                return digest
+            path = self._object_path(digest)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            index_path = self._index_path(macro["name"])
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+            line = {"digest": digest, "saved": time.time(), "steps": len(macro.get("steps") or [])}
+            with open(index_path, "a") as f:
+                f.write(json.dumps(line) + "\n")
+            return digest
+
+    def _read_index(self, name):
+        try:
+            with open(self._index_path(name), "r") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return []
+        versions = []
+        for line in lines:
+            try:
+                versions.append(json.loads(line))
+            except ValueError:
+                # A line cut short by a crash mid-append
+                self.log_callback(f"Skipping damaged history line for {name}")
+        return versions
+
+    def versions(self, name):
+        """[{"version", "digest", "saved", "steps"}] of a macro, oldest first (version numbers start at 1)."""
+        with self._lock:
+            return [version_info(i, v["digest"], v["saved"], v["steps"])
+                    for i, v in enumerate(self._read_index(name), 1)]
+
+    def version(self, name, number):
+        """The macro as saved in version number, or None if there is no such version."""
+        versions = self.versions(name)
+        if not 1 <= number <= len(versions):
+            return None
+        try:
+            with open(self._object_path(versions[number - 1]["digest"]), "rb") as f:
+                body = json.loads(f.read())
+        except (OSError, ValueError) as e:
+            self.log_callback(f"Version {number} of {name} is unreadable: {e}")
+            return None
+        return {"name": name, **body}
+
+def diff_versions(store, name, old=None, new=None):
+    """Unified diff between two versions of a macro in store (MacroCatalog or MacroDB).
+
+    new defaults to the macro as it is now, old to the version saved before the newest one.
+    Returns None when a version does not exist.
+    """
+    if old is None:
+        old = len(store.versions(name)) - 1
+    old_macro = store.version(name, old)
+    new_macro = store.version(name, new) if new is not None else store.get(name)
+    if old_macro is None or new_macro is None:
+        return None
+    return diff_macros(old_macro, new_macro, f"{name}@{old}", f"{name}@{new if new is not None else 'current'}")
+
+def group_duplicates(digests):
+    """[[name, ...], ...] of names sharing a content digest, from {name: digest}; groups of two or more only."""
+    groups = {}
+    for name, digest in sorted(digests.items()):
+        groups.setdefault(digest, []).append(name)
+    return sorted(names for names in groups.values() if len(names) > 1)
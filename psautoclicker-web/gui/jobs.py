@@ -0,0 +1,133 @@
+import gzip
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from .engine import log_since
+
+# Retention defaults: running jobs are never evicted, finished ones are kept up to these limits
+JOB_LOG_MAX_LINES = 2000
+JOB_RETAIN_FINISHED = 50
+JOB_RETAIN_AGE_S = 6 * 60 * 60
+
+FINISHED_STATUSES = ("finished", "stopped", "error")
+
+class JobStore:
+    """Job records by job_id with bounded memory.
+
+    Logs are ring buffers of log_max_lines (log_seq keeps counting, so log_since still works after
+    old lines fall off). Finished jobs are evicted least-recently-used first once there are more than
+    max_finished of them, or when they are older than max_age_s. If spill_dir is set, an evicted job's
+    retained log is written to spill_dir/<job_id>.log.gz before it is dropped.
+    """
+    def __init__(self, log_max_lines=JOB_LOG_MAX_LINES, max_finished=JOB_RETAIN_FINISHED,
+                 max_age_s=JOB_RETAIN_AGE_S, spill_dir=None, log_callback=print):
+        self.log_max_lines = log_max_lines
+        self.max_finished = max_finished
+        self.max_age_s = max_age_s
+        self.spill_dir = spill_dir
+        self.log_callback = log_callback
+        self.evicted = 0
+        self.spilled = 0
+        self._records = OrderedDict()
+        self._finished_at = {}
+        self._lock = threading.Lock()
+
+    def add(self, job_id, record):
+        with self._lock:
+            self._records[job_id] = record
+        self.evict()
+
+    def get(self, job_id):
+        with self._lock:
+            record = self._records.get(job_id)
+            if record is not None:
+                self._records.move_to_end(job_id)
+            return record
+
+    def items(self):
+        with self._lock:
+            return list(self._records.items())
+
+    def __contains__(self, job_id):
+        with self._lock:
+            return job_id in self._records
+
+    def finish(self, job_id):
+        with self._lock:
+            if job_id in self._records:
+                self._finished_at[job_id] = time.time()
+        self.evict()
+
+    def snapshot(self, job_id, since=0):
+        """JSON-ready copy of a record: log lines after since, and log_first_seq for the first of them."""
+        record = self.get(job_id)
+        if record is None:
+            return None
+        data = dict(record)
+        data["log_first_seq"], data["log"] = log_since(record, since)
+        return data
+
+    # --- Eviction ---
+    def evict(self):
+        now = time.time()
+        victims = []
+        with self._lock:
+            finished = [job_id for job_id in self._records if job_id in self._finished_at]
+            excess = len(finished) - self.max_finished
+            for job_id in finished:
+                if excess > 0 or now - self._finished_at[job_id] > self.max_age_s:
+                    victims.append((job_id, self._records.pop(job_id)))
+                    del self._finished_at[job_id]
+                    excess -= 1
+        for job_id, record in victims:
+            self.evicted += 1
+            if self.spill_dir:
+                self._spill(job_id, record)
+
+    def _spill(self, job_id, record):
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            with gzip.open(self.archive_path(job_id), "wt", encoding="utf-8") as f:
+                for line in record["log"]:
+                    f.write(line + "\n")
+            self.spilled += 1
+        except OSError as e:
+            self.log_callback(f"Could not spill log of job {job_id}: {e}")
+
+    def archive_path(self, job_id):
+        if not self.spill_dir:
+            return None
+        return os.path.join(self.spill_dir, f"{os.path.basename(job_id)}.log.gz")
+
+    def is_archived(self, job_id):
+        path = self.archive_path(job_id)
+        return path is not None and os.path.exists(path)
+
+    # --- Reporting ---
+    def memory_report(self):
+        with self._lock:
+            records = list(self._records.items())
+            finished = len(self._finished_at)
+        log_lines = 0
+        log_bytes = 0
+        for _, record in records:
+            log = record["log"]
+            log_lines += len(log)
+            log_bytes += sys.getsizeof(log) + sum(sys.getsizeof(line) for line in list(log))
+        return {
+            "jobs": len(records),
+            "running": len(records) - finished,
+            "finished": finished,
+            "log_lines": log_lines,
+            "log_bytes": log_bytes,
+            "evicted": self.evicted,
+            "spilled": self.spilled,
+            "limits": {
+                "log_max_lines": self.log_max_lines,
+                "max_finished": self.max_finished,
+                "max_age_s": self.max_age_s,
+                "spill_dir": self.spill_dir,
+            },
+        }
@@ -0,0 +1,55 @@
+import threading
+
+LOG_FLUSH_INTERVAL_MS = 50
+LOG_MAX_BATCH = 200
+
+class LogBatcher:
+    """Collects log lines per room and hands them to emit(room, payload) in batches.
+
+    Pending lines are flushed every interval_ms by a background thread, or straight away once a room
+    has max_batch lines waiting. The payload is {"seq": <seq of the first line>, "lines": [...]}
+    merged with the extra fields of the most recent add() (e.g. the job status).
+    """
+    def __init__(self, emit, interval_ms=LOG_FLUSH_INTERVAL_MS, max_batch=LOG_MAX_BATCH):
+        self.emit = emit
+        self.interval_ms = interval_ms
+        self.max_batch = max_batch
+        self.batches_sent = 0
+        self.lines_sent = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def add(self, room, seq, line, **fields):
+        with self._lock:
+            batch = self._pending.get(room)
+            if batch is None:
+                batch = self._pending[room] = {"seq": seq, "lines": []}
+            batch["lines"].append(line)
+            batch.update(fields)
+            if len(batch["lines"]) >= self.max_batch:
+                self._flush_room(room)
+
+    def flush(self, room=None):
+        with self._lock:
+            for key in ([room] if room is not None else list(self._pending)):
+                self._flush_room(key)
+
+    def _flush_room(self, room):
+        # Called with the lock held so batches for a room are emitted in order
+        batch = self._pending.pop(room, None)
+        if not batch:
+            return
+        self.batches_sent += 1
+        self.lines_sent += len(batch["lines"])
+        self.emit(room, batch)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval_ms / 1000.0):
+            self.flush()
+
+    def close(self):
+        self._stop.set()
+        self.flush()
@@ -0,0 +1,35 @@
+import logging
+import os
+
+# PSAUTO_LOG_LEVEL sets the default level (WARNING unless given); PSAUTO_LOG_LEVELS overrides it per
+# module, e.g. PSAUTO_LOG_LEVELS="gui.webserver=DEBUG,gui.engine=INFO".
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+DEFAULT_LOG_LEVEL = "WARNING"
+REQUEST_LOGGER = "gui.webserver.requests"
+
+def parse_levels(spec):
+    levels = {}
+    for item in (spec or "").split(","):
+        name, sep, level = item.strip().partition("=")
+        if sep and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def configure_logging(level=None, levels=None, trace_requests=False, env=None):
+    """Set up the root handler and per-module levels; arguments take precedence over the environment."""
+    env = os.environ if env is None else env
+    level = (level or env.get("PSAUTO_LOG_LEVEL") or DEFAULT_LOG_LEVEL).upper()
+    module_levels = parse_levels(env.get("PSAUTO_LOG_LEVELS"))
+    module_levels.update(levels or {})
+    # werkzeug logs every request at INFO; keep it quiet unless asked for
+    module_levels.setdefault("werkzeug", "WARNING")
+    if trace_requests:
+        module_levels[REQUEST_LOGGER] = "INFO"
+    root = logging.getLogger()
+    if not root.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        root.addHandler(handler)
+    root.setLevel(level)
+    for name, module_level in module_levels.items():
+        logging.getLogger(name).setLevel(module_level)
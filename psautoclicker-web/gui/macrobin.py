@@ -0,0 +1,320 @@
+import json
+import mmap
+import os
+import struct
+from .engine import STICK_DIRECTIONS, estimate_duration_ms, is_stick_action
+
+# Binary macro file (<name>.macro.bin), little-endian:
+#   header    MAGIC, version, flags, top-level step count, record count, string count, metadata length,
+#             estimated duration of one pass over the steps in ms
+#   metadata  the macro as JSON without its steps (a "steps": null placeholder keeps the key order)
+#   offsets   one u32 per top-level step: index of its first record
+#   records   RECORD.size bytes each, see below
+#   strings   (count + 1) u32 end offsets, then the UTF-8 blob; buttons, stick names and comments are
+#             stored once however often they occur
+# A record is (kind, flags, direction, delay_ms, text, comment, payload). A REPEAT record is followed by
+# the records of its nested steps (payload = count | record span << 32), a SIMUL record by one BUTTON or
+# STICK record per action (payload = action count). Steps that fit none of the kinds (autoclicker dicts,
+# odd values) are kept verbatim as JSON text, so any macro converts back to the same JSON.
+MAGIC = b"PSMB"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIIIq")
+RECORD = struct.Struct("<BBHiIIQ")
+U32 = struct.Struct("<I")
+U64 = struct.Struct("<Q")
+F64 = struct.Struct("<d")
+BINARY_SUFFIX = ".macro.bin"
+# Files at least this large are memory-mapped, smaller ones read into memory
+MMAP_MIN_BYTES = 256 * 1024
+# Windows refuses to replace or delete a file that is mapped, and cached macros stay open (a save over
+# them, or pruning a compiled artifact, would fail), so files are always read into memory there
+MMAP_FILES = os.name != "nt"
+
+KIND_BUTTON, KIND_STICK, KIND_SIMUL, KIND_REPEAT, KIND_JSON = 1, 2, 3, 4, 5
+HAS_COMMENT = 0x01
+INT_MAGNITUDE = 0x02
+STEPS_IN_METADATA = 0x01
+NO_STRING = 0xFFFFFFFF
+INT32_RANGE = (-2 ** 31, 2 ** 31 - 1)
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+# --- Encoding ---
+class _Encoder:
+    def __init__(self):
+        self.records = []
+        self.strings = []
+        self._ids = {}
+
+    def string(self, text):
+        string_id = self._ids.get(text)
+        if string_id is None:
+            string_id = self._ids[text] = len(self.strings)
+            self.strings.append(text.encode("utf-8"))
+        return string_id
+
+    def step(self, step_tuple):
+        if not self._try_step(step_tuple):
+            self.records.append((KIND_JSON, 0, 0, 0, self.string(json.dumps(step_tuple)), NO_STRING, 0))
+
+    def _try_step(self, step_tuple):
+        if not isinstance(step_tuple, list) or len(step_tuple) not in (2, 3):
+            return False
+        step, delay_ms = step_tuple[0], step_tuple[1]
+        comment = step_tuple[2] if len(step_tuple) == 3 else None
+        if not _is_int(delay_ms) or not INT32_RANGE[0] <= delay_ms <= INT32_RANGE[1]:
+            return False
+        if len(step_tuple) == 3 and not isinstance(comment, str):
+            return False
+        flags = HAS_COMMENT if comment is not None else 0
+        comment_id = self.string(comment) if comment is not None else NO_STRING
+        if isinstance(step, list) and len(step) >= 3 and step[0] == "REPEAT":
+            count, nested = step[1], step[2]
+            if len(step) != 3 or not _is_int(count) or not 0 <= count < 2 ** 32 or not isinstance(nested, list):
+                return False
+            at = len(self.records)
+            self.records.append(None)
+            for nested_step in nested:
+                self.step(nested_step)
+            span = len(self.records) - at - 1
+            self.records[at] = (KIND_REPEAT, flags, 0, delay_ms, NO_STRING, comment_id, count | span << 32)
+            return True
+        if isinstance(step, list) and not is_stick_action(step):
+            actions = [self._action(action) for action in step]
+            if None in actions:
+                return False
+            self.records.append((KIND_SIMUL, flags, 0, delay_ms, NO_STRING, comment_id, len(actions)))
+            self.records.extend(actions)
+            return True
+        action = self._action(step)
+        if action is None:
+            return False
+        kind, action_flags, direction, _, text, _, payload = action
+        self.records.append((kind, flags | action_flags, direction, delay_ms, text, comment_id, payload))
+        return True
+
+    def _action(self, action):
+        if isinstance(action, str):
+            return (KIND_BUTTON, 0, 0, 0, self.string(action), NO_STRING, 0)
+        if is_stick_action(action) and action[1] in STICK_DIRECTIONS:
+            magnitude = action[2]
+            if _is_int(magnitude) and abs(magnitude) < 2 ** 53:
+                flags, magnitude = INT_MAGNITUDE, float(magnitude)
+            elif isinstance(magnitude, float):
+                flags = 0
+            else:
+                return None
+            payload = U64.unpack(F64.pack(magnitude))[0]
+            return (KIND_STICK, flags, STICK_DIRECTIONS.index(action[1]), 0, self.string(action[0]), NO_STRING, payload)
+        return None
+
+def encode_macro(macro):
+    """The .macro.bin bytes of a macro dict (as loaded from .macro.json)."""
+    encoder = _Encoder()
+    steps = macro.get("steps")
+    flags = 0
+    offsets = []
+    if isinstance(steps, list):
+        metadata = {key: (None if key == "steps" else value) for key, value in macro.items()}
+        for step_tuple in steps:
+            offsets.append(len(encoder.records))
+            encoder.step(step_tuple)
+        duration_ms = estimate_duration_ms(steps)
+    else:
+        metadata, flags, duration_ms = macro, STEPS_IN_METADATA, 0
+    meta = json.dumps(metadata).encode("utf-8")
+    parts = [HEADER.pack(MAGIC, VERSION, flags, len(offsets), len(encoder.records), len(encoder.strings),
+                         len(meta), duration_ms), meta]
+    parts.append(struct.pack(f"<{len(offsets)}I", *offsets))
+    parts.extend(RECORD.pack(*record) for record in encoder.records)
+    end, ends = 0, []
+    for data in encoder.strings:
+        end += len(data)
+        ends.append(end)
+    parts.append(struct.pack(f"<{len(ends) + 1}I", 0, *ends))
+    parts.extend(encoder.strings)
+    return b"".join(parts)
+
+def write_binary_macro(macro, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(encode_macro(macro))
+    os.replace(tmp_path, path)
+
+# --- Decoding ---
+class BinaryMacro:
+    """A .macro.bin file, memory-mapped where possible. macro is the macro dict with a lazy BinarySteps as its steps."""
+    def __init__(self, buf):
+        self.buf = buf
+        magic, version, flags, n_steps, n_records, n_strings, meta_len, self.duration_ms = HEADER.unpack_from(buf)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a binary macro file (or an unsupported version)")
+        pos = HEADER.size
+        metadata = json.loads(bytes(buf[pos:pos + meta_len]))
+        pos += meta_len
+        self._step_offsets = pos
+        pos += 4 * n_steps
+        self._records = pos
+        pos += RECORD.size * n_records
+        self._string_ends = pos
+        self._blob = pos + 4 * (n_strings + 1)
+        self._strings = {}
+        if flags & STEPS_IN_METADATA:
+            self.macro = metadata
+        else:
+            metadata["steps"] = BinarySteps(self, 0, n_records, n_steps)
+            self.macro = metadata
+
+    @classmethod
+    def open(cls, path):
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                raise ValueError("empty file")
+            if size < MMAP_MIN_BYTES or not MMAP_FILES:
+                # Small files are simply read: a map holds a file descriptor for as long as it lives
+                return cls.from_bytes(f.read())
+            # The map stays valid after the file is replaced or deleted (on POSIX systems), so running
+            # jobs keep streaming their steps from it
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(memoryview(data))
+
+    def string(self, string_id):
+        text = self._strings.get(string_id)
+        if text is None:
+            start = U32.unpack_from(self.buf, self._string_ends + 4 * string_id)[0]
+            end = U32.unpack_from(self.buf, self._string_ends + 4 * (string_id + 1))[0]
+            text = self._strings[string_id] = bytes(self.buf[self._blob + start:self._blob + end]).decode("utf-8")
+        return text
+
+    def record(self, index):
+        return RECORD.unpack_from(self.buf, self._records + RECORD.size * index)
+
+    def top_level_offset(self, index):
+        return U32.unpack_from(self.buf, self._step_offsets + 4 * index)[0]
+
+    def extent(self, index):
+        """Number of records the step starting at record index occupies."""
+        kind, _, _, _, _, _, payload = self.record(index)
+        if kind == KIND_REPEAT:
+            return 1 + (payload >> 32)
+        if kind == KIND_SIMUL:
+            return 1 + payload
+        return 1
+
+    def decode_step(self, index):
+        kind, flags, direction, delay_ms, text, comment, payload = self.record(index)
+        if kind == KIND_JSON:
+            return json.loads(self.string(text))
+        if kind == KIND_REPEAT:
+            span = payload >> 32
+            action = ["REPEAT", payload & 0xFFFFFFFF, BinarySteps(self, index + 1, index + 1 + span)]
+        elif kind == KIND_SIMUL:
+            action = [self._decode_action(index + 1 + i) for i in range(payload)]
+        else:
+            action = self._action(kind, flags, direction, text, payload)
+        step_tuple = [action, delay_ms]
+        if flags & HAS_COMMENT:
+            step_tuple.append(self.string(comment))
+        return step_tuple
+
+    def _decode_action(self, index):
+        kind, flags, direction, _, text, _, payload = self.record(index)
+        return self._action(kind, flags, direction, text, payload)
+
+    def _action(self, kind, flags, direction, text, payload):
+        if kind == KIND_BUTTON:
+            return self.string(text)
+        magnitude = F64.unpack(U64.pack(payload))[0]
+        return [self.string(text), STICK_DIRECTIONS[direction], int(magnitude) if flags & INT_MAGNITUDE else magnitude]
+
+    def to_json(self):
+        """The macro as plain JSON data (steps fully decoded), identical to what was encoded."""
+        macro = dict(self.macro)
+        if isinstance(macro.get("steps"), BinarySteps):
+            macro["steps"] = macro["steps"].to_list()
+        return macro
+
+class BinarySteps:
+    """Read-only sequence of steps backed by a BinaryMacro; each step is decoded when it is indexed.
+
+    Top-level steps are found through the file's offset table; the offsets of nested (REPEAT) steps
+    are worked out once, on first access.
+    """
+    def __init__(self, binary, start, end, count=None):
+        self.binary = binary
+        self.start = start
+        self.end = end
+        self._offsets = None
+        self._top_level = count is not None
+        self._count = count
+
+    def _nested_offsets(self):
+        if self._offsets is None:
+            offsets, pos = [], self.start
+            while pos < self.end:
+                offsets.append(pos)
+                pos += self.binary.extent(pos)
+            self._offsets = offsets
+        return self._offsets
+
+    def _offset(self, index):
+        if self._top_level:
+            return self.binary.top_level_offset(index)
+        return self._nested_offsets()[index]
+
+    def __len__(self):
+        if self._count is None:
+            self._count = len(self._nested_offsets())
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("step index out of range")
+        return self.binary.decode_step(self._offset(index))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __repr__(self):
+        return f"<{len(self)} binary steps>"
+
+    def to_list(self):
+        steps = []
+        for step_tuple in self:
+            step = step_tuple[0]
+            if isinstance(step, list) and len(step) == 3 and isinstance(step[2], BinarySteps):
+                step_tuple[0] = ["REPEAT", step[1], step[2].to_list()]
+            steps.append(step_tuple)
+        return steps
+
+# --- Conversion ---
+def json_to_binary(json_path, bin_path=None):
+    """Convert a .macro.json file; returns the path written (next to it by default)."""
+    with open(json_path, "r") as f:
+        macro = json.load(f)
+    if bin_path is None:
+        base = json_path[:-len(".macro.json")] if json_path.endswith(".macro.json") else os.path.splitext(json_path)[0]
+        bin_path = base + BINARY_SUFFIX
+    write_binary_macro(macro, bin_path)
+    return bin_path
+
+def binary_to_json(bin_path, json_path=None):
+    if json_path is None:
+        base = bin_path[:-len(BINARY_SUFFIX)] if bin_path.endswith(BINARY_SUFFIX) else os.path.splitext(bin_path)[0]
+        json_path = base + ".macro.json"
+    macro = BinaryMacro.open(bin_path).to_json()
+    tmp_path = json_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(macro, f, indent=2)
+    os.replace(tmp_path, json_path)
+    return json_path
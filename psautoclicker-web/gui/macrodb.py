@@ -0,0 +1,387 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from .catalog import MACRO_SUFFIX, MACRO_SEARCH_LIMIT, MacroCatalog, macro_tags, step_comments
+from .engine import estimate_duration_ms
+from .compiler import compile_macro
+from .macrobin import BinaryMacro
+from .depgraph import DependencyGraph, check_batch
+from .schema import MacroValidationError
+from .history import content_digest, group_duplicates, macro_content, version_info
+
+# Set to a file path to keep macros in SQLite instead of Macros/*.macro.json (see open_macro_store)
+MACRO_DB_ENV = "PSAUTO_MACRO_DB"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS macros (
+    name TEXT PRIMARY KEY,
+    description TEXT NOT NULL DEFAULT '',
+    body TEXT NOT NULL,
+    steps INTEGER NOT NULL,
+    duration_ms INTEGER NOT NULL,
+    end_of_loop_macro_name TEXT,
+    end_of_loop_duration_ms INTEGER NOT NULL DEFAULT 0,
+    comments TEXT NOT NULL DEFAULT '',
+    updated REAL NOT NULL,
+    compiled BLOB
+);
+CREATE TABLE IF NOT EXISTS macro_tags (
+    name TEXT NOT NULL REFERENCES macros(name) ON DELETE CASCADE,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (name, tag)
+);
+CREATE INDEX IF NOT EXISTS macro_tags_by_tag ON macro_tags(tag, name);
+CREATE TABLE IF NOT EXISTS macro_objects (digest TEXT PRIMARY KEY, body TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS macro_versions (
+    name TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    digest TEXT NOT NULL REFERENCES macro_objects(digest),
+    saved REAL NOT NULL,
+    steps INTEGER NOT NULL,
+    PRIMARY KEY (name, version)
+);
+"""
+# Full-text index over descriptions and step comments; kept in sync by save/delete
+FTS_SCHEMA = "CREATE VIRTUAL TABLE IF NOT EXISTS macro_text USING fts5(name UNINDEXED, description, comments)"
+
+SUMMARY_SELECT = """
+SELECT m.name, m.description, m.steps,
+       m.duration_ms + m.end_of_loop_duration_ms + COALESCE(e.duration_ms, 0)
+FROM macros m LEFT JOIN macros e ON e.name = m.end_of_loop_macro_name
+"""
+
+class MacroDB:
+    """Macros in one SQLite file (WAL mode), a drop-in for MacroCatalog.
+
+    Each macro is stored as its JSON body next to the columns the list view and search need (name
+    is the primary key, tags have their own indexed table), so listing, lookups and searches are
+    index queries rather than directory scans. Descriptions and step comments are searchable through
+    FTS5, or with LIKE on SQLite builds without it. The optional "tags" field of a macro is a list
+    of strings. import_dir/export_dir convert from and to the Macros/*.macro.json layout.
+
+    end_of_loop_macro_name references are checked on save and linked programs cached as in
+    MacroCatalog; the graph is rebuilt whenever the store's generation moved without us (another
+    process wrote to it).
+
+    Saves are versioned like MacroHistory does for files: macro_objects holds each content once
+    (keyed by history.content_digest), macro_versions the versions of each name. Deleting a macro
+    keeps its versions.
+    """
+    def __init__(self, path, log_callback=print):
+        self.path = path
+        self.log_callback = log_callback
+        # Macro files are not the source of truth here, so there is nothing for a watcher to feed
+        self.watching = False
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self.graph = DependencyGraph()
+        self._graph_generation = None
+        conn = self._conn()
+        with conn:
+            conn.executescript(SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(macros)")}
+            if "compiled" not in columns:
+                # Stores created before macros were compiled on save
+                conn.execute("ALTER TABLE macros ADD COLUMN compiled BLOB")
+            conn.execute("INSERT OR IGNORE INTO meta VALUES ('store_id', ?)", (uuid.uuid4().hex,))
+            conn.execute("INSERT OR IGNORE INTO meta VALUES ('generation', '0')")
+        try:
+            conn.execute(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+            self.log_callback("SQLite has no FTS5; macro search falls back to LIKE")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _generation(self, conn):
+        return int(conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0])
+
+    def _targets(self, conn):
+        return dict(conn.execute("SELECT name, end_of_loop_macro_name FROM macros"))
+
+    def _sync_graph(self):
+        conn = self._conn()
+        generation = self._generation(conn)
+        if generation != self._graph_generation:
+            self.graph.reset(self._targets(conn))
+            self._graph_generation = generation
+
+    def _etag(self, view):
+        rows = dict(self._conn().execute("SELECT key, value FROM meta WHERE key IN ('store_id', 'generation')"))
+        return f"{rows['store_id']}-{rows['generation']}-{view}"
+
+    # --- Lookups ---
+    def listing(self, summary=False):
+        """(etag, macros) like MacroCatalog.listing; the etag changes with every write to the store."""
+        conn = self._conn()
+        # The etag is read first: a write landing in between makes it stale, never the rows
+        etag = self._etag("summary" if summary else "full")
+        if summary:
+            self._sync_graph()
+            rows = conn.execute(SUMMARY_SELECT + " ORDER BY m.name").fetchall()
+            return etag, [self._summary(row) for row in rows]
+        rows = conn.execute("SELECT body FROM macros ORDER BY name").fetchall()
+        return etag, [json.loads(body) for (body,) in rows]
+
+    def list(self):
+        return self.listing()[1]
+
+    def _summary(self, row):
+        name, description, steps, duration_ms = row
+        # Only valid macros get into the store, but a target deleted later leaves its dependents broken
+        return {"name": name, "description": description, "steps": steps, "estimated_duration_ms": duration_ms,
+                "errors": self.graph.problems(name)}
+
+    def get(self, name):
+        row = self._conn().execute("SELECT body FROM macros WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def detail(self, name):
+        row = self._conn().execute("SELECT body FROM macros WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None, None
+        return hashlib.sha1(row[0].encode("utf-8")).hexdigest(), json.loads(row[0])
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM macros").fetchone()[0]
+
+    def _runnable(self, name):
+        # The compiled form stored on save; rows from before that are compiled (and validated) now
+        row = self._conn().execute("SELECT body, compiled FROM macros WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        body, compiled = row
+        return BinaryMacro.from_bytes(compiled if compiled is not None else compile_macro(json.loads(body))).macro
+
+    def load(self, name):
+        """(macro, end_of_loop_steps) for running a macro, steps decoded lazily from the compiled form.
+
+        Linked once and cached until the macro or its end-of-loop chain changes. Raises
+        FileNotFoundError if it does not exist and MacroValidationError if its chain is broken.
+        """
+        self._sync_graph()
+        program, version = self.graph.program(name)
+        if program is None:
+            macro = self._runnable(name)
+            if macro is None:
+                raise FileNotFoundError(name)
+            problems = self.graph.problems(name)
+            if problems:
+                raise MacroValidationError(problems)
+            end_steps = []
+            if macro.get("end_of_loop_macro_name"):
+                end_steps = self._runnable(macro["end_of_loop_macro_name"]).get("steps", [])
+            elif macro.get("end_of_loop_macro"):
+                end_steps = macro["end_of_loop_macro"]
+            program = (macro, end_steps)
+            self.graph.store_program(name, program, version)
+        return program
+
+    def search(self, text=None, tag=None, limit=MACRO_SEARCH_LIMIT):
+        """Summaries of macros whose name, description or step comments match text and that carry tag."""
+        where, params = [], []
+        if tag:
+            where.append("m.name IN (SELECT name FROM macro_tags WHERE tag = ?)")
+            params.append(tag.strip().lower())
+        if text:
+            if self.fts:
+                # Each word as a quoted prefix term, so user input never reaches the FTS query syntax
+                terms = " ".join('"%s"*' % word.replace('"', '""') for word in text.split())
+                where.append("(m.name LIKE ? OR m.name IN (SELECT name FROM macro_text WHERE macro_text MATCH ?))")
+                params += [f"%{text}%", terms]
+            else:
+                where.append("(m.name LIKE ? OR m.description LIKE ? OR m.comments LIKE ?)")
+                params += [f"%{text}%"] * 3
+        sql = SUMMARY_SELECT + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY m.name LIMIT ?"
+        rows = self._conn().execute(sql, params + [limit]).fetchall()
+        self._sync_graph()
+        return [self._summary(row) for row in rows]
+
+    def tags(self):
+        """{tag: number of macros} over the whole store."""
+        return dict(self._conn().execute("SELECT tag, COUNT(*) FROM macro_tags GROUP BY tag ORDER BY tag"))
+
+    # --- Writes ---
+    def save(self, macro):
+        self.save_many([macro])
+        return self.path
+
+    def save_many(self, macros):
+        """Store macros in one transaction. Raises MacroValidationError (nothing is stored then).
+
+        end_of_loop_macro_name references are checked against the store with all of macros in it,
+        so macros saved together may refer to each other.
+        """
+        conn = self._conn()
+        names = {macro["name"] for macro in macros}
+        with self._write_lock:
+            with conn:
+                for macro in macros:
+                    self._upsert(conn, macro)
+                # Checked inside the transaction, which holds the write lock: a broken reference rolls it back
+                targets = self._targets(conn)
+                trial = DependencyGraph()
+                trial.reset(targets)
+                errors = []
+                for name in sorted(names):
+                    problems = trial.problems(name)
+                    errors += problems if len(names) == 1 else [f"{name}.{problem}" for problem in problems]
+                if errors:
+                    raise MacroValidationError(errors)
+                generation = self._generation(conn)
+                self._bump(conn)
+            self._written(targets, names, generation)
+
+    def import_many(self, macros):
+        """Like MacroCatalog.import_many: store compiled [(macro, compiled)], return {name: errors} of those refused."""
+        conn = self._conn()
+        batch = {macro["name"]: macro.get("end_of_loop_macro_name") for macro, _ in macros}
+        with self._write_lock:
+            with conn:
+                refused = check_batch(self._targets(conn), batch)
+                for macro, compiled in macros:
+                    if macro["name"] not in refused:
+                        self._upsert(conn, macro, compiled)
+                targets = self._targets(conn)
+                generation = self._generation(conn)
+                self._bump(conn)
+            self._written(targets, batch.keys() - refused.keys(), generation)
+        return refused
+
+    def _written(self, targets, names, generation):
+        # Only what we wrote needs relinking, unless someone else wrote since our last look
+        self.graph.reset(targets, names if generation == self._graph_generation else None)
+        self._graph_generation = generation + 1
+
+    def _upsert(self, conn, macro, compiled=None):
+        name = macro["name"]
+        if not conn.execute("SELECT 1 FROM macro_versions WHERE name = ? LIMIT 1", (name,)).fetchone():
+            previous = conn.execute("SELECT body FROM macros WHERE name = ?", (name,)).fetchone()
+            if previous:
+                # Saved before versions were kept: what is being replaced becomes version 1
+                self._record(conn, json.loads(previous[0]))
+        self._record(conn, macro)
+        steps = macro.get("steps") or []
+        comments = "\n".join(step_comments(steps) + step_comments(macro.get("end_of_loop_macro")))
+        description = macro.get("description") or ""
+        conn.execute(
+            "INSERT OR REPLACE INTO macros (name, description, body, steps, duration_ms, end_of_loop_macro_name,"
+            " end_of_loop_duration_ms, comments, updated, compiled) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (name, description, json.dumps(macro), len(steps), estimate_duration_ms(steps),
+             macro.get("end_of_loop_macro_name") or None,
+             0 if macro.get("end_of_loop_macro_name") else estimate_duration_ms(macro.get("end_of_loop_macro")),
+             comments, time.time(), compiled if compiled is not None else compile_macro(macro)))
+        conn.execute("DELETE FROM macro_tags WHERE name = ?", (name,))
+        conn.executemany("INSERT INTO macro_tags VALUES (?, ?)", [(name, tag) for tag in macro_tags(macro)])
+        if self.fts:
+            conn.execute("DELETE FROM macro_text WHERE name = ?", (name,))
+            conn.execute("INSERT INTO macro_text VALUES (?, ?, ?)", (name, description, comments))
+
+    def _record(self, conn, macro):
+        data = macro_content(macro)
+        digest = hashlib.sha1(data).hexdigest()
+        last = conn.execute("SELECT version, digest FROM macro_versions WHERE name = ? ORDER BY version DESC LIMIT 1",
+                            (macro["name"],)).fetchone()
+        if last and last[1] == digest:
+            return
+        conn.execute("INSERT OR IGNORE INTO macro_objects VALUES (?, ?)", (digest, data.decode("utf-8")))
+        conn.execute("INSERT INTO macro_versions VALUES (?, ?, ?, ?, ?)",
+                     (macro["name"], (last[0] if last else 0) + 1, digest, time.time(), len(macro.get("steps") or [])))
+
+    def _bump(self, conn):
+        conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'generation'")
+
+    def delete(self, name):
+        conn = self._conn()
+        with self._write_lock, conn:
+            deleted = conn.execute("DELETE FROM macros WHERE name = ?", (name,)).rowcount
+            if not deleted:
+                return False
+            if self.fts:
+                conn.execute("DELETE FROM macro_text WHERE name = ?", (name,))
+            generation = self._generation(conn)
+            self._bump(conn)
+            if generation == self._graph_generation:
+                self.graph.remove(name)
+                self._graph_generation = generation + 1
+        return True
+
+    def duplicates(self):
+        """Groups of macros with identical content under different names."""
+        rows = self._conn().execute("SELECT name, body FROM macros")
+        return group_duplicates({name: content_digest(json.loads(body)) for name, body in rows})
+
+    # --- History ---
+    def versions(self, name):
+        rows = self._conn().execute("SELECT version, digest, saved, steps FROM macro_versions WHERE name = ?"
+                                    " ORDER BY version", (name,))
+        return [version_info(*row) for row in rows]
+
+    def version(self, name, number):
+        row = self._conn().execute(
+            "SELECT o.body FROM macro_versions v JOIN macro_objects o ON o.digest = v.digest"
+            " WHERE v.name = ? AND v.version = ?", (name, number)).fetchone()
+        return {"name": name, **json.loads(row[0])} if row else None
+
+    def rollback(self, name, number):
+        """Like MacroCatalog.rollback."""
+        macro = self.version(name, number)
+        if macro is not None:
+            self.save(macro)
+        return macro
+
+    # --- JSON interchange ---
+    def import_dir(self, macros_dir):
+        """Load every valid macro of a directory (as MacroCatalog sees them); returns how many were stored."""
+        with tempfile.TemporaryDirectory() as artifacts_dir:
+            # The catalog compiles what it reads; keep its artifacts out of the source directory
+            catalog = MacroCatalog(macros_dir, log_callback=self.log_callback, artifacts_dir=artifacts_dir)
+            summaries = catalog.listing(summary=True)[1]
+            # A file without a "name" field is known by its file name, as in the catalog
+            macros = [dict(catalog.get(s["name"]), name=s["name"]) for s in summaries if not s["errors"]]
+        self.save_many(macros)
+        return len(macros)
+
+    def export_dir(self, macros_dir):
+        """Write every macro to <macros_dir>/<name>.macro.json; returns how many were written."""
+        os.makedirs(macros_dir, exist_ok=True)
+        count = 0
+        for macro in self.list():
+            path = os.path.join(macros_dir, f"{os.path.basename(macro['name'])}{MACRO_SUFFIX}")
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(macro, f, indent=2)
+            os.replace(tmp_path, path)
+            count += 1
+        return count
+
+def open_macro_store(macros_dir, db_path=None, log_callback=print):
+    """MacroDB at db_path (or $PSAUTO_MACRO_DB) when given, else the MacroCatalog of macros_dir.
+
+    A new, empty database is seeded from macros_dir so switching over keeps the existing library.
+    """
+    db_path = db_path or os.environ.get(MACRO_DB_ENV)
+    if not db_path:
+        return MacroCatalog(macros_dir, log_callback=log_callback)
+    store = MacroDB(db_path, log_callback=log_callback)
+    if not store.count() and os.path.isdir(macros_dir):
+        count = store.import_dir(macros_dir)
+        if count:
+            log_callback(f"Imported {count} macros from {macros_dir} into {db_path}")
+    return store
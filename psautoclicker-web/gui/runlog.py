@@ -0,0 +1,258 @@
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+
+# Each run writes <run_id>.jsonl; at RUN_LOG_MAX_BYTES it is gzipped to <run_id>.jsonl.1.gz (older
+# segments shift to .2.gz, ...) and a fresh file is started. At most RUN_LOG_BACKUPS segments are kept.
+# <run_id>.idx.jsonl indexes the log: one {"loop", "segment", "offset", "seq"} line per loop (segment n is
+# the file started after n rotations, offset a byte offset into it, seq the next log seq), plus a
+# {"rotated": n} line after each rotation.
+RUN_LOG_MAX_BYTES = 5 * 1024 * 1024
+RUN_LOG_BACKUPS = 20
+# Events queued beyond this are dropped (and counted) rather than blocking the macro thread
+RUN_LOG_QUEUE_SIZE = 100000
+
+RUN_LOG_QUERY_LIMIT = 1000
+
+_CLOSE = object()
+
+class _OpenRun:
+    def __init__(self, f, index):
+        self.f = f
+        self.index = index
+        self.segment = 0
+        self.loop = None
+        self.next_seq = 1
+
+class RunLog:
+    """Event log of one run. event() only enqueues; the writer thread does all file I/O."""
+    def __init__(self, writer, run_id):
+        self.writer = writer
+        self.run_id = run_id
+        self.path = writer.path_for(run_id)
+
+    def event(self, kind, **fields):
+        record = {"ts": time.time(), "event": kind}
+        record.update(fields)
+        self.writer.submit(self.run_id, record)
+
+    def close(self):
+        self.writer.submit(self.run_id, _CLOSE)
+
+def _json_plain(text):
+    return text.isascii() and not any(c in text for c in '"\\') and all(c >= " " for c in text)
+
+class RunLogWriter:
+    """Background writer for RunLogs: one thread, JSON Lines output, size-based rotation with gzip."""
+    def __init__(self, directory, max_bytes=RUN_LOG_MAX_BYTES, backups=RUN_LOG_BACKUPS,
+                 queue_size=RUN_LOG_QUEUE_SIZE, log_callback=print):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.log_callback = log_callback
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._files = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def path_for(self, run_id):
+        return os.path.join(self.directory, f"{os.path.basename(run_id)}.jsonl")
+
+    def index_path_for(self, run_id):
+        return os.path.join(self.directory, f"{os.path.basename(run_id)}.idx.jsonl")
+
+    def open(self, run_id=None):
+        return RunLog(self, run_id or str(uuid.uuid4()))
+
+    def submit(self, run_id, event):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait((run_id, event))
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=5.0):
+        """Block until everything queued so far has been written (for tests and shutdown)."""
+        done = threading.Event()
+        self.submit(None, done)
+        return done.wait(timeout)
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, daemon=True)
+                    self._thread.start()
+
+    # --- Writer thread ---
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            # Drain whatever else is waiting so a burst becomes one write + flush per file
+            while len(batch) < 1000:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            touched = set()
+            for run_id, event in batch:
+                try:
+                    self._handle(run_id, event, touched)
+                except OSError as e:
+                    self.log_callback(f"Run log write failed for {run_id}: {e}")
+            for run_id in touched:
+                run = self._files.get(run_id)
+                if run:
+                    run.f.flush()
+                    run.index.flush()
+
+    def _handle(self, run_id, event, touched):
+        if isinstance(event, threading.Event):
+            for run in self._files.values():
+                run.f.flush()
+                run.index.flush()
+            event.set()
+            return
+        if event is _CLOSE:
+            run = self._files.pop(run_id, None)
+            if run:
+                run.f.close()
+                run.index.close()
+            return
+        run = self._files.get(run_id)
+        if run is None:
+            os.makedirs(self.directory, exist_ok=True)
+            run = self._files[run_id] = _OpenRun(open(self.path_for(run_id), "ab"),
+                                                 open(self.index_path_for(run_id), "ab"))
+        loop = event.get("loop")
+        if loop is not None and loop != run.loop:
+            run.loop = loop
+            self._write_index(run, {"loop": loop, "segment": run.segment, "offset": run.f.tell(), "seq": run.next_seq})
+        if event.get("event") == "log":
+            run.next_seq = event["seq"] + 1
+        run.f.write(json.dumps(event, separators=(",", ":"), default=str).encode("utf-8") + b"\n")
+        self.written += 1
+        touched.add(run_id)
+        if run.f.tell() >= self.max_bytes:
+            run.f.close()
+            self._rotate(run_id)
+            run.segment += 1
+            run.f = open(self.path_for(run_id), "ab")
+            # The loop in progress continues at the start of the new segment
+            self._write_index(run, {"rotated": run.segment})
+            if run.loop is not None:
+                self._write_index(run, {"loop": run.loop, "segment": run.segment, "offset": 0, "seq": run.next_seq})
+
+    def _write_index(self, run, entry):
+        run.index.write(json.dumps(entry, separators=(",", ":")).encode("utf-8") + b"\n")
+
+    def _rotate(self, run_id):
+        path = self.path_for(run_id)
+        oldest = f"{path}.{self.backups}.gz"
+        if os.path.exists(oldest):
+            os.remove(oldest)
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{path}.{i}.gz"
+            if os.path.exists(src):
+                os.replace(src, f"{path}.{i + 1}.gz")
+        with open(path, "rb") as src, gzip.open(f"{path}.1.gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(path)
+
+    def segments(self, run_id):
+        """Paths of a run's log files, oldest first (rotated .gz segments, then the live file)."""
+        path = self.path_for(run_id)
+        paths = [f"{path}.{i}.gz" for i in range(self.backups, 0, -1) if os.path.exists(f"{path}.{i}.gz")]
+        if os.path.exists(path):
+            paths.append(path)
+        return paths
+
+    # --- Queries ---
+    def query(self, run_id, since=None, until=None, loop=None, text=None, limit=RUN_LOG_QUERY_LIMIT):
+        """Log lines of a run, read from disk starting at the nearest indexed loop.
+
+        since/until bound the seq (since exclusive, until inclusive), loop selects one loop, text is a
+        case-insensitive substring filter. Returns {"lines": [{seq, loop, ts, msg}], "more": bool}.
+        Only what the writer thread has already written is seen; nothing here waits for it.
+        """
+        rotations, entries = self._read_index(run_id)
+        start = (0, 0)  # (segment, offset)
+        if loop is not None:
+            matches = [e for e in entries if e["loop"] == loop]
+            if not matches:
+                return {"lines": [], "more": False}
+            start = (matches[0]["segment"], matches[0]["offset"])
+        elif since is not None:
+            before = [e for e in entries if e["seq"] <= since + 1]
+            if before:
+                start = (before[-1]["segment"], before[-1]["offset"])
+        needle = text.lower() if text else None
+        # Messages are stored JSON-escaped (non-ASCII, quotes, backslashes, control characters), so the
+        # raw line can only be searched for text that is written the same way escaped or not
+        raw_needle = needle.encode("ascii") if needle and _json_plain(needle) else None
+        lines = []
+        for raw in self._iter_from(run_id, rotations, *start):
+            # Cheap byte-level checks before paying for json.loads; a line still being written is skipped
+            if not raw.endswith(b"\n") or b'"event":"log"' not in raw or (raw_needle and raw_needle not in raw.lower()):
+                continue
+            event = json.loads(raw)
+            if loop is not None and event.get("loop") != loop:
+                if event.get("loop", loop) > loop:
+                    break
+                continue
+            if since is not None and event["seq"] <= since:
+                continue
+            if until is not None and event["seq"] > until:
+                break
+            if needle and needle not in event["msg"].lower():
+                continue
+            if len(lines) >= limit:
+                return {"lines": lines, "more": True}
+            lines.append({"seq": event["seq"], "loop": event.get("loop"), "ts": event["ts"], "msg": event["msg"]})
+        return {"lines": lines, "more": False}
+
+    def _read_index(self, run_id):
+        rotations = 0
+        entries = []
+        try:
+            with open(self.index_path_for(run_id), "rb") as f:
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        break
+                    entry = json.loads(raw)
+                    if "rotated" in entry:
+                        rotations = entry["rotated"]
+                    else:
+                        entries.append(entry)
+        except FileNotFoundError:
+            pass
+        return rotations, entries
+
+    def _segment_path(self, run_id, rotations, segment):
+        if segment == rotations:
+            return self.path_for(run_id)
+        return f"{self.path_for(run_id)}.{rotations - segment}.gz"
+
+    def _iter_from(self, run_id, rotations, segment, offset):
+        if segment < 0 or segment < rotations - self.backups:
+            # Requested data was rotated out; start from the oldest segment that is left
+            segment, offset = max(0, rotations - self.backups), 0
+        for seg in range(segment, rotations + 1):
+            path = self._segment_path(run_id, rotations, seg)
+            opener = gzip.open if path.endswith(".gz") else open
+            try:
+                f = opener(path, "rb")
+            except FileNotFoundError:
+                continue  # rotated away meanwhile
+            with f:
+                if seg == segment and offset:
+                    f.seek(offset)
+                for raw in f:
+                    yield raw
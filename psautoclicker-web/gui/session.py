@@ -0,0 +1,340 @@
+import threading
+import time
+from .fakedevice import fake_device, is_fake_host
+
+def make_device(host):
+    """Create the device object for host: the shared FakeRPDevice when fake mode is configured, else RPDevice."""
+    if is_fake_host(host):
+        return fake_device(host)
+    from pyremoteplay import RPDevice
+    return RPDevice(host)
+
+class SessionLost(RuntimeError):
+    """Raised by the macro engine when an input could not be delivered because the session dropped."""
+
+class SupervisedSession:
+    """A Remote Play session to one host that reconnects itself with exponential backoff.
+
+    The user and power status found on the first connect are cached, so a reconnect goes
+    straight to create_session() instead of repeating the user/status lookup.
+    """
+    def __init__(self, host, log_callback=print, on_status=None, device_factory=make_device,
+                 initial_backoff=1.0, max_backoff=30.0, max_attempts=None):
+        self.host = host
+        self.log_callback = log_callback
+        self.on_status = on_status
+        self.device_factory = device_factory
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts  # None = retry until close()
+        self.device = None
+        self.user = None
+        self.status = "disconnected"  # connected / reconnecting / disconnected
+        self.generation = 0
+        self.reconnects = 0
+        self._ready = threading.Event()
+        self._closed = threading.Event()
+        self._lock = threading.Lock()
+        self._reconnect_thread = None
+
+    @property
+    def controller(self):
+        return self.device.controller
+
+    def is_connected(self):
+        return self._ready.is_set()
+
+    def connect(self):
+        """Establish the session synchronously. Raises on failure."""
+        with self._lock:
+            self._closed.clear()
+            if self.device is None:
+                self.device = self.device_factory(self.host)
+            if self.user is None:
+                users = self.device.get_users()
+                if not users:
+                    raise RuntimeError("No users found on device")
+                self.device.get_status()
+                self.user = users[0]
+            self.device.create_session(self.user)
+            self.generation += 1
+            self._ready.set()
+            self._set_status("connected")
+
+    def mark_lost(self, reason=None):
+        """Called when an input fails; starts the background reconnect loop once per drop."""
+        with self._lock:
+            if self._closed.is_set() or not self._ready.is_set():
+                return
+            self._ready.clear()
+            self._set_status("reconnecting")
+            self.log_callback(f"Session to {self.host} lost{f': {reason}' if reason else ''}. Reconnecting...")
+            self._reconnect_thread = threading.Thread(target=self._reconnect_loop, daemon=True)
+            self._reconnect_thread.start()
+
+    def _reconnect_loop(self):
+        attempt = 0
+        while not self._closed.is_set():
+            if self.max_attempts is not None and attempt >= self.max_attempts:
+                self.log_callback(f"Giving up on {self.host} after {attempt} reconnect attempts.")
+                self._set_status("disconnected")
+                return
+            delay = min(self.max_backoff, self.initial_backoff * (2 ** attempt))
+            attempt += 1
+            if self._closed.wait(delay):
+                return
+            try:
+                self.connect()
+                self.reconnects += 1
+                self.log_callback(f"Reconnected to {self.host} (attempt {attempt}).")
+                return
+            except Exception as e:
+                # The cached user/status may be what is wrong; do the full lookup next time
+                self.user = None
+                self.log_callback(f"Reconnect attempt {attempt} to {self.host} failed: {e}")
+
+    def wait_until_ready(self, stop_event=None, timeout=None):
+        """Block until the session is connected. Returns False if closed, stopped or timed out."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._ready.is_set():
+            if self._closed.is_set() or self.status == "disconnected":
+                return False
+            if stop_event and stop_event.is_set():
+                return False
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            self._ready.wait(0.1)
+        return True
+
+    def close(self):
+        self._closed.set()
+        self._ready.clear()
+        if self.device:
+            try:
+                self.device.disconnect()
+            except Exception:
+                pass
+        self._set_status("disconnected")
+
+    def _set_status(self, status):
+        self.status = status
+        if self.on_status:
+            self.on_status(self, status)
+
+    def wake(self):
+        """Send a wakeup to the console without starting a session."""
+        with self._lock:
+            if self.device is None:
+                self.device = self.device_factory(self.host)
+            user = self.user
+            if user is None:
+                users = self.device.get_users()
+                if not users:
+                    raise RuntimeError("No users found on device")
+                user = users[0]
+            self.device.wakeup(user)
+
+    def keepalive(self):
+        """Cheap liveness probe for idle sessions; a failure triggers the reconnect loop."""
+        if not self._ready.is_set():
+            return False
+        try:
+            self.device.get_status()
+            return True
+        except Exception as e:
+            self.mark_lost(e)
+            return False
+
+class SessionPool:
+    """Sessions kept connected ahead of time (warm standby or group connect) so a macro can start immediately.
+
+    Each warm session is probed every keepalive_interval seconds and closed once it has been
+    idle (no leases) for idle_timeout seconds. Hosts kept warm through warm() (devices flagged
+    "warm") are standbys and never idle out; only cool() closes them. A standby that fails to
+    connect is "retrying": the keepalive loop connects it again with exponential backoff, starting
+    at keepalive_interval and capped at max_retry_backoff seconds.
+    """
+    def __init__(self, session_factory, keepalive_interval=15.0, idle_timeout=1800.0,
+                 max_retry_backoff=300.0, log_callback=print):
+        self.session_factory = session_factory
+        self.keepalive_interval = keepalive_interval
+        self.idle_timeout = idle_timeout
+        self.max_retry_backoff = max_retry_backoff
+        self.log_callback = log_callback
+        self._sessions = {}
+        self._metrics = {}
+        # Hosts asked for with warm(); exempt from the idle timeout until cool()
+        self._standby = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._keepalive_thread = None
+
+    def _entry(self, host):
+        # Caller holds the lock
+        session = self._sessions.get(host)
+        if session is None:
+            session = self.session_factory(host)
+            self._sessions[host] = session
+            previous = self._metrics.get(host)
+            # A standby being retried keeps its retry count, so the backoff keeps growing
+            retries = previous["retries"] if previous and previous["state"] == "retrying" else 0
+            self._metrics[host] = {
+                "state": "retrying" if retries else "warming",
+                "time_to_ready_ms": None,
+                "warmed_at": None,
+                "last_used": time.monotonic(),
+                "leases": 0,
+                "hits": 0,
+                "keepalive_failures": 0,
+                "retries": retries,
+                "retry_at": None,
+            }
+        return session
+
+    def warm(self, host):
+        """Start connecting host in the background (no-op if it is already warm)."""
+        with self._lock:
+            self._standby.add(host)
+            if host in self._sessions:
+                return self._sessions[host]
+            session = self._entry(host)
+        threading.Thread(target=self._connect_quietly, args=(host, session), daemon=True).start()
+        self._ensure_keepalive()
+        return session
+
+    def connect(self, host):
+        """Connect host in the calling thread and keep it in the pool. Raises on failure."""
+        with self._lock:
+            session = self._entry(host)
+        if not session.is_connected():
+            self._connect(host, session)
+        self._ensure_keepalive()
+        return session
+
+    def _connect_quietly(self, host, session):
+        try:
+            self._connect(host, session)
+        except Exception as e:
+            self.log_callback(f"Warm session to {host} failed: {e}")
+
+    def _connect(self, host, session):
+        started = time.perf_counter()
+        try:
+            session.connect()
+        except Exception:
+            with self._lock:
+                if self._sessions.get(host) is session:
+                    del self._sessions[host]
+                    metrics = self._metrics[host]
+                    if host in self._standby:
+                        # Picked up again by the keepalive loop once retry_at has passed
+                        metrics["retries"] += 1
+                        backoff = min(self.max_retry_backoff,
+                                      self.keepalive_interval * (2 ** (metrics["retries"] - 1)))
+                        metrics["state"] = "retrying"
+                        metrics["retry_at"] = time.monotonic() + backoff
+                    else:
+                        metrics["state"] = "failed"
+            raise
+        with self._lock:
+            metrics = self._metrics.get(host)
+            if metrics is not None:
+                metrics["state"] = "ready"
+                metrics["retries"] = 0
+                metrics["retry_at"] = None
+                metrics["time_to_ready_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                metrics["warmed_at"] = time.time()
+        self.log_callback(f"Session to {host} ready.")
+
+    def cool(self, host):
+        """Stop keeping host warm and close its session."""
+        with self._lock:
+            session = self._sessions.pop(host, None)
+            self._metrics.pop(host, None)
+            self._standby.discard(host)
+        if session:
+            session.close()
+
+    def get(self, host):
+        """Return the warm session for host if it is connected, else None."""
+        with self._lock:
+            session = self._sessions.get(host)
+        if session and session.is_connected():
+            return session
+        return None
+
+    def is_pooled(self, session):
+        with self._lock:
+            return self._sessions.get(session.host) is session
+
+    def acquire(self, host):
+        """Lease a connected warm session (keeps it from idling out). Returns None on a miss."""
+        with self._lock:
+            session = self._sessions.get(host)
+            if not session or not session.is_connected():
+                return None
+            metrics = self._metrics[host]
+            metrics["leases"] += 1
+            metrics["hits"] += 1
+            metrics["last_used"] = time.monotonic()
+            return session
+
+    def release(self, host):
+        with self._lock:
+            metrics = self._metrics.get(host)
+            if metrics:
+                metrics["leases"] = max(0, metrics["leases"] - 1)
+                metrics["last_used"] = time.monotonic()
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            out = {}
+            for host, metrics in self._metrics.items():
+                session = self._sessions.get(host)
+                entry = dict(metrics)
+                entry["idle_s"] = round(now - metrics["last_used"], 1)
+                entry["standby"] = host in self._standby
+                retry_at = entry.pop("retry_at")
+                if retry_at is not None and session is None:
+                    entry["retry_in_s"] = round(max(0.0, retry_at - now), 1)
+                del entry["last_used"]
+                if session:
+                    entry["state"] = session.status if metrics["state"] == "ready" else metrics["state"]
+                    entry["reconnects"] = session.reconnects
+                out[host] = entry
+            return out
+
+    def close_all(self):
+        self._stop.set()
+        with self._lock:
+            hosts = list(self._sessions)
+        for host in hosts:
+            self.cool(host)
+
+    def _ensure_keepalive(self):
+        if self._keepalive_thread and self._keepalive_thread.is_alive():
+            return
+        self._keepalive_thread = threading.Thread(target=self._keepalive_loop, daemon=True)
+        self._keepalive_thread.start()
+
+    def _keepalive_loop(self):
+        while not self._stop.wait(self.keepalive_interval):
+            now = time.monotonic()
+            with self._lock:
+                entries = [(host, self._sessions[host], dict(self._metrics[host]), host in self._standby)
+                           for host in self._sessions]
+                retries = [(host, self._metrics[host]["retries"], self._entry(host)) for host in self._standby
+                           if host not in self._sessions and self._metrics[host]["state"] == "retrying"
+                           and self._metrics[host]["retry_at"] <= now]
+            for host, attempt, session in retries:
+                self.log_callback(f"Retrying warm session to {host} (retry {attempt}).")
+                threading.Thread(target=self._connect_quietly, args=(host, session), daemon=True).start()
+            for host, session, metrics, standby in entries:
+                if not standby and metrics["leases"] == 0 and now - metrics["last_used"] >= self.idle_timeout:
+                    self.log_callback(f"Warm session to {host} idle for {self.idle_timeout:.0f}s; closing.")
+                    self.cool(host)
+                elif metrics["state"] == "ready" and not session.keepalive():
+                    with self._lock:
+                        if host in self._metrics:
+                            self._metrics[host]["keepalive_failures"] += 1
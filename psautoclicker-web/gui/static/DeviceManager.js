@@ -6,6 +6,7 @@ export class DeviceManager {
         this.deviceList = document.getElementById('deviceList');
         this.deviceLabel = document.getElementById('deviceLabel');
         this.deviceHost = document.getElementById('deviceHost');
+        this.deviceWarm = document.getElementById('deviceWarm');
         this.connectionStatus = document.getElementById('connectionStatus');
         this.init();
     }
@@ -16,6 +17,8 @@ export class DeviceManager {
         document.getElementById('removeDeviceBtn').addEventListener('click', () => this.remove());
         document.getElementById('connectDeviceBtn').addEventListener('click', () => this.connect());
         document.getElementById('disconnectDeviceBtn').addEventListener('click', () => this.disconnect());
+        // saved_ips.json was changed (by another tab or by hand); the server pushes devices_changed
+        io().on('devices_changed', () => this.load());
         this.load();
     }
     load() {
@@ -27,7 +30,7 @@ export class DeviceManager {
                 console.log(`[DEBUG] Adding device option: key=${d.key}, host=${d.host}, label=${d.label}`);
                 const opt = document.createElement('option');
                 opt.value = d.key;
-                opt.textContent = d.label ? `${d.label} (${d.host})` : d.host;
+                opt.textContent = (d.label ? `${d.label} (${d.host})` : d.host) + (d.warm ? ' [warm]' : '');
                 this.deviceList.appendChild(opt);
             });
             if (devs.length > 0) {
@@ -38,6 +41,7 @@ export class DeviceManager {
                 this.selectedDeviceKey = null;
                 this.deviceLabel.value = '';
                 this.deviceHost.value = '';
+                this.deviceWarm.checked = false;
             }
         }).catch(e => console.error('[DEBUG] Error loading devices:', e));
         fetch('/api/connection_status').then(r => r.json()).then(status => {
@@ -53,26 +57,29 @@ export class DeviceManager {
         if (dev) {
             this.deviceLabel.value = dev.label || '';
             this.deviceHost.value = dev.host || '';
+            this.deviceWarm.checked = !!dev.warm;
         }
     }
     add() {
         const host = this.deviceHost.value.trim();
         const label = this.deviceLabel.value.trim();
+        const warm = this.deviceWarm.checked;
         if (!host) { alert('Host/IP required'); return; }
         fetch('/api/devices', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ host, label })
+            body: JSON.stringify({ host, label, warm })
         }).then(() => this.load()).catch(e => console.error('[DEBUG] Error adding device:', e));
     }
     edit() {
         if (!this.selectedDeviceKey) { alert('Select a device to edit'); return; }
         const host = this.deviceHost.value.trim();
         const label = this.deviceLabel.value.trim();
+        const warm = this.deviceWarm.checked;
         fetch(`/api/devices/${this.selectedDeviceKey}`, {
             method: 'PUT',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ host, label })
+            body: JSON.stringify({ host, label, warm })
         }).then(() => this.load()).catch(e => console.error('[DEBUG] Error editing device:', e));
     }
     remove() {
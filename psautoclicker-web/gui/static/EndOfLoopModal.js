@@ -24,8 +24,7 @@ export class EndOfLoopModal {
         this.nameSpan.textContent = name;
         if (this.eolWorkspace) this.eolWorkspace.dispose();
         this.eolWorkspace = Blockly.inject('eolBlocklyDiv', { toolbox: this.toolbox });
-        fetch(`/api/macros`).then(r => r.json()).then(macros => {
-            const macro = macros.find(m => m.name === name);
+        fetch(`/api/macros/${encodeURIComponent(name)}`).then(r => r.ok ? r.json() : null).then(macro => {
             if (macro) {
                 // Load steps into Blockly
                 if (window.MacroEditor && window.MacroEditor.macroStepsToBlockly) {
@@ -54,7 +53,11 @@ export class EndOfLoopModal {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ name, steps })
-        }).then(() => {
+        }).then(r => r.json()).then(data => {
+            if (data.status !== 'ok') {
+                alert([data.error || 'Failed to save macro.', ...(data.details || [])].join('\n'));
+                return;
+            }
             this.close();
             if (window.macroManager) {
                 window.macroManager.load('manual');
@@ -31,8 +31,7 @@ export const MacroEditor = {
         document.getElementById('editEOLBtn').addEventListener('click', () => this.editEndOfLoopMacro());
     },
     loadMacro(name) {
-        fetch('/api/macros').then(r => r.json()).then(macros => {
-            const macro = macros.find(m => m.name === name);
+        fetch(`/api/macros/${encodeURIComponent(name)}`).then(r => r.ok ? r.json() : null).then(macro => {
             if (macro) {
                 this.macroName.value = macro.name;
                 this.macroDesc.value = macro.description || '';
@@ -56,8 +55,11 @@ export const MacroEditor = {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(macro)
-        }).then(() => {
-            if (window.macroManager) {
+        }).then(r => r.json()).then(data => {
+            if (data.status !== 'ok') {
+                // Invalid macros are refused with the problems found, e.g. "steps[3][0]: unknown button 'X'"
+                alert([data.error || 'Failed to save macro.', ...(data.details || [])].join('\n'));
+            } else if (window.macroManager) {
                 window.macroManager.load('manual');
             }
         });
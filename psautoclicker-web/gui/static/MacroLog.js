@@ -4,18 +4,48 @@ export class MacroLog {
     constructor() {
         this.logElem = document.getElementById('macroLog');
         this.lastJobId = null;
+        this.lastSeq = 0;  // sequence number of the newest line rendered
+        this.resyncing = false;
+        this.pendingHtml = [];
+        this.renderScheduled = false;
         this.socket = io();
         this.init();
     }
     init() {
         this.socket.on('macro_log', (data) => this.onMacroLog(data));
+        // After a reconnect, pick up where we left off instead of refetching the whole log
+        this.socket.on('connect', () => { if (this.lastJobId) this.join(); });
+    }
+    join() {
+        this.socket.emit('join_job', { job_id: this.lastJobId, since: this.lastSeq });
     }
     onMacroLog(data) {
-        if (data.job_id === this.lastJobId) {
-            const logLines = (data.log || []);
-            this.logElem.innerHTML = logLines.map(this.colorizeLogLine).join('<br>');
+        if (data.job_id !== this.lastJobId) return;
+        const lines = data.lines || [];
+        if (data.seq > this.lastSeq + 1 && !this.resyncing) {
+            // Missed some lines (e.g. a dropped socket); ask the server to resend from our position once
+            this.resyncing = true;
+            this.join();
+            return;
+        }
+        this.resyncing = false;
+        const fresh = lines.slice(Math.max(0, this.lastSeq + 1 - data.seq));
+        if (fresh.length === 0) return;
+        this.pendingHtml.push(fresh.map(line => this.colorizeLogLine(line) + '<br>').join(''));
+        this.lastSeq = data.seq + lines.length - 1;
+        // Batches arriving within one frame are rendered together
+        if (!this.renderScheduled) {
+            this.renderScheduled = true;
+            requestAnimationFrame(() => this.render());
         }
     }
+    render() {
+        this.renderScheduled = false;
+        if (this.pendingHtml.length === 0) return;
+        this.logElem.insertAdjacentHTML('beforeend', this.pendingHtml.join(''));
+        this.pendingHtml = [];
+        this.logElem.scrollTop = this.logElem.scrollHeight;
+    }
     colorizeLogLine(line) {
         if (/error|fail/i.test(line)) {
             return `<span style='color:#ff4e4e;'>${MacroLog.escapeHtml(line)}</span>`;
@@ -39,11 +69,17 @@ export class MacroLog {
         return MacroLog.escapeHtml(line);
     }
     static escapeHtml(text) {
-        return text.replace(/[&<>"]'/g, function(m) {
+        return text.replace(/[&<>"']/g, function(m) {
             return ({'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;','\'':'&#39;'})[m];
         });
     }
     setJobId(jobId) {
+        if (jobId === this.lastJobId) return;
         this.lastJobId = jobId;
+        this.lastSeq = 0;
+        this.resyncing = false;
+        this.pendingHtml = [];
+        this.logElem.innerHTML = '';
+        this.join();
     }
-} 
\ No newline at end of file
+}
@@ -4,7 +4,7 @@ export class MacroManager {
         this.macroList = document.getElementById('macroList');
         this.refreshBtn = document.getElementById('refreshMacrosBtn');
         this.autoRefreshCb = document.getElementById('autoRefreshMacros');
-        this.autoRefreshInterval = null;
+        this.socket = io();
         this.currentJobId = null;
         this.init();
     }
@@ -16,20 +16,25 @@ export class MacroManager {
         document.getElementById('deleteMacroBtn').addEventListener('click', () => this.deleteMacro());
         document.getElementById('importMacroBtn').addEventListener('click', () => this.importMacro());
         document.getElementById('exportMacroBtn').addEventListener('click', () => this.exportMacro());
+        document.getElementById('exportAllMacrosBtn').addEventListener('click', () => window.open('/api/macros/archive?format=zip'));
         document.getElementById('downloadMacroFromGitHubBtn').addEventListener('click', () => this.downloadMacroFromGitHub());
         this.macroList.addEventListener('change', () => this.onMacroListChange());
+        // The server pushes macros_changed whenever a macro file is added, edited or removed on disk
+        this.socket.on('macros_changed', (data) => { if (this.autoRefreshCb.checked) this.load('push'); });
         this.toggleAutoRefresh();
         this.load('manual');
     }
     load(source = 'manual') {
         console.log(`[DEBUG] loadMacros called (${source})`);
-        fetch('/api/macros').then(r => r.json()).then(macros => {
+        // Summaries only; the editor fetches the selected macro. Unchanged lists come back as an empty 304.
+        fetch('/api/macros?view=summary').then(r => r.json()).then(macros => {
             console.log(`[DEBUG] Macros loaded:`, macros);
             this.macroList.innerHTML = '';
             macros.forEach((m, i) => {
                 const opt = document.createElement('option');
                 opt.value = m.name;
                 opt.textContent = m.name;
+                opt.title = `${m.description || ''}\n${m.steps} steps, ~${(m.estimated_duration_ms / 1000).toFixed(1)} s per loop`.trim();
                 this.macroList.appendChild(opt);
             });
             if (macros.length > 0) {
@@ -42,11 +47,9 @@ export class MacroManager {
     }
     toggleAutoRefresh() {
         if (this.autoRefreshCb.checked) {
-            this.autoRefreshInterval = setInterval(() => this.load('auto'), 30000);
-            this.refreshBtn.title = "The macro list auto-refreshes every 30 seconds. Click to refresh manually.";
+            this.refreshBtn.title = "The macro list refreshes as soon as a macro file changes. Click to refresh manually.";
             console.log('[DEBUG] Macro auto-refresh enabled');
         } else {
-            clearInterval(this.autoRefreshInterval);
             this.refreshBtn.title = "Auto-refresh is disabled. Click to refresh manually.";
             console.log('[DEBUG] Macro auto-refresh disabled');
         }
@@ -106,6 +109,7 @@ export class MacroManager {
             if (!file) return;
             const formData = new FormData();
             formData.append('file', file);
+            if (!file.name.endsWith('.json')) return this.importArchive(formData);
             fetch('/api/macros/import', {
                 method: 'POST',
                 body: formData
@@ -113,12 +117,24 @@ export class MacroManager {
                 if (data.status === 'ok') {
                     this.load('manual');
                 } else {
-                    alert(data.error || 'Failed to import macro.');
+                    alert([data.error || 'Failed to import macro.', ...(data.details || [])].join('\n'));
                 }
             });
         };
         fileInput.click();
     }
+    importArchive(formData) {
+        // A .zip / .tar(.gz) library: every file is checked, the report lists the ones that failed
+        fetch('/api/macros/archive', {
+            method: 'POST',
+            body: formData
+        }).then(r => r.json()).then(data => {
+            if (data.error) return alert(data.error);
+            const failed = data.files.filter(f => f.status === 'failed').map(f => `${f.file}: ${f.errors.join('; ')}`);
+            alert([`Imported ${data.imported} macro(s), ${data.failed} failed.`, ...failed].join('\n'));
+            this.load('manual');
+        });
+    }
     exportMacro() {
         const name = this.macroList.value;
         if (!name) return alert('Select a macro to export.');
@@ -136,7 +152,7 @@ export class MacroManager {
                 if (data.status === 'ok') {
                     this.load('manual');
                 } else {
-                    alert(data.error || 'Failed to download macro.');
+                    alert([data.error || 'Failed to download macro.', ...(data.details || [])].join('\n'));
                 }
             });
         }).catch(e => alert('Failed to fetch macro from GitHub.'));
@@ -148,13 +164,8 @@ export class MacroManager {
         }
     }
     listenMacroLog(job_id) {
-        if (!window.io) return;
-        const socket = window.io();
-        socket.emit('join_job', { job_id });
-        socket.on('macro_log', (data) => {
-            if (data.job_id === job_id && window.macroLog) {
-                window.macroLog.updateLog(data.log, data.status);
-            }
-        });
+        if (window.macroLog) {
+            window.macroLog.setJobId(job_id);
+        }
     }
-} 
\ No newline at end of file
+}
@@ -0,0 +1,63 @@
+import bisect
+import time
+
+# Upper bounds (ms) of the lateness histogram buckets: 0.05 ms doubling up to ~27 min, plus overflow
+LATENESS_BUCKETS_MS = tuple(0.05 * 2 ** i for i in range(25))
+
+class RunStats:
+    """Running totals for one macro run; every update is O(1) so it can sit on the step path.
+
+    Lateness is how far behind its schedule a step started. The mean is exact; percentiles come from
+    a fixed log-scale histogram and are reported as the upper bound of the bucket they fall in.
+    """
+    def __init__(self):
+        self.started = time.monotonic()
+        self.loops = 0
+        self.steps = 0
+        self.errors = 0
+        self._late_sum_ms = 0.0
+        self._late_max_ms = 0.0
+        self._hist = [0] * (len(LATENESS_BUCKETS_MS) + 1)
+
+    def step(self, late_ms):
+        self.steps += 1
+        self._late_sum_ms += late_ms
+        if late_ms > self._late_max_ms:
+            self._late_max_ms = late_ms
+        self._hist[bisect.bisect_left(LATENESS_BUCKETS_MS, late_ms)] += 1
+
+    def loop_done(self):
+        self.loops += 1
+
+    def error(self):
+        self.errors += 1
+
+    def percentile(self, p):
+        if not self.steps:
+            return 0.0
+        rank = p / 100.0 * self.steps
+        seen = 0
+        for i, count in enumerate(self._hist):
+            seen += count
+            if seen >= rank:
+                return LATENESS_BUCKETS_MS[i] if i < len(LATENESS_BUCKETS_MS) else self._late_max_ms
+        return self._late_max_ms
+
+    def snapshot(self, inputs=None):
+        elapsed = time.monotonic() - self.started
+        return {
+            "loops": self.loops,
+            "steps": self.steps,
+            "inputs": dict(inputs or {}),
+            "errors": self.errors,
+            "elapsed_s": round(elapsed, 3),
+            "loops_per_hour": round(self.loops / elapsed * 3600, 1) if elapsed > 0 else 0.0,
+            "late_mean_ms": round(self._late_sum_ms / self.steps, 3) if self.steps else 0.0,
+            "late_p99_ms": round(self.percentile(99), 3),
+            "late_max_ms": round(self._late_max_ms, 3),
+        }
+
+    def summary(self, inputs=None):
+        s = self.snapshot(inputs)
+        return (f"Loops {s['loops']} | {sum(s['inputs'].values())} inputs | {s['loops_per_hour']:.0f} loops/h | "
+                f"late mean {s['late_mean_ms']:.1f} ms, p99 {s['late_p99_ms']:.1f} ms | {s['errors']} errors")
@@ -0,0 +1,175 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+
+# Events passed to the callback as on_event(kind, path)
+ADDED = "added"
+MODIFIED = "modified"
+DELETED = "deleted"
+
+WATCH_POLL_INTERVAL_S = 2.0
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+def _load_inotify():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+class DirectoryWatcher:
+    """Reports added/modified/deleted files in a set of directories from a background thread.
+
+    Uses inotify on Linux and falls back to comparing (mtime, size) of every file each
+    poll_interval seconds elsewhere (or when inotify is unavailable). Only files accepted by
+    file_filter(name) are reported. on_event(kind, path) runs on the watcher thread.
+    """
+    def __init__(self, directories, on_event, file_filter=None, poll_interval=WATCH_POLL_INTERVAL_S,
+                 use_inotify=True, log_callback=print):
+        self.directories = [os.path.abspath(d) for d in directories]
+        self.on_event = on_event
+        self.file_filter = file_filter or (lambda name: True)
+        self.poll_interval = poll_interval
+        self.log_callback = log_callback
+        self.backend = None
+        self._libc = _load_inotify() if use_inotify else None
+        self._known = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        for directory in self.directories:
+            os.makedirs(directory, exist_ok=True)
+        self._known = self._scan()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _scan(self):
+        files = {}
+        for directory in self.directories:
+            try:
+                entries = list(os.scandir(directory))
+            except FileNotFoundError:
+                continue
+            for dirent in entries:
+                if self.file_filter(dirent.name) and dirent.is_file():
+                    st = dirent.stat()
+                    files[dirent.path] = (st.st_mtime_ns, st.st_size)
+        return files
+
+    def _emit(self, kind, path):
+        try:
+            self.on_event(kind, path)
+        except Exception as e:
+            self.log_callback(f"Watcher callback failed for {kind} {path}: {e}")
+
+    def _diff(self):
+        # Compare a fresh scan with what we knew; used for polling and to resync after an inotify overflow
+        current = self._scan()
+        for path, sig in current.items():
+            old = self._known.get(path)
+            if old is None:
+                self._emit(ADDED, path)
+            elif old != sig:
+                self._emit(MODIFIED, path)
+        for path in self._known:
+            if path not in current:
+                self._emit(DELETED, path)
+        self._known = current
+
+    def _run(self):
+        fd = self._inotify_init()
+        if fd is None:
+            self.backend = "polling"
+            while not self._stop.wait(self.poll_interval):
+                self._diff()
+            return
+        self.backend = "inotify"
+        try:
+            self._inotify_loop(fd)
+        finally:
+            os.close(fd)
+
+    # --- inotify backend ---
+    def _inotify_init(self):
+        if self._libc is None:
+            return None
+        fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        self._wds = {}
+        # Completed writes and renames only, so a file is never picked up half-written
+        mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_DELETE_SELF
+        for directory in self.directories:
+            wd = self._libc.inotify_add_watch(fd, os.fsencode(directory), mask)
+            if wd < 0:
+                os.close(fd)
+                return None
+            self._wds[wd] = directory
+        return fd
+
+    def _inotify_loop(self, fd):
+        while not self._stop.is_set():
+            readable, _, _ = select.select([fd], [], [], 0.5)
+            if not readable:
+                continue
+            try:
+                data = os.read(fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            changed = {}
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    changed = None
+                    break
+                directory = self._wds.get(wd)
+                if directory is None or not name or not self.file_filter(name):
+                    continue
+                changed[os.path.join(directory, name)] = mask
+            if changed is None:
+                self._diff()
+                continue
+            # One event per file per batch, however many raw events it produced
+            for path in changed:
+                self._settle(path)
+
+    def _settle(self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            if self._known.pop(path, None) is not None:
+                self._emit(DELETED, path)
+            return
+        sig = (st.st_mtime_ns, st.st_size)
+        old = self._known.get(path)
+        if old == sig:
+            return
+        self._known[path] = sig
+        self._emit(ADDED if old is None else MODIFIED, path)
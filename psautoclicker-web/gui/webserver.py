@@ -1,12 +1,27 @@
-from flask import Flask, request, jsonify, send_from_directory, send_file
+from flask import Flask, request, jsonify, send_from_directory, send_file, g
 from flask_cors import CORS
+import atexit
+import io
 import os
 import json
-import glob
+import logging
 import threading
 import time
-import uuid
-from pyremoteplay import RPDevice
+from .session import SupervisedSession, SessionPool
+from .engine import MacroJob, log_since, stick_point
+from .catalog import MacroCatalog, is_macro_file, macro_name_from_filename
+from .macrodb import open_macro_store
+from .schema import MacroValidationError
+from .history import diff_versions
+from .archive import ARCHIVE_FORMATS, import_archive, iter_archive
+from .jobs import JobStore
+from .logbatch import LogBatcher
+from .runlog import RunLogWriter
+from .watcher import DELETED, MODIFIED, DirectoryWatcher
+from .devices import DeviceRegistry
+from .logconfig import REQUEST_LOGGER
+from .fakedevice import FAKE_DEVICES
+from .groups import GROUP_MAX_PARALLEL, fan_out, read_groups, write_groups
 import queue
 import shutil
 from flask_socketio import SocketIO, emit, join_room
@@ -16,68 +31,77 @@ from werkzeug.utils import secure_filename
 app = Flask(__name__)
 CORS(app)
 
+logger = logging.getLogger(__name__)
+request_logger = logging.getLogger(REQUEST_LOGGER)
+
 # Always resolve paths relative to the project root (where main.py is)
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SAVED_IPS_PATH = os.path.join(PROJECT_ROOT, "saved_ips.json")
 MACROS_DIR = os.path.join(PROJECT_ROOT, "Macros")
-
-macro_jobs = {}
+DEVICE_GROUPS_PATH = os.path.join(PROJECT_ROOT, "device_groups.json")
+
+# Parsed macros, cached per file and kept current by the file watcher; list and run requests are served from it
+# With PSAUTO_MACRO_DB set they live in that SQLite file instead (see gui/macrodb.py)
+macro_catalog = open_macro_store(MACROS_DIR, log_callback=logger.info)
+JOB_LOGS_DIR = os.path.join(PROJECT_ROOT, "JobLogs")
+RUN_LOGS_DIR = os.path.join(PROJECT_ROOT, "RunLogs")
+
+# Job records with ring-buffered logs; old finished jobs are evicted and their logs spilled to JobLogs
+macro_jobs = JobStore(spill_dir=JOB_LOGS_DIR)
+# Structured per-run event logs (RunLogs/<job_id>.jsonl), written by a background thread
+run_logs = RunLogWriter(RUN_LOGS_DIR)
 connected_device = {"ip": None, "status": "disconnected"}
 
-rp_device = None
+rp_session = None
 rp_command_queue = queue.Queue()
 rp_session_thread = None
 
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode="threading")
 
+def _emit_log_batch(job_id, batch):
+    socketio.emit("macro_log", dict(batch, job_id=job_id), room=job_id)
+    job = macro_jobs.get(job_id)
+    if job:
+        job["stream"]["messages"] += 1
+
+# Macro log lines are sent to each job room in batches (every 50 ms, or 200 lines) rather than one emit per line
+log_batcher = LogBatcher(_emit_log_batch)
+
 manual_autoclicker_thread = None
 manual_autoclicker_stop = threading.Event()
 
 macro_stop_events = {}
 
+# Warm standby: devices flagged "warm" in saved_ips.json keep a session open between runs
+WARM_KEEPALIVE_INTERVAL_S = 15
+WARM_IDLE_TIMEOUT_S = 30 * 60
+warm_pool = SessionPool(
+    lambda host: SupervisedSession(host, on_status=_on_session_status),
+    keepalive_interval=WARM_KEEPALIVE_INTERVAL_S,
+    idle_timeout=WARM_IDLE_TIMEOUT_S,
+)
+
 # --- Device Management Endpoints ---
-print(f"[DEBUG] SAVED_IPS_PATH resolved to: {SAVED_IPS_PATH}")
-
-def ensure_saved_ips():
-    # Always ensure saved_ips.json is a dict
-    print(f"[DEBUG] ensure_saved_ips called. Path: {SAVED_IPS_PATH}")
-    if not os.path.exists(SAVED_IPS_PATH):
-        print("[DEBUG] saved_ips.json does not exist, creating new.")
-        with open(SAVED_IPS_PATH, 'w') as f:
-            json.dump({}, f)
-    else:
-        try:
-            with open(SAVED_IPS_PATH, 'r') as f:
-                data = json.load(f)
-            print(f"[DEBUG] saved_ips.json loaded: {data}")
-            if not isinstance(data, dict):
-                print("[DEBUG] saved_ips.json is not a dict, resetting.")
-                with open(SAVED_IPS_PATH, 'w') as f:
-                    json.dump({}, f)
-        except Exception as e:
-            print(f"[DEBUG] Error reading saved_ips.json: {e}, resetting.")
-            with open(SAVED_IPS_PATH, 'w') as f:
-                json.dump({}, f)
+logger.debug("SAVED_IPS_PATH resolved to: %s", SAVED_IPS_PATH)
+
+# The registry is the source of truth; requests never read saved_ips.json, edits are written back in the background
+device_registry = DeviceRegistry(SAVED_IPS_PATH, log_callback=logger.warning)
+atexit.register(device_registry.flush)
 
 def read_devices():
-    ensure_saved_ips()
-    with open(SAVED_IPS_PATH, 'r') as f:
-        data = json.load(f)
-        print(f"[DEBUG] read_devices loaded: {data}")
-        return data
-
-def write_devices(devices):
-    print(f"[DEBUG] write_devices called with: {devices}")
-    with open(SAVED_IPS_PATH, 'w') as f:
-        json.dump(devices, f, indent=2)
-    print(f"[DEBUG] write_devices wrote to {SAVED_IPS_PATH}")
+    return device_registry.snapshot()
+
+def devices_changed():
+    # After any edit: bring warm sessions in line and let every open browser reload its device list
+    sync_warm_sessions(device_registry.snapshot())
+    socketio.emit("devices_changed", {})
 
 @app.route("/api/devices", methods=["GET"])
 def list_devices():
     devices = read_devices()
     # Return as a list of dicts with key, host, label
     return jsonify([
-        {"key": k, "host": v["host"], "label": v.get("label", "")}
+        {"key": k, "host": v["host"], "label": v.get("label", ""), "warm": v.get("warm", False)}
         for k, v in devices.items()
     ])
 
@@ -86,15 +110,11 @@ def add_device():
     data = request.json
     host = data.get("host")
     label = data.get("label", "")
-    print(f"[DEBUG] add_device called with host={host}, label={label}")
+    logger.debug("add_device host=%s label=%s", host, label)
     if not host:
         return jsonify({"error": "Host required"}), 400
-    devices = read_devices()
-    print(f"[DEBUG] Devices before add: {devices}")
-    key = host
-    devices[key] = {"host": host, "label": label}
-    write_devices(devices)
-    print(f"[DEBUG] Devices after add: {devices}")
+    device_registry.put(host, {"host": host, "label": label, "warm": bool(data.get("warm", False))})
+    devices_changed()
     return jsonify({"status": "ok"})
 
 @app.route("/api/devices/<key>", methods=["PUT"])
@@ -102,62 +122,137 @@ def edit_device(key):
     data = request.json
     host = data.get("host")
     label = data.get("label", "")
-    print(f"[DEBUG] edit_device called with key={key}, host={host}, label={label}")
-    devices = read_devices()
-    print(f"[DEBUG] Devices before edit: {devices}")
-    if key not in devices:
+    logger.debug("edit_device key=%s host=%s label=%s", key, host, label)
+    device = device_registry.get(key)
+    if device is None:
         return jsonify({"error": "Device not found"}), 404
-    devices[key] = {"host": host, "label": label}
-    write_devices(devices)
-    print(f"[DEBUG] Devices after edit: {devices}")
+    device_registry.put(key, {"host": host, "label": label, "warm": bool(data.get("warm", device.get("warm", False)))})
+    devices_changed()
     return jsonify({"status": "ok"})
 
 @app.route("/api/devices/<key>", methods=["DELETE"])
 def delete_device(key):
-    print(f"[DEBUG] delete_device called with key={key}")
-    devices = read_devices()
-    print(f"[DEBUG] Devices before delete: {devices}")
-    if key in devices:
-        del devices[key]
-        write_devices(devices)
-        print(f"[DEBUG] Devices after delete: {devices}")
+    logger.debug("delete_device key=%s", key)
+    if device_registry.delete(key):
+        devices_changed()
         return jsonify({"status": "ok"})
-    print(f"[DEBUG] Device {key} not found for delete.")
+    logger.debug("Device %s not found for delete.", key)
     return jsonify({"error": "Device not found"}), 404
 
+@app.route("/api/devices/<key>/warm", methods=["POST"])
+def set_device_warm(key):
+    data = request.json or {}
+    device = device_registry.update(key, warm=bool(data.get("enabled", True)))
+    if device is None:
+        return jsonify({"error": "Device not found"}), 404
+    devices_changed()
+    return jsonify({"status": "ok", "warm": device["warm"]})
+
+@app.route("/api/warm_sessions", methods=["GET"])
+def list_warm_sessions():
+    return jsonify(warm_pool.snapshot())
+
+def sync_warm_sessions(devices):
+    wanted = {v["host"] for v in devices.values() if v.get("warm")}
+    for host in wanted:
+        warm_pool.warm(host)
+    for host in set(warm_pool.snapshot()) - wanted:
+        warm_pool.cool(host)
+
 # --- Macro Management (Stub) ---
+def notify_macros_changed(kind, name):
+    # The file watcher announces changes to the Macros dir; a SQLite store has no files to watch
+    if not macro_catalog.watching:
+        socketio.emit("macros_changed", {"event": kind, "name": name})
+
+def conditional_json(etag, payload):
+    """JSON response carrying a strong ETag; 304 without a body when the client already has it.
+
+    no-cache makes browsers revalidate on every fetch, so an unchanged resource costs one empty 304.
+    """
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
 @app.route("/api/macros", methods=["GET"])
 def list_macros():
-    if not os.path.exists(MACROS_DIR):
-        return jsonify([])
-    macro_files = glob.glob(os.path.join(MACROS_DIR, "*.json"))
-    macros = []
-    for path in macro_files:
-        try:
-            with open(path, "r") as f:
-                macro = json.load(f)
-                macros.append(macro)
-        except Exception:
-            continue
-    return jsonify(macros)
+    # ?view=summary lists name, description, step count and estimated loop duration instead of full macros
+    if request.args.get("q") or request.args.get("tag"):
+        # Search results (always summaries) change with every edit; they are not worth an ETag
+        return jsonify(macro_catalog.search(request.args.get("q"), request.args.get("tag")))
+    etag, macros = macro_catalog.listing(summary=request.args.get("view") == "summary")
+    return conditional_json(etag, macros)
+
+@app.route("/api/macro_tags", methods=["GET"])
+def list_macro_tags():
+    return jsonify(macro_catalog.tags())
+
+@app.route("/api/macros/<name>", methods=["GET"])
+def get_macro(name):
+    etag, macro = macro_catalog.detail(name)
+    if macro is None:
+        return jsonify({"error": "Macro not found"}), 404
+    return conditional_json(etag, macro)
+
+@app.route("/api/macros/<name>/history", methods=["GET"])
+def macro_history(name):
+    # Oldest first; version numbers are what /history/<version>, rollback and diff take
+    return jsonify({"name": name, "versions": macro_catalog.versions(name)})
+
+@app.route("/api/macros/<name>/history/<int:version>", methods=["GET"])
+def macro_version(name, version):
+    macro = macro_catalog.version(name, version)
+    if macro is None:
+        return jsonify({"error": "Version not found"}), 404
+    return jsonify(macro)
+
+@app.route("/api/macros/<name>/rollback", methods=["POST"])
+def rollback_macro(name):
+    version = (request.json or {}).get("version")
+    if not isinstance(version, int):
+        return jsonify({"error": "version (a number) required"}), 400
+    try:
+        macro = macro_catalog.rollback(name, version)
+    except MacroValidationError as e:
+        return jsonify({"error": "Invalid macro", "details": e.errors}), 400
+    if macro is None:
+        return jsonify({"error": "Version not found"}), 404
+    notify_macros_changed(MODIFIED, name)
+    return jsonify({"status": "ok", "version": version})
+
+@app.route("/api/macros/<name>/diff", methods=["GET"])
+def diff_macro(name):
+    # ?from=<version>&to=<version>; by default the previous version against the current macro
+    diff = diff_versions(macro_catalog, name, request.args.get("from", type=int), request.args.get("to", type=int))
+    if diff is None:
+        return jsonify({"error": "Version not found"}), 404
+    return jsonify({"name": name, "diff": diff})
+
+@app.route("/api/macro_duplicates", methods=["GET"])
+def list_macro_duplicates():
+    # Names of macros with the same content (copies left by saving under a new name, re-imports)
+    return jsonify(macro_catalog.duplicates())
 
 @app.route("/api/macros", methods=["POST"])
 def add_macro():
     macro = request.json
     if not macro or not macro.get("name"):
         return jsonify({"error": "Macro must have a name"}), 400
-    if not os.path.exists(MACROS_DIR):
-        os.makedirs(MACROS_DIR)
-    macro_path = os.path.join(MACROS_DIR, f"{macro['name']}.json")
-    with open(macro_path, "w") as f:
-        json.dump(macro, f, indent=2)
+    try:
+        macro_catalog.save(macro)
+    except MacroValidationError as e:
+        return jsonify({"error": "Invalid macro", "details": e.errors}), 400
+    notify_macros_changed(MODIFIED, macro["name"])
     return jsonify({"status": "ok"})
 
 @app.route("/api/macros/<name>", methods=["DELETE"])
 def delete_macro(name):
-    macro_path = os.path.join(MACROS_DIR, f"{name}.json")
-    if os.path.exists(macro_path):
-        os.remove(macro_path)
+    if macro_catalog.delete(name):
+        notify_macros_changed(DELETED, name)
         return jsonify({"status": "ok"})
     return jsonify({"error": "Macro not found"}), 404
 
@@ -169,53 +264,111 @@ def import_macro():
     if not file.filename.endswith('.json'):
         return jsonify({"error": "Only .json files allowed"}), 400
     filename = secure_filename(file.filename)
-    if not os.path.exists(MACROS_DIR):
-        os.makedirs(MACROS_DIR)
-    path = os.path.join(MACROS_DIR, filename)
-    file.save(path)
-    return jsonify({"status": "ok"})
+    try:
+        macro = json.load(file.stream)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid JSON: {e}"}), 400
+    if not isinstance(macro, dict):
+        return jsonify({"error": "A macro file must contain a JSON object"}), 400
+    # Stored under its "name" (or the file name without .macro.json / .json) in whichever store is active
+    macro["name"] = macro.get("name") or macro_name_from_filename(filename)
+    try:
+        macro_catalog.save(macro)
+    except MacroValidationError as e:
+        return jsonify({"error": "Invalid macro", "details": e.errors}), 400
+    notify_macros_changed(MODIFIED, macro["name"])
+    return jsonify({"status": "ok", "name": macro["name"]})
 
 @app.route("/api/macros/export/<name>", methods=["GET"])
 def export_macro(name):
-    filename = f"{name}.json"
-    path = os.path.join(MACROS_DIR, filename)
-    if not os.path.exists(path):
+    macro = macro_catalog.get(name)
+    if macro is None:
         return jsonify({"error": "Macro not found"}), 404
-    return send_file(path, as_attachment=True)
+    data = io.BytesIO(json.dumps(macro, indent=2).encode("utf-8"))
+    return send_file(data, mimetype="application/json", as_attachment=True,
+                     download_name=f"{secure_filename(name) or 'macro'}.macro.json")
+
+@app.route("/api/macros/archive", methods=["GET"])
+def export_macro_archive():
+    # The whole library, ?names=a,b or what ?q= / ?tag= find; ?format=zip (default), tar or tar.gz
+    fmt = request.args.get("format", "zip")
+    if fmt not in ARCHIVE_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(ARCHIVE_FORMATS)}"}), 400
+    if request.args.get("names"):
+        names = [name for name in request.args["names"].split(",") if name]
+    elif request.args.get("q") or request.args.get("tag"):
+        names = [m["name"] for m in macro_catalog.search(request.args.get("q"), request.args.get("tag"), limit=sys.maxsize)]
+    else:
+        names = [m["name"] for m in macro_catalog.listing(summary=True)[1]]
+    # Read one macro at a time while the archive streams out
+    macros = (macro for macro in map(macro_catalog.get, names) if macro is not None)
+    mimetype, extension, _ = ARCHIVE_FORMATS[fmt]
+    response = app.response_class(iter_archive(macros, fmt), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f'attachment; filename="macros{extension}"'
+    return response
+
+@app.route("/api/macros/archive", methods=["POST"])
+def import_macro_archive():
+    if 'file' not in request.files:
+        return jsonify({"error": "No file uploaded"}), 400
+    try:
+        report = import_archive(macro_catalog, request.files['file'].stream)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    imported = sum(1 for item in report if item["status"] == "imported")
+    if imported:
+        # One push for the whole batch
+        notify_macros_changed(MODIFIED, None)
+    return jsonify({"imported": imported, "failed": len(report) - imported, "files": report})
 
 # --- Automation Control (Stub) ---
+def _on_session_status(session, status):
+    if session is rp_session:
+        connected_device["status"] = status
+
+def is_connected():
+    return rp_session is not None and connected_device["status"] == "connected"
+
 @app.route("/api/connect", methods=["POST"])
 def connect_device():
-    global rp_device, rp_command_queue, rp_session_thread
+    global rp_session, rp_command_queue, rp_session_thread
     data = request.json
     ip = data.get("ip")
     if not ip:
         return jsonify({"error": "Device IP required"}), 400
-    try:
-        rp_device = RPDevice(ip)
-        users = rp_device.get_users()
-        if not users:
-            return jsonify({"error": "No users found on device"}), 400
-        user = users[0]
-        rp_device.get_status()
-        rp_device.create_session(user)
+    if rp_session and not warm_pool.is_pooled(rp_session):
+        # Replaced below, also when reconnecting to the same host: a session left open keeps its
+        # reconnect thread and its connection to the console
+        rp_session.close()
+        rp_session = None
+    started = time.perf_counter()
+    warm = warm_pool.get(ip)
+    if warm:
+        rp_session = warm
         connected_device["ip"] = ip
-        connected_device["status"] = "connected"
-        return jsonify({"status": "connected", "ip": ip})
+        connected_device["status"] = warm.status
+        return jsonify({"status": "connected", "ip": ip, "warm": True,
+                        "time_to_ready_ms": round((time.perf_counter() - started) * 1000, 3)})
+    session = SupervisedSession(ip, on_status=_on_session_status)
+    rp_session = session
+    connected_device["ip"] = ip
+    try:
+        session.connect()
+        return jsonify({"status": "connected", "ip": ip, "warm": False,
+                        "time_to_ready_ms": round((time.perf_counter() - started) * 1000, 3)})
     except Exception as e:
+        rp_session = None
         connected_device["ip"] = None
         connected_device["status"] = "disconnected"
         return jsonify({"error": str(e)}), 500
 
 @app.route("/api/disconnect", methods=["POST"])
 def disconnect_device():
-    global rp_device
-    if rp_device:
-        try:
-            rp_device.disconnect()
-        except Exception:
-            pass
-    rp_device = None
+    global rp_session
+    # Warm sessions stay open in the pool; only detach them from the UI
+    if rp_session and not warm_pool.is_pooled(rp_session):
+        rp_session.close()
+    rp_session = None
     connected_device["ip"] = None
     connected_device["status"] = "disconnected"
     return jsonify({"status": "disconnected"})
@@ -226,75 +379,94 @@ def connection_status():
 
 @app.route("/api/run_macro", methods=["POST"])
 def run_macro():
-    global rp_device, rp_command_queue
+    global rp_session, rp_command_queue
+    requested_at = time.perf_counter()
     data = request.json
     macro_name = data.get("name")
     loop_count = data.get("loop_count", 1)
+    host = data.get("host")
     if not macro_name:
         return jsonify({"error": "Macro name required"}), 400
-    if not rp_device or connected_device["status"] != "connected":
+    session = None
+    if host and not (rp_session and rp_session.host == host):
+        session = warm_pool.get(host)
+        if not session:
+            return jsonify({"error": f"No warm session for {host}"}), 400
+    elif not is_connected():
         return jsonify({"error": "Not connected to any device"}), 400
-    macro_path = os.path.join(MACROS_DIR, f"{macro_name}.json")
-    if not os.path.exists(macro_path):
+    else:
+        session = rp_session
+    try:
+        macro, end_steps = macro_catalog.load(macro_name)
+    except FileNotFoundError:
         return jsonify({"error": "Macro not found"}), 404
-    with open(macro_path, "r") as f:
-        macro = json.load(f)
-    end_steps = []
-    if macro.get("end_of_loop_macro_name"):
-        end_macro_path = os.path.join(MACROS_DIR, f"{macro['end_of_loop_macro_name']}.json")
-        if os.path.exists(end_macro_path):
-            with open(end_macro_path, "r") as ef:
-                end_macro = json.load(ef)
-                end_steps = end_macro.get("steps", [])
-    elif macro.get("end_of_loop_macro"):
-        end_steps = macro["end_of_loop_macro"]
-    job_id = str(uuid.uuid4())
-    macro_jobs[job_id] = {"status": "running", "log": []}
-    macro_stop_events[job_id] = threading.Event()
-    def log_callback(msg):
-        macro_jobs[job_id]["log"].append(msg)
-        socketio.emit("macro_log", {"job_id": job_id, "log": macro_jobs[job_id]["log"], "status": macro_jobs[job_id]["status"]}, room=job_id)
-    def macro_thread():
-        try:
-            log_callback(f"Starting macro: {macro_name}")
-            loop_num = 0
-            while (loop_count == -1 or loop_num < loop_count) and not macro_stop_events[job_id].is_set():
-                log_callback(f"Macro loop {loop_num+1}")
-                try:
-                    execute_macro_steps(macro.get("steps", []), log_callback, stop_event=macro_stop_events[job_id])
-                except RuntimeError:
-                    macro_jobs[job_id]["status"] = "error"
-                    return
-                if end_steps and not macro_stop_events[job_id].is_set():
-                    log_callback("Running end-of-loop macro")
-                    try:
-                        execute_macro_steps(end_steps, log_callback, stop_event=macro_stop_events[job_id])
-                    except RuntimeError:
-                        macro_jobs[job_id]["status"] = "error"
-                        return
-                loop_num += 1
-            if macro_stop_events[job_id].is_set():
-                macro_jobs[job_id]["status"] = "stopped"
-                log_callback("Macro stopped by user.")
-            else:
-                macro_jobs[job_id]["status"] = "finished"
-                log_callback("Macro finished.")
-        except Exception as e:
-            macro_jobs[job_id]["status"] = "error"
-            log_callback(f"Macro error: {e}")
-        finally:
-            macro_stop_events.pop(job_id, None)
-    t = threading.Thread(target=macro_thread, daemon=True)
-    t.start()
-    return jsonify({"job_id": job_id, "status": "started"})
+    except MacroValidationError as e:
+        return jsonify({"error": "Invalid macro", "details": e.errors}), 400
+    job = start_macro_job(session, macro_name, macro, end_steps, loop_count, requested_at)
+    return jsonify({"job_id": job.job_id, "status": "started"})
+
+def start_macro_job(session, macro_name, macro, end_steps, loop_count, requested_at):
+    leased = warm_pool.is_pooled(session) and warm_pool.acquire(session.host) is session
+    def on_log(job, msg):
+        # Only new lines go out; clients track seq and ask join_job for anything they missed
+        record = job.record
+        log_batcher.add(job.job_id, record["log_seq"], msg, status=record["status"])
+        stream = record["stream"]
+        stream["bytes_sent"] += len(msg)
+        stream["full_resend_bytes"] += stream["bytes_sent"]
+    def on_finish(job):
+        log_batcher.flush(job.job_id)
+        macro_stop_events.pop(job.job_id, None)
+        macro_jobs.finish(job.job_id)
+        if leased:
+            warm_pool.release(session.host)
+    job = MacroJob(macro_name, macro, end_steps, session, loop_count=loop_count,
+                   on_log=on_log, on_finish=on_finish, requested_at=requested_at,
+                   log_max_lines=macro_jobs.log_max_lines)
+    job.run_log = run_logs.open(job.job_id)
+    job.record["warm"] = leased
+    # Log payload bytes actually streamed vs. what resending the whole log on every line would cost
+    job.record["stream"] = {"bytes_sent": 0, "full_resend_bytes": 0, "messages": 0}
+    macro_jobs.add(job.job_id, job.record)
+    macro_stop_events[job.job_id] = job.stop_event
+    return job.start()
 
 @app.route("/api/macro_status/<job_id>", methods=["GET"])
 def macro_status(job_id):
-    job = macro_jobs.get(job_id)
+    # since: delta poll, only log lines after the given sequence number
+    job = macro_jobs.snapshot(job_id, since=request.args.get("since", 0, type=int))
     if not job:
+        if macro_jobs.is_archived(job_id):
+            return jsonify({"status": "evicted", "archived_log": f"/api/jobs/{job_id}/archive"})
         return jsonify({"error": "Job not found"}), 404
     return jsonify(job)
 
+@app.route("/api/jobs/<job_id>/archive", methods=["GET"])
+def job_archive(job_id):
+    if not macro_jobs.is_archived(job_id):
+        return jsonify({"error": "No archived log for that job"}), 404
+    return send_file(macro_jobs.archive_path(job_id), mimetype="application/gzip", as_attachment=True)
+
+@app.route("/api/jobs/<job_id>/logs", methods=["GET"])
+def job_logs(job_id):
+    # Served from RunLogs/<job_id>.jsonl via its per-loop offset index, so old loops of long runs stay cheap
+    if not os.path.exists(run_logs.index_path_for(job_id)):
+        return jsonify({"error": "No run log for that job"}), 404
+    result = run_logs.query(
+        job_id,
+        since=request.args.get("since", type=int),
+        until=request.args.get("until", type=int),
+        loop=request.args.get("loop", type=int),
+        text=request.args.get("q"),
+        limit=min(request.args.get("limit", 500, type=int), 5000),
+    )
+    result["job_id"] = job_id
+    return jsonify(result)
+
+@app.route("/api/jobs/memory", methods=["GET"])
+def jobs_memory():
+    return jsonify(macro_jobs.memory_report())
+
 @app.route("/api/stop_macro", methods=["POST"])
 def stop_macro():
     data = request.json
@@ -306,139 +478,263 @@ def stop_macro():
 
 @app.route("/api/button", methods=["POST"])
 def send_button():
-    global rp_device
+    global rp_session
     data = request.json
     button = data.get("button")
     if not button:
         return jsonify({"error": "Button required"}), 400
-    if not rp_device or connected_device["status"] != "connected":
+    if not is_connected():
         return jsonify({"error": "Not connected to any device"}), 400
     try:
-        rp_device.controller.button(button)
+        rp_session.controller.button(button)
         return jsonify({"status": "ok", "button": button})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route("/api/stick", methods=["POST"])
 def send_stick():
-    global rp_device
+    global rp_session
     data = request.json
     stick = data.get("stick")
     direction = data.get("direction")
     magnitude = data.get("magnitude", 1.0)
     if not stick or not direction:
         return jsonify({"error": "Stick and direction required"}), 400
-    if not rp_device or connected_device["status"] != "connected":
+    if not is_connected():
         return jsonify({"error": "Not connected to any device"}), 400
     try:
         # pyremoteplay expects: stick_name ('left' or 'right'), point (x, y)
         stick_name = stick.replace("_STICK", "").lower()
-        if direction == "UP":
-            point = (0.0, -magnitude)
-        elif direction == "DOWN":
-            point = (0.0, magnitude)
-        elif direction == "LEFT":
-            point = (-magnitude, 0.0)
-        elif direction == "RIGHT":
-            point = (magnitude, 0.0)
-        elif direction == "NEUTRAL":
-            point = (0.0, 0.0)
-        else:
+        try:
+            point = stick_point(direction, magnitude)
+        except ValueError:
             return jsonify({"error": "Unknown direction"}), 400
-        rp_device.controller.stick(stick_name, point=point)
-        rp_device.controller.update_sticks()
+        rp_session.controller.stick(stick_name, point=point)
+        rp_session.controller.update_sticks()
         return jsonify({"status": "ok", "stick": stick, "direction": direction, "magnitude": magnitude})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# --- Device Groups ---
+@app.route("/api/groups", methods=["GET"])
+def list_groups():
+    return jsonify(read_groups(DEVICE_GROUPS_PATH))
+
+@app.route("/api/groups", methods=["POST"])
+def save_group():
+    data = request.json or {}
+    name = data.get("name")
+    hosts = data.get("hosts")
+    if not name or not isinstance(hosts, list):
+        return jsonify({"error": "Group name and list of hosts required"}), 400
+    groups = read_groups(DEVICE_GROUPS_PATH)
+    groups[name] = list(dict.fromkeys(hosts))
+    write_groups(DEVICE_GROUPS_PATH, groups)
+    return jsonify({"status": "ok"})
+
+@app.route("/api/groups/<name>", methods=["DELETE"])
+def delete_group(name):
+    groups = read_groups(DEVICE_GROUPS_PATH)
+    if name not in groups:
+        return jsonify({"error": "Group not found"}), 404
+    del groups[name]
+    write_groups(DEVICE_GROUPS_PATH, groups)
+    return jsonify({"status": "ok"})
+
+@app.route("/api/groups/<name>/<action>", methods=["POST"])
+def group_action(name, action):
+    hosts = read_groups(DEVICE_GROUPS_PATH).get(name)
+    if hosts is None:
+        return jsonify({"error": "Group not found"}), 404
+    data = request.json or {}
+    try:
+        max_parallel = max(1, int(data.get("max_parallel", GROUP_MAX_PARALLEL)))
+    except (TypeError, ValueError):
+        return jsonify({"error": "max_parallel must be a number"}), 400
+    if action == "connect":
+        def operation(host):
+            session = warm_pool.connect(host)
+            return {"status": session.status, "time_to_ready_ms": warm_pool.snapshot().get(host, {}).get("time_to_ready_ms")}
+    elif action == "disconnect":
+        def operation(host):
+            warm_pool.cool(host)
+            return {"status": "disconnected"}
+    elif action == "wake":
+        def operation(host):
+            (warm_pool.get(host) or warm_pool.session_factory(host)).wake()
+            return {"status": "wakeup sent"}
+    elif action == "run_macro":
+        requested_at = time.perf_counter()
+        macro_name = data.get("name")
+        if not macro_name:
+            return jsonify({"error": "Macro name required"}), 400
+        try:
+            macro, end_steps = macro_catalog.load(macro_name)
+        except FileNotFoundError:
+            return jsonify({"error": "Macro not found"}), 404
+        except MacroValidationError as e:
+            return jsonify({"error": "Invalid macro", "details": e.errors}), 400
+        loop_count = data.get("loop_count", 1)
+        def operation(host):
+            session = warm_pool.get(host)
+            if not session:
+                raise RuntimeError("Not connected (connect the group first)")
+            job = start_macro_job(session, macro_name, macro, end_steps, loop_count, requested_at)
+            return {"job_id": job.job_id}
+    elif action == "stop":
+        def operation(host):
+            stopped = []
+            for job_id, stop_event in list(macro_stop_events.items()):
+                job = macro_jobs.get(job_id)
+                if job and job.get("host") == host:
+                    stop_event.set()
+                    stopped.append(job_id)
+            return {"stopped": stopped}
+    else:
+        return jsonify({"error": f"Unknown group action: {action}"}), 400
+    return jsonify(fan_out(hosts, operation, max_parallel=max_parallel))
+
+# --- Fake devices (PSAUTO_DEVICE=fake or "fake:" hosts) ---
+@app.route("/api/fake_devices", methods=["GET"])
+def list_fake_devices():
+    return jsonify([d.summary() for d in FAKE_DEVICES.values()])
+
+@app.route("/api/fake_devices/<path:host>/inputs", methods=["GET"])
+def fake_device_inputs(host):
+    device = FAKE_DEVICES.get(host)
+    if not device:
+        return jsonify({"error": "Fake device not found"}), 404
+    since = int(request.args.get("since", 0))
+    return jsonify({"host": host, "total": len(device.inputs), "inputs": [
+        {"t": t, "kind": kind, "value": value} for t, kind, value in device.inputs[since:]
+    ]})
+
+@app.route("/api/fake_devices/<path:host>/disconnect", methods=["POST"])
+def fake_device_disconnect(host):
+    device = FAKE_DEVICES.get(host)
+    if not device:
+        return jsonify({"error": "Fake device not found"}), 404
+    device.inject_disconnect()
+    return jsonify({"status": "ok"})
+
 # --- Root: Serve a minimal HTML dashboard ---
 @app.route("/")
 def dashboard():
     return send_from_directory(os.path.join(os.path.dirname(__file__), "static"), "index.html")
 
+# Request tracing: enabled with main.py --trace-requests (or the gui.webserver.requests logger at INFO)
 @app.before_request
-def log_request_info():
-    print(f"[DEBUG] {request.method} {request.path}")
+def start_request_timer():
+    if request_logger.isEnabledFor(logging.INFO):
+        g.request_started = time.perf_counter()
+
+@app.after_request
+def log_request_timing(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        request_logger.info("%s %s %s %.2f ms", request.method, request.full_path.rstrip("?"),
+                            response.status_code, (time.perf_counter() - started) * 1000)
+    return response
 
 @app.route("/static/<path:filename>")
 def static_files(filename):
     static_dir = os.path.join(os.path.dirname(__file__), "static")
     file_path = os.path.join(static_dir, filename)
-    print(f"[DEBUG] Serving static file: {file_path}")
     if not os.path.exists(file_path):
-        print(f"[ERROR] Static file not found: {file_path}")
+        logger.error("Static file not found: %s", file_path)
     return send_from_directory(static_dir, filename)
 
 @app.route('/favicon.ico')
 def favicon():
     return send_from_directory(PROJECT_ROOT, 'app_icon.ico', mimetype='image/vnd.microsoft.icon')
 
-def background_maintenance():
-    while True:
-        # Ensure saved_ips.json exists and is a dict
-        try:
-            if not os.path.exists(SAVED_IPS_PATH):
-                with open(SAVED_IPS_PATH, "w") as f:
-                    json.dump({}, f)
-            else:
-                # Self-heal: if file is not a dict, reset to {}
-                try:
-                    with open(SAVED_IPS_PATH, 'r') as f:
-                        data = json.load(f)
-                    if not isinstance(data, dict):
-                        with open(SAVED_IPS_PATH, 'w') as f:
-                            json.dump({}, f)
-                except Exception as e:
-                    with open(SAVED_IPS_PATH, 'w') as f:
-                        json.dump({}, f)
-        except Exception as e:
-            print(f"[Self-Heal] Error ensuring saved_ips.json: {e}")
-        # Ensure Macros directory exists
-        try:
-            if not os.path.exists(MACROS_DIR):
-                os.makedirs(MACROS_DIR)
-        except Exception as e:
-            print(f"[Self-Heal] Error ensuring Macros dir: {e}")
-        # Self-heal: Rename .json files in Macros dir that are not .macro.json
-        try:
-            for fname in os.listdir(MACROS_DIR):
-                if fname.endswith(".json") and not fname.endswith(".macro.json"):
-                    old_path = os.path.join(MACROS_DIR, fname)
-                    base = fname[:-5]  # remove .json
-                    new_path = os.path.join(MACROS_DIR, f"{base}.macro.json")
-                    # Avoid overwriting existing .macro.json
-                    if not os.path.exists(new_path):
-                        try:
-                            os.rename(old_path, new_path)
-                            print(f"[Self-Heal] Renamed {fname} -> {base}.macro.json")
-                        except Exception as e:
-                            print(f"[Self-Heal] Error renaming {fname}: {e}")
-        except Exception as e:
-            print(f"[Self-Heal] Error scanning Macros dir: {e}")
-        time.sleep(10)
-
-# Start background maintenance thread
-threading.Thread(target=background_maintenance, daemon=True).start()
+def heal_macro_filename(path):
+    # Self-heal: rename a .json file in the Macros dir that is not .macro.json (never overwriting one)
+    fname = os.path.basename(path)
+    if not fname.endswith(".json") or fname.endswith(".macro.json"):
+        return False
+    base = fname[:-5]  # remove .json
+    new_path = os.path.join(MACROS_DIR, f"{base}.macro.json")
+    if os.path.exists(new_path) or not os.path.exists(path):
+        return False
+    try:
+        os.rename(path, new_path)
+        logger.info("Self-heal: renamed %s -> %s.macro.json", fname, base)
+        return True
+    except Exception as e:
+        logger.warning("Self-heal: error renaming %s: %s", fname, e)
+        return False
+
+def self_heal():
+    try:
+        os.makedirs(MACROS_DIR, exist_ok=True)
+        for fname in os.listdir(MACROS_DIR):
+            heal_macro_filename(os.path.join(MACROS_DIR, fname))
+    except Exception as e:
+        logger.warning("Self-heal: error scanning Macros dir: %s", e)
+
+def on_file_event(kind, path):
+    # Runs on the watcher thread for every completed write, rename or delete of a watched file
+    directory, fname = os.path.split(path)
+    if directory == MACROS_DIR:
+        if kind != DELETED and heal_macro_filename(path):
+            return  # the rename arrives as its own events
+        name = macro_catalog.apply_event(kind, path)
+        if name:
+            logger.debug("Macro %s %s", name, kind)
+            socketio.emit("macros_changed", {"event": kind, "name": name})
+    elif path == SAVED_IPS_PATH:
+        # Edited outside the app (our own writes are ignored); a deleted file is written again
+        if device_registry.reload():
+            logger.debug("saved_ips.json %s", kind)
+            devices_changed()
+    elif path == DEVICE_GROUPS_PATH:
+        socketio.emit("groups_changed", {"event": kind})
+
+# Heal once at startup; afterwards the watcher reports each change as it happens instead of a periodic rescan
+self_heal()
+watched_dirs = [PROJECT_ROOT]
+if isinstance(macro_catalog, MacroCatalog):
+    macro_catalog.refresh()
+    watched_dirs.append(MACROS_DIR)
+file_watcher = DirectoryWatcher(
+    watched_dirs, on_file_event,
+    file_filter=is_macro_file,
+    log_callback=logger.warning,
+).start()
+macro_catalog.watching = MACROS_DIR in watched_dirs
+
+# Bring up warm standby sessions for flagged devices
+sync_warm_sessions(read_devices())
 
 @socketio.on('join_job')
 def on_join_job(data):
+    if not isinstance(data, dict):
+        return
     job_id = data.get('job_id')
+    since = data.get('since', 0)
+    if not isinstance(since, int) or isinstance(since, bool) or since < 0:
+        # Anything unusable means "everything", as for a fresh join
+        since = 0
     join_room(job_id)
-    # Send current log
-    if job_id in macro_jobs:
-        emit("macro_log", {"job_id": job_id, "log": macro_jobs[job_id]["log"], "status": macro_jobs[job_id]["status"]})
+    # Send the lines the client has not seen yet (all of them for a fresh join); seq is the first line's number
+    job = macro_jobs.get(job_id)
+    if job:
+        seq, lines = log_since(job, since)
+        emit("macro_log", {"job_id": job_id, "seq": seq, "lines": lines, "status": job["status"]})
 
 @app.route("/api/manual_autoclicker/start", methods=["POST"])
 def start_manual_autoclicker():
-    global manual_autoclicker_thread, manual_autoclicker_stop, rp_device
+    global manual_autoclicker_thread, manual_autoclicker_stop, rp_session
     data = request.json
     button = data.get("button")
     interval = int(data.get("interval", 100))
     duration = int(data.get("duration", 0))  # ms, 0 = infinite
     if not button:
         return jsonify({"error": "Button required"}), 400
-    if not rp_device or connected_device["status"] != "connected":
+    if not is_connected():
         return jsonify({"error": "Not connected to any device"}), 400
+    session = rp_session
     if manual_autoclicker_thread and manual_autoclicker_thread.is_alive():
         manual_autoclicker_stop.set()
         manual_autoclicker_thread.join(timeout=1)
@@ -447,8 +743,9 @@ def start_manual_autoclicker():
         start_time = time.time()
         while not manual_autoclicker_stop.is_set():
             try:
-                rp_device.controller.button(button)
-            except Exception:
+                session.controller.button(button)
+            except Exception as e:
+                session.mark_lost(e)
                 break
             time.sleep(interval / 1000.0)
             if duration > 0 and (time.time() - start_time) * 1000 >= duration:
@@ -465,82 +762,3 @@ def stop_manual_autoclicker():
     if manual_autoclicker_thread:
         manual_autoclicker_thread.join(timeout=1)
     return jsonify({"status": "stopped"})
-
-# --- Macro Step Execution Helper ---
-def execute_macro_steps(steps, log_callback, stop_event=None):
-    global rp_device, connected_device
-    for step_tuple in steps:
-        if stop_event and stop_event.is_set():
-            log_callback("Macro stopped by user.")
-            raise RuntimeError("Macro stopped by user")
-        if len(step_tuple) == 3:
-            step, delay_ms, comment = step_tuple
-        else:
-            step, delay_ms = step_tuple
-            comment = None
-        if not rp_device or connected_device["status"] != "connected":
-            log_callback("Device disconnected. Stopping macro.")
-            raise RuntimeError("Device disconnected")
-        if isinstance(step, list) and len(step) >= 3 and step[0] == "REPEAT":
-            repeat_count = step[1]
-            nested_steps = step[2]
-            log_callback(f"Repeat block: {repeat_count} times")
-            for i in range(repeat_count):
-                if stop_event and stop_event.is_set():
-                    log_callback("Macro stopped by user.")
-                    raise RuntimeError("Macro stopped by user")
-                log_callback(f"Repeat iteration {i+1} of {repeat_count}")
-                execute_macro_steps(nested_steps, log_callback, stop_event=stop_event)
-            if comment:
-                log_callback(f"Repeat comment: {comment}")
-            time.sleep(delay_ms / 1000.0)
-            continue
-        actions = step if isinstance(step, list) else [step]
-        autoclickers_started = []
-        for action in actions:
-            if isinstance(action, dict) and action.get('type') == 'autoclicker':
-                def ac_thread(button, interval, duration, stop_event):
-                    start_time = time.time()
-                    while (duration is None or (time.time() - start_time) < duration) and rp_device and connected_device["status"] == "connected" and (not stop_event or not stop_event.is_set()):
-                        try:
-                            rp_device.controller.button(button)
-                        except Exception as e:
-                            log_callback(f"Autoclicker error: {e}")
-                            break
-                        time.sleep(interval / 1000.0)
-                t = threading.Thread(target=ac_thread, args=(action['button'], action['interval'], action.get('duration', None), stop_event), daemon=True)
-                t.start()
-                autoclickers_started.append(action['button'])
-            elif isinstance(action, (list, tuple)) and len(action) == 3:
-                stick, direction, magnitude = action
-                try:
-                    stick_name = stick.replace("_STICK", "").lower()
-                    if direction == "UP":
-                        point = (0.0, -magnitude)
-                    elif direction == "DOWN":
-                        point = (0.0, magnitude)
-                    elif direction == "LEFT":
-                        point = (-magnitude, 0.0)
-                    elif direction == "RIGHT":
-                        point = (magnitude, 0.0)
-                    elif direction == "NEUTRAL":
-                        point = (0.0, 0.0)
-                    else:
-                        log_callback(f"Unknown stick direction: {direction}")
-                        continue
-                    rp_device.controller.stick(stick_name, point=point)
-                    rp_device.controller.update_sticks()
-                    log_callback(f"Macro step: Stick {action}")
-                except Exception as e:
-                    log_callback(f"Error sending stick: {e}")
-            else:
-                try:
-                    rp_device.controller.button(action)
-                    log_callback(f"Macro step: Button {action}")
-                except Exception as e:
-                    log_callback(f"Error sending button: {e}")
-        if autoclickers_started:
-            log_callback(f"Started autoclicker(s) in macro: {', '.join(map(str, autoclickers_started))}")
-        if comment:
-            log_callback(f"Step comment: {comment}")
-        time.sleep(delay_ms / 1000.0) 
\ No newline at end of file
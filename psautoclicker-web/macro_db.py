@@ -0,0 +1,37 @@
+import argparse
+import json
+import os
+import sys
+from gui.macrodb import MACRO_DB_ENV, MacroDB
+
+MACROS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Macros")
+
+def main():
+    parser = argparse.ArgumentParser(description="Import, export and search a SQLite macro store.")
+    parser.add_argument("--db", default=os.environ.get(MACRO_DB_ENV), help=f"SQLite file (default: ${MACRO_DB_ENV})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, verb in (("import", "Read"), ("export", "Write")):
+        cmd = sub.add_parser(name, help=f"{verb} *.macro.json files")
+        cmd.add_argument("directory", nargs="?", default=MACROS_DIR)
+    search = sub.add_parser("search", help="Search names, descriptions and step comments")
+    search.add_argument("text", nargs="?")
+    search.add_argument("--tag")
+    sub.add_parser("tags", help="List tags with their macro counts")
+    args = parser.parse_args()
+    if not args.db:
+        parser.error(f"--db or ${MACRO_DB_ENV} is required")
+    store = MacroDB(args.db)
+    if args.command == "import":
+        print(f"Imported {store.import_dir(args.directory)} macros into {args.db}")
+    elif args.command == "export":
+        print(f"Exported {store.export_dir(args.directory)} macros to {args.directory}")
+    elif args.command == "search":
+        for summary in store.search(args.text, args.tag):
+            print(json.dumps(summary))
+    elif args.command == "tags":
+        for tag, count in store.tags().items():
+            print(f"{tag}\t{count}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
 import sys
+import argparse
 import subprocess
 import pkg_resources
 import os
@@ -48,7 +49,15 @@ def install_requirements():
             print("Please restart the application manually.")
             sys.exit(0)
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="PSAutoClicker web server")
+    parser.add_argument("--log-level", help="Default log level (DEBUG, INFO, WARNING, ...); env PSAUTO_LOG_LEVEL")
+    parser.add_argument("--trace-requests", action="store_true", help="Log every HTTP request with its handling time")
+    parser.add_argument("--macro-db", metavar="PATH", help="Keep macros in this SQLite file instead of Macros/; env PSAUTO_MACRO_DB")
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
     try:
         # Only check requirements if not running as a PyInstaller bundle
         if not getattr(sys, 'frozen', False):
@@ -57,6 +66,10 @@ if __name__ == "__main__":
         print(f"Error checking/installing requirements: {e}")
         input("Press Enter to exit...")
         sys.exit(1)
+    from gui.logconfig import configure_logging
+    configure_logging(level=args.log_level, trace_requests=args.trace_requests)
+    if args.macro_db:
+        os.environ["PSAUTO_MACRO_DB"] = os.path.abspath(args.macro_db)
     from gui.webserver import app, socketio
     def run_server():
         socketio.run(app, host="0.0.0.0", port=8000, debug=False, use_reloader=False)
@@ -0,0 +1,73 @@
+from gui.engine import MacroJob
+
+class DroppingController:
+    """Records button presses; the press numbered drop_at fails once, like a dropped session."""
+    def __init__(self, drop_at):
+        self.drop_at = drop_at
+        self.presses = []
+        self.attempts = 0
+
+    def button(self, name):
+        self.attempts += 1
+        if self.attempts == self.drop_at:
+            raise ConnectionError("session dropped")
+        self.presses.append(name)
+
+class ReconnectingSession:
+    """Stands in for SupervisedSession: a drop is followed by an immediate reconnect."""
+    def __init__(self, drop_at):
+        self.host = "10.0.0.5"
+        self.controller = DroppingController(drop_at)
+        self.connected = True
+        self.drops = 0
+
+    def is_connected(self):
+        return self.connected
+
+    def mark_lost(self, reason=None):
+        self.connected = False
+        self.drops += 1
+
+    def wait_until_ready(self, stop_event=None, timeout=None):
+        self.connected = True
+        return True
+
+def run(steps, drop_at):
+    session = ReconnectingSession(drop_at)
+    job = MacroJob("test", {"steps": steps}, None, session, loop_count=1)
+    job.start()._thread.join(5)
+    return job, session
+
+REPEAT_MACRO = [
+    ["A", 0],
+    [["REPEAT", 3, [["B", 0], ["C", 0]]], 0],
+    ["D", 0],
+]
+
+def test_session_dropped_inside_repeat_resumes_in_place():
+    # Presses: A, B, C, B, <C dropped>, C, B, C, D
+    job, session = run(REPEAT_MACRO, drop_at=5)
+    assert job.record["status"] == "finished"
+    assert session.drops == 1
+    assert job.record["resumes"] == 1
+    assert session.controller.presses == ["A", "B", "C", "B", "C", "B", "C", "D"]
+    assert job.record["progress"]["path"] == [2]
+    assert any("repeat iteration 2 after nested step 1" in line for line in job.record["log"])
+
+def test_session_dropped_inside_nested_repeat_resumes_in_place():
+    steps = [
+        [["REPEAT", 2, [
+            ["X", 0],
+            [["REPEAT", 2, [["Y", 0], ["Z", 0]]], 0],
+        ]], 0],
+    ]
+    # Presses: X, Y, Z, Y, Z, X, Y, <Z dropped>, Z, Y, Z
+    job, session = run(steps, drop_at=8)
+    assert job.record["status"] == "finished"
+    assert job.record["resumes"] == 1
+    assert session.controller.presses == ["X", "Y", "Z", "Y", "Z", "X", "Y", "Z", "Y", "Z"]
+
+def test_session_dropped_at_top_level_resumes_after_last_step():
+    job, session = run(REPEAT_MACRO, drop_at=8)
+    assert job.record["status"] == "finished"
+    assert session.controller.presses == ["A", "B", "C", "B", "C", "B", "C", "D"]
@@ -0,0 +1,82 @@
+import threading
+import time
+from gui.session import SessionPool
+
+class FlakySession:
+    """Stands in for SupervisedSession; connect() fails the first failures times."""
+    def __init__(self, host, failures):
+        self.host = host
+        self.failures = failures
+        self.status = "disconnected"
+        self.reconnects = 0
+        self._connected = threading.Event()
+
+    def connect(self):
+        if self.failures[0] > 0:
+            self.failures[0] -= 1
+            raise RuntimeError("console unreachable")
+        self.status = "connected"
+        self._connected.set()
+
+    def is_connected(self):
+        return self._connected.is_set()
+
+    def keepalive(self):
+        return self.is_connected()
+
+    def close(self):
+        self._connected.clear()
+        self.status = "disconnected"
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+def test_failed_standby_is_retried_until_ready():
+    failures = [1]
+    created = []
+    def factory(host):
+        created.append(FlakySession(host, failures))
+        return created[-1]
+    pool = SessionPool(factory, keepalive_interval=0.02, log_callback=lambda message: None)
+    try:
+        pool.warm("10.0.0.5")
+        assert wait_for(lambda: pool.snapshot()["10.0.0.5"]["state"] in ("retrying", "connected"))
+        assert wait_for(lambda: pool.get("10.0.0.5") is not None)
+        snapshot = pool.snapshot()["10.0.0.5"]
+        assert snapshot["state"] == "connected"
+        assert snapshot["retries"] == 0
+        assert snapshot["standby"]
+        assert len(created) == 2
+    finally:
+        pool.close_all()
+
+def test_failed_standby_backs_off_and_reports_retrying():
+    failures = [10 ** 6]
+    pool = SessionPool(lambda host: FlakySession(host, failures), keepalive_interval=0.01,
+                       max_retry_backoff=0.04, log_callback=lambda message: None)
+    try:
+        pool.warm("10.0.0.6")
+        assert wait_for(lambda: pool.snapshot()["10.0.0.6"]["retries"] >= 4)
+        snapshot = pool.snapshot()["10.0.0.6"]
+        assert snapshot["state"] == "retrying"
+        assert pool.get("10.0.0.6") is None
+    finally:
+        pool.close_all()
+
+def test_cooled_standby_is_not_retried():
+    failures = [10 ** 6]
+    pool = SessionPool(lambda host: FlakySession(host, failures), keepalive_interval=0.01,
+                       log_callback=lambda message: None)
+    try:
+        pool.warm("10.0.0.7")
+        assert wait_for(lambda: pool.snapshot().get("10.0.0.7", {}).get("state") == "retrying")
+        pool.cool("10.0.0.7")
+        time.sleep(0.1)
+        assert "10.0.0.7" not in pool.snapshot()
+    finally:
+        pool.close_all()
@@ -1,16 +1,23 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext, filedialog
 import json
+import logging
 import os
 import threading
+import time
 import queue
 from .remote import SessionWorker
 from .controller import BUTTON_MAP
 from .controls import MANUAL_CONTROLS
 from .autoclicker import Autoclicker
 from .macro import Macro, MacroRunner
+from .logsink import TextLogSink, TerminalLogSink
+from .runlog import RunLogWriter
+from .watcher import DirectoryWatcher
+from .schema import validate_macro
+from .depgraph import DependencyGraph
 import glob
-from colorama import init as colorama_init, Fore, Style
+from colorama import init as colorama_init
 import sys
 import requests
 import shutil
@@ -24,10 +31,17 @@ def resource_path(filename):
     return os.path.join(base_path, filename)
 
 SAVED_IPS_PATH = resource_path('saved_ips.json')
+RUN_LOGS_DIR = resource_path('RunLogs')
+# How often the Tk loop applies macro file changes reported by the watcher
+MACRO_WATCH_APPLY_MS = 250
+# Set PSAUTO_TERMINAL_LOG=0 to stop mirroring the log to the terminal
+MIRROR_LOG_TO_TERMINAL = os.environ.get("PSAUTO_TERMINAL_LOG", "1").lower() not in ("0", "false", "no", "off")
 
 # Initialize colorama for colored terminal output
 colorama_init(autoreset=True)
 
+logger = logging.getLogger(__name__)
+
 # Tooltip helper
 class ToolTip:
     def __init__(self, widget, text):
@@ -107,10 +121,18 @@ class PSRemotePlayGUI(tk.Tk):
         self.geometry("900x600")
         self.minsize(700, 400)
         self.command_queue = queue.Queue()
+        self.terminal_sink = TerminalLogSink(enabled=MIRROR_LOG_TO_TERMINAL)
+        # Structured JSONL event log per macro run, written off the macro thread
+        self.run_logs = RunLogWriter(RUN_LOGS_DIR, log_callback=self.log)
         self.worker = None
         self.autoclicker = None
         self.current_macro_runner = None
         self.macros = {}
+        # Macros dir cache: path -> ((mtime_ns, size), Macro)
+        self._macro_files = {}
+        self._macro_files_changed = threading.Event()
+        # end_of_loop_macro_name references between the loaded macros
+        self.macro_graph = DependencyGraph()
         self.running_macros = {}
         self.current_macro_name = None
         self.current_macro_steps = []
@@ -124,6 +146,11 @@ class PSRemotePlayGUI(tk.Tk):
         self.connected = False
         self.protocol("WM_DELETE_WINDOW", self.on_close)
         self.refresh_macro_list()
+        # Pick up macros added, edited or removed outside the app without rescanning on a timer
+        self.macro_watcher = DirectoryWatcher([resource_path('Macros')], self._on_macro_file_event,
+                                              file_filter=lambda name: name.endswith('.json'),
+                                              log_callback=self.log).start()
+        self.after(MACRO_WATCH_APPLY_MS, self._apply_macro_file_changes)
 
     def _build_widgets(self):
         self.grid_rowconfigure(0, weight=1)
@@ -235,6 +262,7 @@ class PSRemotePlayGUI(tk.Tk):
         # Log area (now in Controls tab)
         self.log_area = scrolledtext.ScrolledText(frm, height=8, state=tk.DISABLED)
         self.log_area.pack(fill="both", expand=True, padx=5, pady=10)
+        self.log_sink = TextLogSink(self.log_area)
         ToolTip(self.log_area, "Shows messages, errors, and what the app is doing.")
 
         # --- Macro Manager Tab ---
@@ -392,14 +420,25 @@ class PSRemotePlayGUI(tk.Tk):
         macro_log_label.grid(row=7, column=0, sticky="w", pady=(0, 2))
         self.macro_log_area = scrolledtext.ScrolledText(macro_right_frm, height=8, state=tk.DISABLED, wrap=tk.WORD)
         self.macro_log_area.grid(row=8, column=0, columnspan=3, sticky="nsew")
+        self.macro_log_sink = TextLogSink(self.macro_log_area)
         ToolTip(self.macro_log_area, "Shows macro-specific logs, including step comments and execution details.")
         # Status bar at the bottom
         self.macro_status_var = tk.StringVar(value="No macro selected.")
         self.macro_status_label = ttk.Label(macro_tab, textvariable=self.macro_status_var, anchor="w", font=("Segoe UI", 10, "bold"))
         self.macro_status_label.grid(row=1, column=0, columnspan=2, sticky="ew", padx=4, pady=2)
+        # Live run statistics of the running macro(s), refreshed once a second
+        self.macro_stats_var = tk.StringVar(value="")
+        ttk.Label(macro_tab, textvariable=self.macro_stats_var, anchor="w").grid(row=2, column=0, columnspan=2, sticky="ew", padx=4)
+        self.after(1000, self._refresh_macro_stats)
 
         self.macro_listbox.bind('<<ListboxSelect>>', self.on_macro_select)
 
+    def _refresh_macro_stats(self):
+        parts = [f"{name}: {runner.stats.summary(runner.counters)}" + (f", {runner.resumes} resumes" if runner.resumes else "")
+                 for name, runner in list(self.running_macros.items())]
+        self.macro_stats_var.set("   ".join(parts))
+        self.after(1000, self._refresh_macro_stats)
+
     def set_macro_status(self, status, color="black"):
         self.macro_status_var.set(status)
         self.macro_status_label.config(foreground=color)
@@ -426,30 +465,10 @@ class PSRemotePlayGUI(tk.Tk):
             json.dump(self.hosts, f, indent=2)
 
     def log(self, msg, level="info"):
-        self.log_area.config(state=tk.NORMAL)
-        tag = level
-        if not self.log_area.tag_names():
-            self.log_area.tag_configure("info", foreground="black")
-            self.log_area.tag_configure("success", foreground="green")
-            self.log_area.tag_configure("warning", foreground="orange")
-            self.log_area.tag_configure("error", foreground="red")
-            self.log_area.tag_configure("step_comment", foreground="magenta")
-        self.log_area.insert(tk.END, msg + '\n', tag)
-        self.log_area.see(tk.END)
-        self.log_area.config(state=tk.DISABLED)
-        # Also print to terminal with color
-        if level == "info":
-            print(Fore.WHITE + msg)
-        elif level == "success":
-            print(Fore.GREEN + msg)
-        elif level == "warning":
-            print(Fore.YELLOW + msg)
-        elif level == "error":
-            print(Fore.RED + msg)
-        elif level == "step_comment":
-            print(Fore.MAGENTA + msg)
-        else:
-            print(msg)
+        # Safe from any thread: the sink is drained by the Tk main loop
+        self.log_sink.push(msg, level)
+        # Also mirror to the terminal with color, written in batches by a background thread
+        self.terminal_sink.push(msg, level)
 
     def set_status(self, status):
         self.status_var.set(status)
@@ -463,7 +482,8 @@ class PSRemotePlayGUI(tk.Tk):
         self.disconnect_btn.config(state=tk.NORMAL)
         self.set_status("Connecting...")
         self.log(f"Connecting to {host}...", level="info")
-        self.worker = SessionWorker(host, self.command_queue, self.log, self.on_connected, self.on_disconnected)
+        self.worker = SessionWorker(host, self.command_queue, self.log, self.on_connected, self.on_disconnected,
+                                    on_connection_lost=self.on_connection_lost)
         self.worker.start()
 
     def on_disconnect(self):
@@ -479,6 +499,12 @@ class PSRemotePlayGUI(tk.Tk):
         self.log("Connected!", level="success")
         self.connected = True
 
+    def on_connection_lost(self):
+        # Called from the SessionWorker thread; the status label is updated by the Tk main loop
+        self.connected = False
+        self.log("Connection lost. Reconnecting...", level="warning")
+        self.after(0, lambda: self.set_status("Reconnecting..."))
+
     def on_disconnected(self):
         self.set_status("Disconnected")
         self.log("Disconnected.", level="warning")
@@ -1066,6 +1092,8 @@ class PSRemotePlayGUI(tk.Tk):
             self.autoclicker.stop()
         if self.current_macro_runner:
             self.current_macro_runner.stop()
+        self.macro_watcher.stop()
+        self.terminal_sink.close()
         self.destroy()
 
     def add_host_dialog(self):
@@ -1222,6 +1250,8 @@ class PSRemotePlayGUI(tk.Tk):
             end_of_loop_macro_name=eol_macro_name_val,
             description=description
         )
+        if not self._check_macro(macro, "save"):
+            return
         macros_dir = resource_path('Macros')
         os.makedirs(macros_dir, exist_ok=True)
         macro_path = os.path.join(macros_dir, f"{name}.macro.json")
@@ -1241,6 +1271,16 @@ class PSRemotePlayGUI(tk.Tk):
         except Exception as e:
             self.log(f"Failed to save macro: {e}", level="error")
 
+    def _check_macro(self, macro, action):
+        # The runner has no REPEAT blocks, so they are refused like any other invalid step
+        errors = validate_macro(macro.to_dict(), allow_repeat=False)
+        if not errors:
+            errors = self.macro_graph.problems(macro.name, target=macro.end_of_loop_macro_name)
+        if errors:
+            self.log(f"Cannot {action} macro {macro.name}: {'; '.join(errors)}", level="error")
+            messagebox.showerror("Invalid Macro", f"Cannot {action} macro '{macro.name}':\n\n" + "\n".join(errors))
+        return not errors
+
     def import_macro(self):
         from tkinter import filedialog
         import shutil
@@ -1267,6 +1307,8 @@ class PSRemotePlayGUI(tk.Tk):
             self.log(f"Renamed imported macro to: {new_base}", level="info")
         try:
             macro = Macro.load(file_path)
+            if not self._check_macro(macro, "import"):
+                return
             self.macros[macro.name] = macro
             self.refresh_macro_list()
             self.log(f"Imported macro: {macro.name}", level="success")
@@ -1355,11 +1397,11 @@ class PSRemotePlayGUI(tk.Tk):
         self.update_macro_steps_tree()
         self.macro_steps_tree.selection_set(str(idx+1))
 
-    def refresh_macro_list(self):
+    def _scan_macro_files(self):
+        """Bring self.macros up to date with the Macros dir; only new or changed files are parsed."""
         macros_dir = resource_path('Macros')
         os.makedirs(macros_dir, exist_ok=True)
-        print(Fore.CYAN + f"[DEBUG] Scanning for macros in: {macros_dir}")
-        print(Fore.CYAN + "[DEBUG] Checking for .json files to auto-fix to .macro.json...")
+        logger.debug("Scanning for macros in %s (renaming .json files to .macro.json)", macros_dir)
         for path in glob.glob(os.path.join(macros_dir, '*.json')):
             if not path.endswith('.macro.json'):
                 new_path = path[:-5] + '.macro.json'
@@ -1369,17 +1411,36 @@ class PSRemotePlayGUI(tk.Tk):
                         self.log(f"Renamed {os.path.basename(path)} to {os.path.basename(new_path)} for macro detection.", level="info")
                     except Exception as e:
                         self.log(f"Failed to rename {os.path.basename(path)}: {e}", level="error")
-        prev_selection = None
-        sel = self.macro_listbox.curselection()
-        if sel:
-            prev_selection = self._clean_macro_name(self.macro_listbox.get(sel[0]))
-        self.macros.clear()
+        files = {}
         for path in glob.glob(os.path.join(macros_dir, '*.macro.json')):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            sig = (st.st_mtime_ns, st.st_size)
+            cached = self._macro_files.get(path)
+            if cached and cached[0] == sig:
+                files[path] = cached
+                continue
             try:
                 macro = Macro.load(path)
-                self.macros[macro.name] = macro
             except Exception as e:
                 self.log(f"Failed to load macro {os.path.basename(path)}: {e}", level="error")
+                continue
+            errors = validate_macro(macro.to_dict(), allow_repeat=False)
+            if errors:
+                # Remembered as invalid so unchanged content is neither checked nor reported again
+                self.log(f"Skipping invalid macro {os.path.basename(path)}: {'; '.join(errors)}", level="error")
+                macro = None
+            files[path] = (sig, macro)
+        self._macro_files = files
+        self.macros.clear()
+        for _, macro in files.values():
+            if macro is not None:
+                self.macros[macro.name] = macro
+        self.macro_graph.reset({name: macro.end_of_loop_macro_name for name, macro in self.macros.items()})
+
+    def _render_macro_list(self, prev_selection):
         self.macro_listbox.delete(0, tk.END)
         for name in sorted(self.macros.keys()):
             label = name
@@ -1390,6 +1451,15 @@ class PSRemotePlayGUI(tk.Tk):
             self.macro_listbox.insert(tk.END, label)
         eol_choices = ["None", "Custom"] + sorted(self.macros.keys())
         self.eol_macro_combo['values'] = eol_choices
+
+    def _selected_macro_name(self):
+        sel = self.macro_listbox.curselection()
+        return self._clean_macro_name(self.macro_listbox.get(sel[0])) if sel else None
+
+    def refresh_macro_list(self):
+        prev_selection = self._selected_macro_name()
+        self._scan_macro_files()
+        self._render_macro_list(prev_selection)
         if self.macros:
             idx_to_select = 0
             if prev_selection and prev_selection in self.macros:
@@ -1408,6 +1478,24 @@ class PSRemotePlayGUI(tk.Tk):
             self.update_macro_steps_tree()
             self.update_eol_macro_steps_tree()
 
+    def _on_macro_file_event(self, kind, path):
+        # Watcher thread: only flag the change, the Tk loop picks it up in _apply_macro_file_changes
+        logger.debug("Macro file %s: %s", kind, path)
+        self._macro_files_changed.set()
+
+    def _apply_macro_file_changes(self):
+        if self._macro_files_changed.is_set():
+            self._macro_files_changed.clear()
+            # Update the list in place; the editor is left alone so unsaved edits survive outside changes
+            prev_selection = self._selected_macro_name()
+            self._scan_macro_files()
+            self._render_macro_list(prev_selection)
+            if prev_selection in self.macros:
+                idx = list(sorted(self.macros.keys())).index(prev_selection)
+                self.macro_listbox.selection_set(idx)
+                self.macro_listbox.activate(idx)
+        self.after(MACRO_WATCH_APPLY_MS, self._apply_macro_file_changes)
+
     def run_selected_macros(self):
         sel = self.macro_listbox.curselection()
         if not sel:
@@ -1423,6 +1511,10 @@ class PSRemotePlayGUI(tk.Tk):
             if name in self.running_macros:
                 self.set_macro_status(f"Macro '{name}' is already running.", color="orange")
                 continue
+            problems = self.macro_graph.problems(name)
+            if problems:
+                self.log(f"Cannot run macro {name}: {'; '.join(problems)}", level="error")
+                continue
             try:
                 loop_count = int(self.macro_loop_count_var.get())
             except Exception:
@@ -1440,7 +1532,9 @@ class PSRemotePlayGUI(tk.Tk):
                 lambda msg, level="info": (self.log(msg, level), self.macro_log(msg, level)),
                 get_macro_by_name=lambda n: self.macros.get(n),
                 refresh_callback=self.refresh_macro_list,
-                loop_progress_callback=loop_progress_callback
+                loop_progress_callback=loop_progress_callback,
+                connection_provider=lambda: self.worker,
+                run_log=self.run_logs.open(f"{time.strftime('%Y%m%d-%H%M%S')}-{name}")
             )
             self.running_macros[name] = runner
             runner.play(loop_count=loop_count)
@@ -1597,17 +1691,7 @@ class PSRemotePlayGUI(tk.Tk):
 
     # Add a method to log to the macro log area
     def macro_log(self, msg, level="info"):
-        self.macro_log_area.config(state=tk.NORMAL)
-        tag = level
-        if not self.macro_log_area.tag_names():
-            self.macro_log_area.tag_configure("info", foreground="black")
-            self.macro_log_area.tag_configure("success", foreground="green")
-            self.macro_log_area.tag_configure("warning", foreground="orange")
-            self.macro_log_area.tag_configure("error", foreground="red")
-            self.macro_log_area.tag_configure("step_comment", foreground="magenta")
-        self.macro_log_area.insert(tk.END, msg + '\n', tag)
-        self.macro_log_area.see(tk.END)
-        self.macro_log_area.config(state=tk.DISABLED)
+        self.macro_log_sink.push(msg, level)
 
 def launch_gui():
     app = PSRemotePlayGUI()
@@ -0,0 +1,142 @@
+import threading
+
+# Stands for "the target the graph already has" in problems()
+_CURRENT = object()
+
+class DependencyGraph:
+    """Which macro each macro runs at the end of its loops (end_of_loop_macro_name), kept both ways.
+
+    Every known macro is a node, with or without a target. problems() checks a reference before it
+    is saved (missing targets, cycles, targets that cannot run); dependents() answers the reverse
+    question. Linked programs built by the stores are cached here per macro and dropped, together
+    with those of every macro that (transitively) refers to it, whenever a macro changes.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._targets = {}
+        self._dependents = {}
+        self._programs = {}
+        # Bumped by every invalidation, so a program built from data that changed meanwhile is not cached
+        self._version = 0
+
+    # --- Edges ---
+    def set(self, name, target):
+        """Add or change a macro; returns the names whose linked programs were dropped."""
+        with self._lock:
+            self._unlink(name)
+            self._targets[name] = target or None
+            if target:
+                self._dependents.setdefault(target, set()).add(name)
+            return self._invalidate_locked(name)
+
+    def remove(self, name):
+        with self._lock:
+            dropped = self._invalidate_locked(name)
+            self._unlink(name)
+            self._targets.pop(name, None)
+            return dropped
+
+    def reset(self, targets, changed=None):
+        """Replace every edge with targets ({name: target or None}).
+
+        Only changed names (and their dependents) lose their linked programs; all of them when
+        changed is None.
+        """
+        with self._lock:
+            self._targets = {name: target or None for name, target in targets.items()}
+            self._dependents = {}
+            for name, target in self._targets.items():
+                if target:
+                    self._dependents.setdefault(target, set()).add(name)
+            if changed is None:
+                self._version += 1
+                self._programs.clear()
+                return
+            for name in changed:
+                self._invalidate_locked(name)
+
+    def _unlink(self, name):
+        old = self._targets.get(name)
+        if old and old in self._dependents:
+            self._dependents[old].discard(name)
+            if not self._dependents[old]:
+                del self._dependents[old]
+
+    def targets(self):
+        with self._lock:
+            return dict(self._targets)
+
+    def dependents(self, name):
+        """Every macro that runs name at the end of its loops, directly or through others."""
+        with self._lock:
+            return self._dependents_locked(name)
+
+    def _dependents_locked(self, name):
+        found = set()
+        pending = [name]
+        while pending:
+            for dependent in self._dependents.get(pending.pop(), ()):
+                if dependent not in found and dependent != name:
+                    found.add(dependent)
+                    pending.append(dependent)
+        return found
+
+    def problems(self, name, target=_CURRENT, invalid=()):
+        """Why the end-of-loop chain starting at name cannot be linked, as "where: what" strings.
+
+        target checks a reference that is about to be saved instead of the current one; macros in
+        invalid exist but cannot run (they failed validation).
+        """
+        with self._lock:
+            if target is _CURRENT:
+                target = self._targets.get(name)
+            chain = [name]
+            while target:
+                if target in chain:
+                    return ["end_of_loop_macro_name: cycle " + " -> ".join(chain + [target])]
+                if target not in self._targets:
+                    where = f" (via {' -> '.join(chain)})" if len(chain) > 1 else ""
+                    return [f"end_of_loop_macro_name: no macro named {target!r}{where}"]
+                if target in invalid:
+                    return [f"end_of_loop_macro_name: macro {target!r} is invalid"]
+                chain.append(target)
+                target = self._targets.get(target)
+            return []
+
+    # --- Linked programs ---
+    def program(self, name):
+        """(cached linked program or None, version to hand to store_program() with a newly built one)."""
+        with self._lock:
+            return self._programs.get(name), self._version
+
+    def store_program(self, name, program, version):
+        with self._lock:
+            if version == self._version and name in self._targets:
+                self._programs[name] = program
+
+    def _invalidate_locked(self, name):
+        self._version += 1
+        dropped = {name} | self._dependents_locked(name)
+        for dependent in dropped:
+            self._programs.pop(dependent, None)
+        return dropped
+
+def check_batch(targets, batch, invalid=()):
+    """{name: problems} of the macros in batch ({name: target}) that cannot be saved on top of targets.
+
+    Macros are checked as if the whole batch were saved at once; a macro that depends on a refused
+    one is refused as well.
+    """
+    refused = {}
+    while True:
+        trial = DependencyGraph()
+        trial.reset({**targets, **{name: target for name, target in batch.items() if name not in refused}})
+        found = {}
+        for name in batch:
+            if name not in refused:
+                problems = trial.problems(name, invalid=invalid)
+                if problems:
+                    found[name] = problems
+        if not found:
+            return refused
+        refused.update(found)
@@ -0,0 +1,113 @@
+import sys
+import threading
+import tkinter as tk
+from collections import deque
+from colorama import Fore
+
+LOG_DRAIN_INTERVAL_MS = 50
+LOG_MAX_LINES_PER_DRAIN = 500
+LOG_MAX_LINES = 5000
+
+TERMINAL_FLUSH_INTERVAL_MS = 100
+
+TERMINAL_COLORS = {
+    "info": Fore.WHITE,
+    "success": Fore.GREEN,
+    "warning": Fore.YELLOW,
+    "error": Fore.RED,
+    "step_comment": Fore.MAGENTA,
+}
+
+LEVEL_COLORS = {
+    "info": "black",
+    "success": "green",
+    "warning": "orange",
+    "error": "red",
+    "step_comment": "magenta",
+}
+
+class TextLogSink:
+    """Batched, thread-safe writer for a read-only Text widget.
+
+    push() may be called from any thread: it only appends to a deque (atomic in CPython, so no lock
+    is taken). The Tk main loop drains the deque every drain_ms with one insert per batch, one see(END)
+    and a trim that keeps the widget at most max_lines lines long.
+    """
+    def __init__(self, widget, drain_ms=LOG_DRAIN_INTERVAL_MS, max_lines=LOG_MAX_LINES,
+                 max_per_drain=LOG_MAX_LINES_PER_DRAIN):
+        self.widget = widget
+        self.drain_ms = drain_ms
+        self.max_lines = max_lines
+        self.max_per_drain = max_per_drain
+        self._pending = deque()
+        for level, color in LEVEL_COLORS.items():
+            widget.tag_configure(level, foreground=color)
+        widget.after(drain_ms, self._drain)
+
+    def push(self, msg, level="info"):
+        self._pending.append((msg, level))
+
+    def _drain(self):
+        try:
+            self._write_batch()
+        except tk.TclError:
+            return  # widget destroyed (window closed)
+        # Catch up quickly if producers are ahead, otherwise wait for the next tick
+        self.widget.after(1 if self._pending else self.drain_ms, self._drain)
+
+    def _write_batch(self):
+        chunks = []
+        for _ in range(min(len(self._pending), self.max_per_drain)):
+            msg, level = self._pending.popleft()
+            # insert() takes alternating text/tag arguments, so the whole batch is one Tk call
+            chunks.extend((msg + "\n", level))
+        if chunks:
+            self.widget.config(state=tk.NORMAL)
+            self.widget.insert(tk.END, *chunks)
+            excess = int(self.widget.index("end-1c").split(".")[0]) - 1 - self.max_lines
+            if excess > 0:
+                self.widget.delete("1.0", f"{excess + 1}.0")
+            self.widget.see(tk.END)
+            self.widget.config(state=tk.DISABLED)
+
+class TerminalLogSink:
+    """Mirrors log messages to a stream (stdout) from a background thread.
+
+    push() only appends to a deque; every flush_ms the thread writes everything pending with a single
+    write() and flush(), so the per-call overhead of colorama's Windows console wrapper is paid once per
+    batch and never on the thread that pushed. With enabled=False push() is a no-op.
+    """
+    def __init__(self, stream=None, flush_ms=TERMINAL_FLUSH_INTERVAL_MS, enabled=True):
+        self.stream = stream or sys.stdout
+        self.flush_ms = flush_ms
+        # No console at all under pythonw / windowed PyInstaller builds
+        self.enabled = enabled and self.stream is not None
+        self._pending = deque()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def push(self, msg, level="info"):
+        if self.enabled:
+            self._pending.append((msg, level))
+
+    def _loop(self):
+        while not self._stop.wait(self.flush_ms / 1000.0):
+            self.flush()
+
+    def flush(self):
+        chunks = []
+        while self._pending:
+            msg, level = self._pending.popleft()
+            # Reset after every line so a colour never bleeds into the next message
+            chunks.append(f"{TERMINAL_COLORS.get(level, '')}{msg}{Fore.RESET}\n")
+        if chunks:
+            try:
+                self.stream.write("".join(chunks))
+                self.stream.flush()
+            except (OSError, ValueError):
+                pass  # console gone (e.g. closed pythonw stdout); drop the output
+
+    def close(self):
+        self._stop.set()
+        self.flush()
@@ -1,8 +1,11 @@
 import threading
 import time
 import json
+import logging
 from .autoclicker import Autoclicker
-from colorama import Fore
+from .stats import RunStats
+
+logger = logging.getLogger(__name__)
 
 class Macro:
     def __init__(self, name, steps=None, end_of_loop_macro=None, end_of_loop_macro_name=None, description=None):
@@ -78,7 +81,7 @@ class Macro:
         return Macro.from_dict(d)
 
 class MacroRunner:
-    def __init__(self, command_queue, macro, log_callback, get_macro_by_name=None, refresh_callback=None, loop_progress_callback=None):
+    def __init__(self, command_queue, macro, log_callback, get_macro_by_name=None, refresh_callback=None, loop_progress_callback=None, connection_provider=None, trace_inputs=None, run_log=None):
         self.command_queue = command_queue
         self.macro = macro
         self.log_callback = log_callback
@@ -89,6 +92,16 @@ class MacroRunner:
         self.get_macro_by_name = get_macro_by_name  # function to get a Macro by name
         self.refresh_callback = refresh_callback
         self.loop_progress_callback = loop_progress_callback
+        self.connection_provider = connection_provider  # function returning the current SessionWorker (or None)
+        # Resume bookkeeping: last fully completed step, total time spent waiting for a reconnect, resume count
+        self.progress = {"loop": 0, "step": -1}
+        self.downtime_s = 0.0
+        self.resumes = 0
+        # Per-input "Macro step" lines only when tracing; a count summary is logged after every loop instead
+        self.trace_inputs = logger.isEnabledFor(logging.DEBUG) if trace_inputs is None else trace_inputs
+        self.counters = {"button": 0, "stick": 0, "autoclicker": 0}
+        self.stats = RunStats()
+        self.run_log = run_log  # optional runlog.RunLog for structured per-step events
 
     def play(self, loop_count=1):
         if self._thread and self._thread.is_alive():
@@ -111,78 +124,160 @@ class MacroRunner:
             self._thread.join(timeout=1)
         self.log_callback("Macro stopped.")
 
-    def _run_steps(self, steps):
-        for step_tuple in steps:
+    def _wait_for_connection(self):
+        # Returns the session generation to run the next step under, or None when unsupervised
+        worker = self.connection_provider() if self.connection_provider else None
+        if worker is None or not worker.is_alive():
+            return None
+        if not worker.is_ready():
+            self.log_callback("Connection lost. Macro paused until the session reconnects...", level="warning")
+            started = time.monotonic()
+            while self._running.is_set() and not worker.wait_until_ready(timeout=0.5):
+                if not worker.is_alive():
+                    break
+            waited = time.monotonic() - started
+            self.downtime_s += waited
+            if not worker.is_ready():
+                return None
+            self.resumes += 1
+            if self.run_log:
+                self.run_log.event("reconnect", loop=self.progress["loop"], downtime_s=round(waited, 3))
+            self.log_callback(f"Reconnected after {waited:.1f}s. Resuming from step {self.progress['step'] + 2}.", level="success")
+        return worker.generation
+
+    def _step_survived(self, generation):
+        if generation is None:
+            return True
+        worker = self.connection_provider()
+        if worker is None or not worker.is_alive():
+            return True
+        return worker.generation == generation and worker.is_ready()
+
+    def _run_steps(self, steps, phase="main"):
+        scheduled = None
+        for index, step_tuple in enumerate(steps):
             # Support (step, delay) or (step, delay, comment)
             if len(step_tuple) == 3:
                 step, delay_ms, comment = step_tuple
             else:
                 step, delay_ms = step_tuple
                 comment = None
+            while self._running.is_set():
+                generation = self._wait_for_connection()
+                if not self._running.is_set():
+                    break
+                started = time.monotonic()
+                # Each step is due one delay after the previous one started
+                late_ms = 0.0 if scheduled is None else (started - scheduled) * 1000
+                self.stats.step(late_ms)
+                if self.run_log:
+                    self.run_log.event("step", loop=self.progress["loop"], phase=phase, step=index, action=step,
+                                       scheduled_ts=time.time() - late_ms / 1000.0, late_ms=round(late_ms, 3))
+                scheduled = started + delay_ms / 1000.0
+                self._dispatch_step(step, delay_ms, comment)
+                # If the session dropped while this step was in flight, its inputs were discarded: replay it
+                if self._step_survived(generation):
+                    break
             if not self._running.is_set():
                 break
-            # Support simultaneous actions: if step is a list, process all actions in the list
-            actions = step if isinstance(step, list) else [step]
-            autoclickers_started = []
-            for action in actions:
-                if isinstance(action, dict) and action.get('type') == 'autoclicker':
-                    ac = Autoclicker(
-                        self.command_queue,
-                        action['button'],
-                        action['interval'],
-                        self.log_callback,
-                        duration_ms=action.get('duration'),
-                        stop_event=self._running
-                    )
-                    self._autoclickers.append(ac)
-                    ac.start()
-                    autoclickers_started.append(action['button'])
-                elif (
-                    isinstance(action, (tuple, list))
-                    and len(action) == 3
-                    and action[0] in ("LEFT_STICK", "RIGHT_STICK")
-                ):
-                    self.command_queue.put(tuple(action))
+            self.progress["step"] = index
+
+    def _dispatch_step(self, step, delay_ms, comment):
+        # Support simultaneous actions: if step is a list, process all actions in the list
+        actions = step if isinstance(step, list) else [step]
+        autoclickers_started = []
+        for action in actions:
+            if isinstance(action, dict) and action.get('type') == 'autoclicker':
+                ac = Autoclicker(
+                    self.command_queue,
+                    action['button'],
+                    action['interval'],
+                    self.log_callback,
+                    duration_ms=action.get('duration'),
+                    stop_event=self._running
+                )
+                self._autoclickers.append(ac)
+                ac.start()
+                self.counters["autoclicker"] += 1
+                autoclickers_started.append(action['button'])
+            elif (
+                isinstance(action, (tuple, list))
+                and len(action) == 3
+                and action[0] in ("LEFT_STICK", "RIGHT_STICK")
+            ):
+                self.command_queue.put(tuple(action))
+                self.counters["stick"] += 1
+                if self.trace_inputs:
                     self.log_callback(f"Macro step: Stick {action}")
-                elif isinstance(action, str):
-                    self.command_queue.put(action)
+            elif isinstance(action, str):
+                self.command_queue.put(action)
+                self.counters["button"] += 1
+                if self.trace_inputs:
                     self.log_callback(f"Macro step: Button {action}")
-                else:
-                    self.command_queue.put(action)
-                    self.log_callback(f"Macro step: Unknown {action}")
-            if autoclickers_started:
-                self.log_callback(f"Started autoclicker(s) in macro: {', '.join(map(str, autoclickers_started))}")
-            if comment:
-                self.log_callback(f"Step comment: {comment}", level="step_comment")
+            else:
+                self.command_queue.put(action)
+                self.stats.error()
+                self.log_callback(f"Macro step: Unknown {action}")
+        if autoclickers_started:
+            self.log_callback(f"Started autoclicker(s) in macro: {', '.join(map(str, autoclickers_started))}")
+        if comment:
+            self.log_callback(f"Step comment: {comment}", level="step_comment")
+        if delay_ms > 0:
             time.sleep(delay_ms / 1000.0)
 
+    def _end_of_loop(self):
+        # (steps, log line), resolved once per run: edits made while it runs apply to the next run
+        if self.macro.end_of_loop_macro_name and self.get_macro_by_name:
+            macro_obj = self.get_macro_by_name(self.macro.end_of_loop_macro_name)
+            if macro_obj:
+                return macro_obj.steps, f"Running end-of-loop macro: {macro_obj.name}"
+        elif self.macro.end_of_loop_macro:
+            return self.macro.end_of_loop_macro, "Running custom end-of-loop macro"
+        return [], None
+
     def _run(self):
+        if self.run_log:
+            self.run_log.event("run_start", macro=self.macro.name, loop_count=self._loop_count)
+        end_steps, end_message = self._end_of_loop()
         try:
             loop_num = 0
             while self._running.is_set() and (self._loop_count == -1 or loop_num < self._loop_count):
                 if self.loop_progress_callback:
                     self.loop_progress_callback(loop_num + 1, self._loop_count)
                 self.log_callback(f"Macro loop {loop_num+1}")
+                self.progress = {"loop": loop_num + 1, "step": -1}
+                if self.run_log:
+                    self.run_log.event("loop_start", loop=loop_num + 1)
+                loop_started = time.perf_counter()
+                before = dict(self.counters)
                 self._run_steps(self.macro.steps)
                 # End-of-loop macro
-                end_steps = []
-                if self.macro.end_of_loop_macro_name and self.get_macro_by_name:
-                    macro_obj = self.get_macro_by_name(self.macro.end_of_loop_macro_name)
-                    if macro_obj:
-                        end_steps = macro_obj.steps
-                        self.log_callback(f"Running end-of-loop macro: {macro_obj.name}")
-                elif self.macro.end_of_loop_macro:
-                    end_steps = self.macro.end_of_loop_macro
-                    self.log_callback("Running custom end-of-loop macro")
                 if end_steps:
-                    self._run_steps(end_steps)
-                print(Fore.CYAN + f"[DEBUG] Completed macro loop {loop_num+1}")
-                self.log_callback(f"[DEBUG] Completed macro loop {loop_num+1}", level="info")
+                    self.log_callback(end_message)
+                    self.progress["step"] = -1
+                    self._run_steps(end_steps, phase="end_of_loop")
+                logger.debug("Completed macro loop %d", loop_num + 1)
+                self.stats.loop_done()
+                sent = {kind: self.counters[kind] - before[kind] for kind in self.counters}
+                if self.run_log:
+                    self.run_log.event("loop_end", loop=loop_num + 1, elapsed_s=round(time.perf_counter() - loop_started, 6), inputs=sent)
+                self.log_callback(f"Loop {loop_num+1} done in {time.perf_counter() - loop_started:.2f}s: {sent['button']} buttons, "
+                                  f"{sent['stick']} sticks, {sent['autoclicker']} autoclickers", level="info")
                 loop_num += 1
         except Exception as e:
             import traceback
             tb = traceback.format_exc()
             self.log_callback(f"Macro error: {e}\n{tb}")
+            self.stats.error()
+            if self.run_log:
+                self.run_log.event("error", error=str(e))
+        self.log_callback(f"Run stats: {self.stats.summary(self.counters)}", level="info")
+        if self.resumes:
+            self.log_callback(f"Macro resumed {self.resumes} time(s) after reconnects; downtime {self.downtime_s:.1f}s.", level="info")
+        if self.run_log:
+            self.run_log.event("run_end", stopped=not self._running.is_set(), stats=self.stats.snapshot(self.counters),
+                               resumes=self.resumes, downtime_s=round(self.downtime_s, 3))
+            self.run_log.close()
         self.stop()
         if self.refresh_callback:
             self.refresh_callback() 
\ No newline at end of file
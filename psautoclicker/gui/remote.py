@@ -1,20 +1,64 @@
 import threading
 import asyncio
+import logging
 from pyremoteplay import RPDevice
 import queue
+import time
 import types
 
+logger = logging.getLogger(__name__)
+
+def _stick_point(stick, direction, magnitude):
+    # pyremoteplay expects: X Axis: Left -1.0, Right 1.0; Y Axis: Up -1.0, Down 1.0
+    if direction == "UP":
+        return (0.0, -magnitude)
+    elif direction == "DOWN":
+        return (0.0, magnitude)
+    elif direction == "LEFT":
+        return (-magnitude, 0.0)
+    elif direction == "RIGHT":
+        return (magnitude, 0.0)
+    elif direction == "NEUTRAL":
+        return (0.0, 0.0)
+    else:
+        raise ValueError(f"Unknown stick direction: {direction}")
+
+async def _async_stick(self, stick, direction, magnitude):
+    # stick: 'LEFT_STICK' or 'RIGHT_STICK' -> 'left' or 'right'
+    stick_name = stick.replace("_STICK", "").lower()
+    point = _stick_point(stick, direction, magnitude)
+    self.stick(stick_name, point=point)
+    self.update_sticks()  # Ensure stick state is sent immediately
+    await asyncio.sleep(0)  # let event loop run
+
 class SessionWorker(threading.Thread):
-    def __init__(self, host, command_queue, log_callback, on_connected, on_disconnected):
+    def __init__(self, host, command_queue, log_callback, on_connected, on_disconnected,
+                 on_connection_lost=None, auto_reconnect=True, initial_backoff=1.0, max_backoff=30.0,
+                 max_reconnect_attempts=None, trace_inputs=None):
         super().__init__(daemon=True)
         self.host = host
         self.command_queue = command_queue
         self.log_callback = log_callback
         self.on_connected = on_connected
         self.on_disconnected = on_disconnected
+        self.on_connection_lost = on_connection_lost
+        self.auto_reconnect = auto_reconnect
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.max_reconnect_attempts = max_reconnect_attempts  # None = retry until disconnect()
         self._disconnect_event = threading.Event()
+        self._ready = threading.Event()
         self.loop = None
         self.device = None
+        # Cached between sessions so a reconnect can skip the status/user lookup and wakeup
+        self._user = None
+        self._known_on = False
+        # Incremented every time a session becomes ready; lets macro runners detect a drop
+        self.generation = 0
+        self.reconnects = 0
+        # "Sent button/stick" lines are per input, so they are only formatted when tracing
+        self.trace_inputs = logger.isEnabledFor(logging.DEBUG) if trace_inputs is None else trace_inputs
+        self.inputs_sent = {"button": 0, "stick": 0}
 
     def run(self):
         self.loop = asyncio.new_event_loop()
@@ -26,54 +70,92 @@ class SessionWorker(threading.Thread):
         if self.device:
             self.loop.call_soon_threadsafe(self.device.disconnect)
 
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def wait_until_ready(self, timeout=None):
+        """Block until a session is ready; returns False on timeout or if the worker is shutting down."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._ready.is_set():
+            if self._disconnect_event.is_set() or not self.is_alive():
+                return False
+            remaining = 0.1 if deadline is None else min(0.1, deadline - time.monotonic())
+            if remaining <= 0:
+                return False
+            self._ready.wait(remaining)
+        return True
+
     async def _main(self):
         try:
             self.device = RPDevice(self.host)
-            user = await self._get_user(self.device)
-            if not user:
-                self.log_callback("No user found on device.")
-                self.on_disconnected()
-                return
-            if not self.device.is_on:
-                self.device.wakeup(user)
-                self.log_callback("Waking up device...")
-                if not await self.device.async_wait_for_wakeup():
-                    self.log_callback("Timed out waiting for device to wakeup")
-                    self.on_disconnected()
-                    return
-            self.device.create_session(user)
+            attempt = 0
+            while not self._disconnect_event.is_set():
+                was_ready = await self._run_session()
+                if self._disconnect_event.is_set() or not self.auto_reconnect:
+                    break
+                if was_ready:
+                    attempt = 0
+                    if self.on_connection_lost:
+                        self.on_connection_lost()
+                if self.max_reconnect_attempts is not None and attempt >= self.max_reconnect_attempts:
+                    self.log_callback(f"Giving up after {attempt} reconnect attempts.")
+                    break
+                delay = min(self.max_backoff, self.initial_backoff * (2 ** attempt))
+                attempt += 1
+                self.log_callback(f"Session lost. Reconnecting in {delay:.1f}s (attempt {attempt})...")
+                if await self._sleep_unless_disconnected(delay):
+                    break
+                self.reconnects += 1
+        except Exception as e:
+            self.log_callback(f"Session error: {e}")
+        finally:
+            self._ready.clear()
+            self.on_disconnected()
 
-            # PATCH: Add async_stick to controller using pyremoteplay's stick method
-            def _stick_point(stick, direction, magnitude):
-                # pyremoteplay expects: X Axis: Left -1.0, Right 1.0; Y Axis: Up -1.0, Down 1.0
-                if direction == "UP":
-                    return (0.0, -magnitude)
-                elif direction == "DOWN":
-                    return (0.0, magnitude)
-                elif direction == "LEFT":
-                    return (-magnitude, 0.0)
-                elif direction == "RIGHT":
-                    return (magnitude, 0.0)
-                elif direction == "NEUTRAL":
-                    return (0.0, 0.0)
-                else:
-                    raise ValueError(f"Unknown stick direction: {direction}")
+    async def _sleep_unless_disconnected(self, delay):
+        end = time.monotonic() + delay
+        while time.monotonic() < end:
+            if self._disconnect_event.is_set():
+                return True
+            await asyncio.sleep(min(0.1, end - time.monotonic()))
+        return self._disconnect_event.is_set()
 
-            async def async_stick(self, stick, direction, magnitude):
-                # stick: 'LEFT_STICK' or 'RIGHT_STICK' -> 'left' or 'right'
-                stick_name = stick.replace("_STICK", "").lower()
-                point = _stick_point(stick, direction, magnitude)
-                self.stick(stick_name, point=point)
-                self.update_sticks()  # Ensure stick state is sent immediately
-                await asyncio.sleep(0)  # let event loop run
-            self.device.controller.async_stick = types.MethodType(async_stick, self.device.controller)
+    async def _run_session(self):
+        """Run one session until it drops. Returns True if the session became ready at least once."""
+        ready = False
+        try:
+            if self._user is None or not self._known_on:
+                user = await self._get_user(self.device)
+                if not user:
+                    self.log_callback("No user found on device.")
+                    return False
+                self._user = user
+                if not self.device.is_on:
+                    self.device.wakeup(user)
+                    self.log_callback("Waking up device...")
+                    if not await self.device.async_wait_for_wakeup():
+                        self.log_callback("Timed out waiting for device to wakeup")
+                        return False
+                self._known_on = True
+            else:
+                self.log_callback("Reusing cached user and status for reconnect.")
+            self.device.create_session(self._user)
+
+            # PATCH: Add async_stick to controller using pyremoteplay's stick method
+            self.device.controller.async_stick = types.MethodType(_async_stick, self.device.controller)
 
             if not await self.device.connect():
                 self.log_callback("Failed to start Session")
-                self.on_disconnected()
-                return
+                # The cached status may be stale (console went to rest mode); look it up again next time
+                self._known_on = False
+                return False
             self.log_callback("Session connected. Waiting for session to be ready...")
             await self.device.async_wait_for_session()
+            # Inputs queued while the session was down are stale; macro runners replay from their last completed step
+            self._drain_queue()
+            self.generation += 1
+            self._ready.set()
+            ready = True
             self.on_connected()
             self.log_callback("Session ready. Processing button commands...")
             while self.device.connected and not self._disconnect_event.is_set():
@@ -82,10 +164,14 @@ class SessionWorker(threading.Thread):
                     if isinstance(cmd, tuple) and len(cmd) == 3:
                         stick, direction, magnitude = cmd
                         await self.device.controller.async_stick(stick, direction, magnitude)
-                        self.log_callback(f"Sent stick: {stick} {direction} {magnitude}")
+                        self.inputs_sent["stick"] += 1
+                        if self.trace_inputs:
+                            self.log_callback(f"Sent stick: {stick} {direction} {magnitude}")
                     else:
                         await self.device.controller.async_button(cmd)
-                        self.log_callback(f"Sent button: {cmd}")
+                        self.inputs_sent["button"] += 1
+                        if self.trace_inputs:
+                            self.log_callback(f"Sent button: {cmd}")
                 except asyncio.CancelledError:
                     break
                 except Exception as e:
@@ -93,12 +179,21 @@ class SessionWorker(threading.Thread):
                         await asyncio.sleep(0.05)
                         continue
                     self.log_callback(f"Error sending input: {e}")
+            self._ready.clear()
             self.device.disconnect()
             self.log_callback("Session disconnected.")
         except Exception as e:
+            self._ready.clear()
+            self._known_on = False
             self.log_callback(f"Session error: {e}")
-        finally:
-            self.on_disconnected()
+        return ready
+
+    def _drain_queue(self):
+        while True:
+            try:
+                self.command_queue.get_nowait()
+            except queue.Empty:
+                return
 
     async def _get_user(self, device):
         if not await device.async_get_status():
@@ -106,4 +201,4 @@ class SessionWorker(threading.Thread):
         users = device.get_users()
         if not users:
             return None
-        return users[0] 
\ No newline at end of file
+        return users[0]
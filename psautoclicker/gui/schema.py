@@ -0,0 +1,99 @@
+from .controller import BUTTON_MAP
+
+# Shape of a saved macro:
+#   {"name": str, "description": str?, "tags": [str]?, "steps": [step],
+#    "end_of_loop_macro": [step]?, "end_of_loop_macro_name": str?}
+#   step   = [action, delay_ms] or [action, delay_ms, comment]   (comment may be null)
+#   action = button name | [stick, direction, magnitude] | {"type": "autoclicker", "button", "interval", "duration"?}
+#          | [action, ...] pressed together | ["REPEAT", count, [step, ...]]
+STICKS = ("LEFT_STICK", "RIGHT_STICK")
+STICK_DIRECTIONS = ("UP", "DOWN", "LEFT", "RIGHT", "NEUTRAL")
+# Stop collecting after this many problems; a broken recording would otherwise report every step
+MAX_ERRORS = 20
+
+class MacroValidationError(ValueError):
+    def __init__(self, errors):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def validate_macro(macro, allow_repeat=True):
+    """Problems with a macro as "where: what" strings, e.g. "steps[3][0]: unknown stick direction 'UPP'".
+
+    An empty list means the macro is valid. allow_repeat=False rejects REPEAT blocks (for runners
+    that do not support them).
+    """
+    if not isinstance(macro, dict):
+        return ["macro: must be a JSON object"]
+    errors = []
+    if not isinstance(macro.get("name"), str) or not macro["name"].strip():
+        errors.append("name: must be a non-empty string")
+    if macro.get("description") is not None and not isinstance(macro["description"], str):
+        errors.append("description: must be a string")
+    tags = macro.get("tags")
+    if tags is not None and (not isinstance(tags, list) or not all(isinstance(t, str) for t in tags)):
+        errors.append("tags: must be a list of strings")
+    if not isinstance(macro.get("steps"), (list, tuple)):
+        errors.append("steps: must be a list")
+    else:
+        _check_steps(macro["steps"], "steps", errors, allow_repeat)
+    if macro.get("end_of_loop_macro") is not None:
+        if not isinstance(macro["end_of_loop_macro"], (list, tuple)):
+            errors.append("end_of_loop_macro: must be a list")
+        else:
+            _check_steps(macro["end_of_loop_macro"], "end_of_loop_macro", errors, allow_repeat)
+    if macro.get("end_of_loop_macro_name") is not None and not isinstance(macro["end_of_loop_macro_name"], str):
+        errors.append("end_of_loop_macro_name: must be a string")
+    return errors[:MAX_ERRORS]
+
+def _check_steps(steps, where, errors, allow_repeat):
+    for i, step_tuple in enumerate(steps):
+        if len(errors) >= MAX_ERRORS:
+            return
+        at = f"{where}[{i}]"
+        if not isinstance(step_tuple, (list, tuple)) or len(step_tuple) not in (2, 3):
+            errors.append(f"{at}: must be [action, delay_ms] or [action, delay_ms, comment]")
+            continue
+        action, delay_ms = step_tuple[0], step_tuple[1]
+        if not _is_number(delay_ms) or delay_ms < 0:
+            errors.append(f"{at}[1]: delay_ms must be a number >= 0, got {delay_ms!r}")
+        if len(step_tuple) == 3 and step_tuple[2] is not None and not isinstance(step_tuple[2], str):
+            errors.append(f"{at}[2]: comment must be a string")
+        if isinstance(action, (list, tuple)) and action and action[0] == "REPEAT":
+            if not allow_repeat:
+                errors.append(f"{at}[0]: REPEAT blocks are not supported here")
+            elif len(action) != 3 or not isinstance(action[1], int) or isinstance(action[1], bool) or action[1] < 0:
+                errors.append(f"{at}[0]: must be [\"REPEAT\", count >= 0, [steps]]")
+            elif not isinstance(action[2], (list, tuple)):
+                errors.append(f"{at}[0][2]: repeated steps must be a list")
+            else:
+                _check_steps(action[2], f"{at}[0][2]", errors, allow_repeat)
+        elif isinstance(action, (list, tuple)) and not (len(action) == 3 and action[0] in STICKS):
+            # Simultaneous actions
+            for j, sub_action in enumerate(action):
+                _check_action(sub_action, f"{at}[0][{j}]", errors)
+        else:
+            _check_action(action, f"{at}[0]", errors)
+
+def _check_action(action, at, errors):
+    if isinstance(action, str):
+        if action not in BUTTON_MAP:
+            errors.append(f"{at}: unknown button {action!r}")
+    elif isinstance(action, dict):
+        if action.get("type") != "autoclicker":
+            errors.append(f"{at}: unknown action type {action.get('type')!r}")
+        elif action.get("button") not in BUTTON_MAP:
+            errors.append(f"{at}: unknown autoclicker button {action.get('button')!r}")
+        elif not _is_number(action.get("interval")) or action["interval"] <= 0:
+            errors.append(f"{at}: autoclicker interval must be a number > 0")
+        elif action.get("duration") is not None and (not _is_number(action["duration"]) or action["duration"] < 0):
+            errors.append(f"{at}: autoclicker duration must be a number >= 0")
+    elif isinstance(action, (list, tuple)) and len(action) == 3 and action[0] in STICKS:
+        if action[1] not in STICK_DIRECTIONS:
+            errors.append(f"{at}: unknown stick direction {action[1]!r}")
+        elif not _is_number(action[2]) or not 0 <= action[2] <= 1:
+            errors.append(f"{at}: stick magnitude must be a number from 0 to 1")
+    else:
+        errors.append(f"{at}: unknown action {action!r}")
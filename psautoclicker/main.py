@@ -2,6 +2,7 @@ import sys
 import subprocess
 import pkg_resources
 import os
+import logging
 
 REQUIREMENTS_PATH = os.path.join(os.path.dirname(__file__), '..', 'requirements.txt')
 
@@ -26,5 +27,8 @@ if __name__ == "__main__":
         print(f"Error checking/installing requirements: {e}")
         input("Press Enter to exit...")
         sys.exit(1)
+    # PSAUTO_LOG_LEVEL sets the level of the app's diagnostic logging (off below WARNING by default)
+    logging.basicConfig(level=os.environ.get("PSAUTO_LOG_LEVEL", "WARNING").upper(),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     from gui.app import launch_gui
     launch_gui() 
\ No newline at end of file